@@ -0,0 +1,105 @@
+"""
+Seeded synthetic workloads for every learner, scaled by rows, attributes, value cardinality, taxonomy depth and layer width.
+The same arguments always give the same data.
+"""
+from random import Random
+import numpy as np
+from ConceptLearning.CandidateElimination import Taxonomy
+
+def attribute_examples(num_rows: int, num_attributes: int, cardinality: int, seed: int = 0, target: str = "Label", noise: float = 0.05):
+    """
+    Examples for DecisionTree and HoeffdingTree: attributes A0, A1, ... with values v0 ... v{cardinality - 1},
+    labelled by a random table over the first min(3, num_attributes) attributes, with a share noise of labels flipped at random.
+    return
+        list[dict[str, str]]
+    """
+    rng = Random(seed)
+    relevant = min(3, num_attributes)
+    table: dict[tuple[int, ...], str] = {}
+    examples = []
+    for _ in range(num_rows):
+        values = [rng.randrange(cardinality) for _ in range(num_attributes)]
+        key = tuple(values[:relevant])
+        if key not in table:
+            table[key] = rng.choice(("Yes", "No"))
+        label = table[key] if rng.random() >= noise else rng.choice(("Yes", "No"))
+        example = {f"A{i}": f"v{value}" for i, value in enumerate(values)}
+        example[target] = label
+        examples.append(example)
+    return examples
+
+def taxonomies(num_attributes: int, cardinality: int, depth: int, seed: int = 0) -> list[tuple[Taxonomy, list[Taxonomy], Taxonomy]]:
+    """
+    For every attribute, a frozen taxonomy: the root "?", depth - 1 levels of groups, cardinality values and "_" below every value.
+    Each level has about cardinality^(k / depth) groups over contiguous runs of the level below, shuffled from seed.
+    return
+        (root, values, bottom) for every attribute
+    """
+    rng = Random(seed)
+    attributes = []
+    for attribute in range(num_attributes):
+        bottom = Taxonomy("_", [])
+        values = [Taxonomy(f"A{attribute}v{value}", [bottom]) for value in range(cardinality)]
+        level = values[:]
+        rng.shuffle(level)
+        for k in reversed(range(1, depth)):
+            num_groups = max(1, min(len(level) - 1, round(cardinality ** (k / depth))))
+            if num_groups <= 1:
+                break
+            bounds = [len(level) * group // num_groups for group in range(num_groups + 1)]
+            level = [Taxonomy(f"A{attribute}g{k}.{group}", level[bounds[group]:bounds[group + 1]]) for group in range(num_groups)]
+        root = Taxonomy("?", level)
+        root.freeze()
+        attributes.append((root, values, bottom))
+    return attributes
+
+def concept_examples(attributes: list[tuple[Taxonomy, list[Taxonomy], Taxonomy]], num_rows: int, seed: int = 0):
+    """
+    Noise-free examples for VersionSpace, labelled by a random target concept that is the root on half of the attributes
+    and a random group or value on the others. Half of the instances (and always the first) are drawn from the values
+    the concept covers, the others from all values, so both labels occur however specific the concept is.
+    return
+        list[tuple[list[Taxonomy], bool]]
+    """
+    rng = Random(seed)
+    concept = []
+    for root, values, _ in attributes:
+        nodes = [node for node in root.index.nodes if node is not root and node.sub_groups != []]
+        concept.append(root if rng.random() < 0.5 or nodes == [] else rng.choice(nodes))
+    examples = []
+    covered = [[value for value in values if constraint >= value] for constraint, (_, values, _) in zip(concept, attributes)]
+    for row in range(num_rows):
+        if row == 0 or rng.random() < 0.5:
+            instance = [rng.choice(values) for values in covered]
+        else:
+            instance = [rng.choice(values) for _, values, _ in attributes]
+        examples.append((instance, all(constraint >= value for constraint, value in zip(concept, instance))))
+    return examples
+
+def network_data(num_rows: int, input_len: int, output_len: int, seed: int = 0):
+    """
+    Inputs uniform in [0, 1] and targets from a random sigmoid teacher layer, for Network.
+    return
+        inputs: np.ndarray of shape (num_rows, input_len)
+        targets: np.ndarray of shape (num_rows, output_len)
+    """
+    rng = np.random.default_rng(seed)
+    inputs = rng.uniform(0, 1, (num_rows, input_len))
+    teacher = rng.normal(0, 2, (input_len, output_len))
+    return inputs, 1 / (1 + np.exp(-(inputs - 0.5) @ teacher))
+
+def regression_data(num_rows: int, num_features: int, seed: int = 0, noise: float = 0.1):
+    """
+    y = w·x + b plus Gaussian noise, for the linear regression engines. inputs is 1-D for a single feature.
+    return
+        inputs: np.ndarray
+        targets: np.ndarray
+        weights: np.ndarray
+        intercept: float
+    """
+    rng = np.random.default_rng(seed)
+    weights = rng.uniform(-3, 3, num_features)
+    intercept = float(rng.uniform(-5, 5))
+    inputs = rng.uniform(-5, 5, (num_rows, num_features))
+    targets = inputs @ weights + intercept + rng.normal(0, noise, num_rows)
+    return (inputs[:, 0] if num_features == 1 else inputs), targets, weights, intercept
@@ -0,0 +1,221 @@
+"""
+Time, peak traced memory and throughput of every learner's entry points on the synthetic workloads of Benchmark.Generators,
+saved as JSON and compared with a baseline run:
+    python -m Benchmark.Suite --scale small --output before.json
+    (change the code)
+    python -m Benchmark.Suite --scale small --output after.json --baseline before.json
+Exits with status 1 if an entry point got slower than the baseline by more than --threshold.
+Run from the repository root.
+"""
+from typing import Any, Callable, Optional
+from argparse import ArgumentParser
+from time import perf_counter
+import json
+import csv
+import os
+import platform
+import sys
+import tracemalloc
+from tempfile import TemporaryDirectory
+import numpy as np
+from Benchmark.Generators import attribute_examples, concept_examples, network_data, regression_data, taxonomies
+from ConceptLearning.CandidateElimination import BoundarySet, Hypothesis, VersionSpace
+from Dataset.Columnar import ColumnarDataset
+from DecisionTree.ID3 import DecisionTree, HoeffdingTree
+from LinearRegression.GradientDescent import LinearRegression, VectorizedLinearRegression
+from LinearRegression.NormalEquation import NormalEquation
+from NeuralNetwork.BackPropagation import ArrayDataset, Network, SGD
+from NeuralNetwork.Quantization import QuantizedNetwork
+
+# rows of the workloads, attributes per example, values per attribute, levels of the taxonomies, hidden units of the networks
+SCALES: dict[str, dict[str, int]] = {
+    "small": {"rows": 2000, "attributes": 6, "cardinality": 4, "depth": 2, "width": 16},
+    "medium": {"rows": 20000, "attributes": 10, "cardinality": 8, "depth": 3, "width": 64},
+    "large": {"rows": 200000, "attributes": 20, "cardinality": 16, "depth": 4, "width": 256}
+}
+
+def measure(name: str, run: Callable[[], Any], units: int, unit: str, repeat: int = 1, memory: bool = True) -> dict[str, Any]:
+    """
+    run is timed repeat times without tracing (the best time is kept), then once more under tracemalloc for the peak memory,
+    since tracing slows Python code down.
+    return
+        name, seconds, units, unit, throughput (units per second) and peak_bytes (None without memory)
+    """
+    seconds = float("inf")
+    for _ in range(repeat):
+        start = perf_counter()
+        run()
+        seconds = min(seconds, perf_counter() - start)
+    peak_bytes = None
+    if memory:
+        tracemalloc.start()
+        try:
+            run()
+            peak_bytes = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    result = {"name": name, "seconds": seconds, "units": units, "unit": unit, "throughput": units / seconds if seconds > 0 else None, "peak_bytes": peak_bytes}
+    peak = "" if peak_bytes is None else f", peak {peak_bytes / 2 ** 20:.1f} MiB"
+    # a run faster than the timer's resolution takes 0 seconds and has no throughput
+    throughput = "too fast to measure" if result["throughput"] is None else f"{result['throughput']:.0f} {unit}/s"
+    print(f"{name}: {seconds:.4f}s, {throughput}{peak}", flush=True)
+    return result
+
+def decision_tree_benchmarks(params: dict[str, int], measure: Callable[..., dict[str, Any]]):
+    examples = attribute_examples(params["rows"], params["attributes"], params["cardinality"])
+    tree = DecisionTree(examples, "Label")
+    columns = tree.compile().encode(examples)
+    dict_rows = min(params["rows"], 5000)
+    serial = measure("DecisionTree", lambda: DecisionTree(examples, "Label"), len(examples), "examples")
+    parallel = measure("DecisionTree (2 processes)", lambda: DecisionTree(examples, "Label", processes=2), len(examples), "examples")
+    # the process pool gives the serial tree but waits for its tasks at every node, which usually costs more than it saves
+    if serial["seconds"] > 0:
+        ratio = parallel["seconds"] / serial["seconds"]
+        print(f"DecisionTree with 2 processes: {ratio:.2f}x the serial time ({'faster' if ratio < 1 else 'slower'} than serial)")
+    return [
+        serial,
+        parallel,
+        measure("DecisionTree.ID3 (dict engine)", lambda: DecisionTree(examples[:dict_rows], "Label", encode=False), dict_rows, "examples"),
+        measure("Node.classify", lambda: [tree.root.classify(example) for example in examples], len(examples), "instances"),
+        measure("DecisionTree.classify_many", lambda: tree.classify_many(examples), len(examples), "instances"),
+        measure("CompiledTree.classify_encoded", lambda: tree.compiled.classify_encoded(columns, len(examples)), len(examples), "instances"),
+        measure("HoeffdingTree.learn", lambda: HoeffdingTree("Label").learn(examples), len(examples), "examples")
+    ]
+
+def network_benchmarks(params: dict[str, int], measure: Callable[..., dict[str, Any]]):
+    input_len, output_len = params["attributes"], 2
+    inputs, targets = network_data(params["rows"], input_len, output_len)
+    dataset = ArrayDataset(inputs, targets)
+    network = Network(input_len, params["width"], output_len, "sigmoid", seed=0)
+    quantized_network = QuantizedNetwork(network)
+    def learn():
+        Network(input_len, params["width"], output_len, "sigmoid", seed=0).learn(dataset, 32, 1, SGD(0.5), prefetch=0)
+    return [
+        measure("Network.learn", learn, len(inputs), "examples"),
+        measure("Network.predict", lambda: [network.predict(row) for row in inputs[:1000].tolist()], min(len(inputs), 1000), "instances"),
+        measure("Network.predict_many", lambda: network.predict_many(inputs), len(inputs), "instances"),
+        measure("QuantizedNetwork.predict", lambda: [quantized_network.predict(row) for row in inputs[:1000].tolist()], min(len(inputs), 1000), "instances"),
+        measure("QuantizedNetwork.predict_many", lambda: quantized_network.predict_many(inputs), len(inputs), "instances")
+    ]
+
+def linear_regression_benchmarks(params: dict[str, int], measure: Callable[..., dict[str, Any]]):
+    inputs, targets, _, _ = regression_data(params["rows"], 1)
+    data = list(zip(inputs.tolist(), targets.tolist()))
+    many_inputs, many_targets, _, _ = regression_data(params["rows"], params["attributes"])
+    many_data = list(zip(many_inputs.tolist(), many_targets.tolist()))
+    return [
+        measure("LinearRegression", lambda: LinearRegression(data, 32, 1, 0.01), len(data), "examples"),
+        measure("VectorizedLinearRegression", lambda: VectorizedLinearRegression(many_inputs, many_targets, 32, 1, 0.01, seed=0), len(many_inputs), "examples"),
+        measure("NormalEquation", lambda: NormalEquation(many_data, num_features=params["attributes"]), len(many_data), "examples")
+    ]
+
+def version_space_benchmarks(params: dict[str, int], measure: Callable[..., dict[str, Any]]):
+    attributes = taxonomies(params["attributes"], params["cardinality"], params["depth"])
+    examples = concept_examples(attributes, max(20, params["rows"] // 100))
+    instances = [instance for instance, _ in concept_examples(attributes, params["rows"], seed=1)]
+    def new_version_space():
+        return VersionSpace(
+            BoundarySet([Hypothesis(bottom for _, _, bottom in attributes)]), BoundarySet([Hypothesis(root for root, _, _ in attributes)])
+        )
+    version_space = new_version_space()
+    version_space.learn(examples)
+    return [
+        measure("VersionSpace.learn", lambda: new_version_space().learn(examples), len(examples), "examples"),
+        measure("VersionSpace.classify", lambda: [version_space.classify(instance) for instance in instances[:100]], min(len(instances), 100), "instances"),
+        measure("VersionSpace.classify_many", lambda: version_space.classify_many(instances), len(instances), "instances")
+    ]
+
+def columnar_benchmarks(params: dict[str, int], measure: Callable[..., dict[str, Any]]):
+    examples = attribute_examples(params["rows"], params["attributes"], params["cardinality"])
+    names = [f"A{i}" for i in range(params["attributes"])] + ["Label"]
+    with TemporaryDirectory() as directory:
+        csv_path, path = os.path.join(directory, "examples.csv"), os.path.join(directory, "examples.cols")
+        with open(csv_path, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(names)
+            writer.writerows([example[name] for name in names] for example in examples)
+        dataset = ColumnarDataset.from_csv(csv_path, path)
+        tree = DecisionTree(dataset, "Label")
+        return [
+            measure("ColumnarDataset.from_csv", lambda: ColumnarDataset.from_csv(csv_path, path), len(examples), "rows"),
+            measure("ColumnarDataset.open", lambda: ColumnarDataset.open(path), len(examples), "rows"),
+            measure("DecisionTree (columnar)", lambda: DecisionTree(dataset, "Label"), len(examples), "examples"),
+            measure("DecisionTree.classify_many (columnar)", lambda: tree.classify_many(dataset), len(examples), "instances")
+        ]
+
+SUITES: dict[str, Callable[[dict[str, int], Callable[..., dict[str, Any]]], list[dict[str, Any]]]] = {
+    "decision_tree": decision_tree_benchmarks,
+    "network": network_benchmarks,
+    "linear_regression": linear_regression_benchmarks,
+    "version_space": version_space_benchmarks,
+    "columnar": columnar_benchmarks
+}
+
+def run(params: dict[str, int], suites: Optional[list[str]] = None, repeat: int = 1, memory: bool = True) -> dict[str, Any]:
+    """
+    return
+        the environment, params and the results of every entry point of the suites (all by default)
+    """
+    measure_with = lambda name, run, units, unit: measure(name, run, units, unit, repeat, memory)
+    results = []
+    for suite in suites or list(SUITES):
+        results.extend(SUITES[suite](params, measure_with))
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "params": params,
+        "results": results
+    }
+
+def compare(report: dict[str, Any], baseline: dict[str, Any], threshold: float = 0.1) -> list[str]:
+    """
+    Print the time of every entry point relative to the baseline.
+    return
+        names of the entry points more than threshold slower than in the baseline
+    """
+    if report["params"] != baseline["params"]:
+        print(f"Warning: the baseline ran with {baseline['params']}, this run with {report['params']}.")
+    baseline_results = {result["name"]: result for result in baseline["results"]}
+    regressions = []
+    for result in report["results"]:
+        old = baseline_results.get(result["name"])
+        if old is None:
+            continue
+        ratio = result["seconds"] / old["seconds"] if old["seconds"] > 0 else float("inf")
+        verdict = "slower" if ratio > 1 + threshold else "faster" if ratio < 1 - threshold else "same"
+        memory = ""
+        if result["peak_bytes"] is not None and old["peak_bytes"]:
+            memory = f", memory {result['peak_bytes'] / old['peak_bytes']:.2f}x"
+        print(f"{result['name']}: {ratio:.2f}x the baseline time ({verdict}){memory}")
+        if verdict == "slower":
+            regressions.append(result["name"])
+    return regressions
+
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Benchmark every learner on seeded synthetic data.")
+    parser.add_argument("--scale", choices=list(SCALES), default="small")
+    for param in SCALES["small"]:
+        parser.add_argument(f"--{param}", type=int, help=f"override the {param} of the scale")
+    parser.add_argument("--only", nargs="+", choices=list(SUITES), help="run these suites only")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per entry point, the best is kept")
+    parser.add_argument("--no-memory", action="store_true", help="skip the traced run measuring peak memory")
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare with")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative slowdown reported as a regression")
+    args = parser.parse_args()
+
+    params = dict(SCALES[args.scale])
+    for param in params:
+        if getattr(args, param) is not None:
+            params[param] = getattr(args, param)
+    report = run(params, args.only, args.repeat, not args.no_memory)
+    if args.output is not None:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+    if args.baseline is not None:
+        with open(args.baseline) as file:
+            regressions = compare(report, json.load(file), args.threshold)
+        if regressions != []:
+            print(f"Regressions: {', '.join(regressions)}")
+            sys.exit(1)
@@ -1,16 +1,39 @@
-from typing import Iterable
-from itertools import product
+"""
+Run from the repository root: python -m ConceptLearning.CandidateElimination
+"""
+from typing import Iterable, Optional, Union
+from array import array
+from functools import cached_property
+from hashlib import sha256
+from struct import Struct
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from weakref import WeakValueDictionary
+import json
+import os
+from Instrumentation.Callbacks import Callback, Instrumentation, Metrics
+from Dataset.Columnar import ColumnarDataset
 
 class Taxonomy:
 
     def __init__(self, name: str, sub_groups: list["Taxonomy"]):
+        for node in sub_groups:
+            if node.index is not None:
+                raise ValueError(f"Cannot add {name} above {node.name}: its taxonomy is frozen.")
         self.name = name
         self.sub_groups = sub_groups
         self.parent_groups: list[Taxonomy] = []
         for node in self.sub_groups:
             node.parent_groups.append(self)
+        # set by freeze
+        self.index: Optional[TaxonomyIndex] = None
+        self.id = -1
+        self.ancestor_mask = 0
+        self.descendant_mask = 0
 
     def __gt__(self, other: "Taxonomy"):
+        if self.index is not None and self.index is other.index:
+            return other.ancestor_mask >> self.id & 1 == 1
         parents = other.parent_groups
         while parents != []:
             if self in parents:
@@ -32,10 +55,120 @@ class Taxonomy:
             print(f"{self.name}->{sub_group.name}")
             sub_group.show()
 
-class Hypothesis:
+    def freeze(self) -> "TaxonomyIndex":
+        """
+        Index the whole taxonomy this node belongs to, making > and >= between its nodes O(1).
+        Afterwards no new group can be created above one of its nodes.
+        """
+        return self.index if self.index is not None else TaxonomyIndex(self)
+
+class TaxonomyIndex:
+    """
+    A frozen taxonomy: every node gets an integer id, parents before their sub groups and by depth then name
+    (the names in one taxonomy must be unique), and bitmasks of the ids of all its ancestors and of all its descendants
+    (the transitive closure of parent_groups and sub_groups), so a > b is a single bit test of b.ancestor_mask.
+    """
+
+    def __init__(self, node: Taxonomy):
+        # every node connected to node, through parents or sub groups
+        name = node.name
+        component = {node}
+        stack = [node]
+        while stack != []:
+            current = stack.pop()
+            for neighbour in current.sub_groups + current.parent_groups:
+                if neighbour not in component:
+                    component.add(neighbour)
+                    stack.append(neighbour)
+        # names order the nodes and identify them in fingerprint, so they must be unique
+        names: dict[str, Taxonomy] = {}
+        for current in component:
+            if names.setdefault(current.name, current) is not current:
+                raise ValueError(f"The taxonomy of {name} has more than one node named {current.name}.")
+        # topological order, roots first, by depth then name so ids do not depend on construction order
+        num_parents = {node: len(set(node.parent_groups)) for node in component}
+        layer = sorted((node for node in component if num_parents[node] == 0), key=lambda node: node.name)
+        self.nodes: list[Taxonomy] = []
+        while layer != []:
+            self.nodes.extend(layer)
+            next_layer = []
+            for node in layer:
+                for sub_group in dict.fromkeys(node.sub_groups):
+                    num_parents[sub_group] -= 1
+                    if num_parents[sub_group] == 0:
+                        next_layer.append(sub_group)
+            layer = sorted(next_layer, key=lambda node: node.name)
+        if len(self.nodes) != len(component):
+            raise ValueError(f"The taxonomy of {name} has a cycle.")
+        self.roots = [node for node in self.nodes if node.parent_groups == []]
+        for node_id, node in enumerate(self.nodes):
+            node.id = node_id
+            node.ancestor_mask = 0
+            for parent in node.parent_groups:
+                node.ancestor_mask |= parent.ancestor_mask | 1 << parent.id
+        for node in reversed(self.nodes):
+            node.descendant_mask = 0
+            for sub_group in node.sub_groups:
+                node.descendant_mask |= sub_group.descendant_mask | 1 << sub_group.id
+        for node in self.nodes:
+            node.index = self
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __getitem__(self, node_id: int):
+        return self.nodes[node_id]
+
+    def fingerprint(self) -> str:
+        """
+        A hash of the names and parents of the nodes in id order: equal for taxonomies built the same way,
+        so ids saved with one are valid for the other.
+        """
+        digest = sha256()
+        for node in self.nodes:
+            digest.update(json.dumps([node.name, sorted(parent.id for parent in node.parent_groups)]).encode())
+        return digest.hexdigest()[:16]
+
+    def ancestors(self, node: Taxonomy) -> list[Taxonomy]:
+        return [self.nodes[node_id] for node_id in ids(node.ancestor_mask)]
+
+    def descendants(self, node: Taxonomy) -> list[Taxonomy]:
+        return [self.nodes[node_id] for node_id in ids(node.descendant_mask)]
+
+def ids(mask: int):
+    """
+    The positions of the set bits of mask, from lowest.
+    """
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
 
-    def __init__(self, constraints: list[Taxonomy]):
-        self.constraints = constraints
+class Hypothesis:
+    """
+    An immutable tuple of constraints, one per attribute. Hypotheses are interned: building one with the same constraints
+    as a live one returns it, so equality is identity and the hash is computed once.
+    Building a hypothesis freezes the taxonomies of its constraints.
+    """
+
+    __slots__ = ("constraints", "hash", "__weakref__")
+
+    interned: "WeakValueDictionary[tuple[Taxonomy, ...], Hypothesis]" = WeakValueDictionary()
+
+    def __new__(cls, constraints: Iterable[Taxonomy]):
+        constraints = tuple(constraints)
+        hypothesis = cls.interned.get(constraints)
+        if hypothesis is None:
+            for constraint in constraints:
+                constraint.freeze()
+            hypothesis = super().__new__(cls)
+            hypothesis.constraints = constraints
+            hypothesis.hash = hash(constraints)
+            cls.interned[constraints] = hypothesis
+        return hypothesis
+
+    def __reduce__(self):
+        return Hypothesis, (self.constraints,)
 
     def cover(self, instance: list[Taxonomy]):
         assert len(self.constraints) == len(instance), f"Unequal length of constraints and attributes: {self}, {instance}"
@@ -45,122 +178,411 @@ class Hypothesis:
         return all(a >= b for a, b in zip(self.constraints, other.constraints))
 
     def __gt__(self, other: "Hypothesis"):
-        return self >= other and not other >= self
+        # taxonomies are acyclic, so h >= h' and h' >= h only for h is h'
+        return self is not other and self >= other
 
     def __hash__(self):
-        return hash(tuple(self.constraints))
+        return self.hash
 
-    def __eq__(self, other: object):
-        return isinstance(other, Hypothesis) and self.constraints == other.constraints
+    def replace(self, i: int, constraint: Taxonomy):
+        return Hypothesis(self.constraints[:i] + (constraint,) + self.constraints[i + 1:])
 
-    def minimal_specializations(self, negative_example: list[Taxonomy], S: "BoundarySet"):
+    def minimal_specializations(self, negative_example: list[Taxonomy], S: Union["BoundarySet", "BoundaryIndex"]):
+        """
+        The hypotheses with one constraint replaced by a most general one below it that does not cover the attribute of negative_example,
+        keeping only those at least as general as a member of S. Each is generated once.
+        """
+        S = S if isinstance(S, BoundaryIndex) else BoundaryIndex(S.members)
+        # members of S below self on the attributes before and after each one
+        below = [S.below(i, constraint) for i, constraint in enumerate(self.constraints)]
+        before = [S.all]
+        for mask in below:
+            before.append(before[-1] & mask)
+        after = [S.all]
+        for mask in reversed(below):
+            after.append(after[-1] & mask)
+        after.reverse()
         for i, (constraint, attribute) in enumerate(zip(self.constraints, negative_example)):
-            more_specific_constraints = constraint.sub_groups
-            end_loop = False
-            while more_specific_constraints != []:
-                for more_specific_constraint in more_specific_constraints:
-                    if not more_specific_constraint >= attribute:
-                        end_loop = True
-                        new_constraints = self.constraints.copy()
-                        new_constraints[i] = more_specific_constraint
-                        new_hypothesis = Hypothesis(new_constraints)
-                        if not new_hypothesis.cover(negative_example) and any(new_hypothesis > s for s in S.members):
-                            yield new_hypothesis
-                if end_loop:
-                    break
-                more_specific_constraints = list(set(
-                    new_sub_group for sub_group in more_specific_constraints for new_sub_group in sub_group.sub_groups
-                ))
-
-    def minimal_generalizations(self, positive_example: list[Taxonomy], G: "BoundarySet"):
-        possible_new_constraints: list[list[Taxonomy]] = [[] for _ in range(len(self.constraints))]
-        for i, (constraint, attribute) in enumerate(zip(self.constraints, positive_example)):
+            others = before[i] & after[i + 1]
+            if others == 0:
+                continue
+            not_covering = constraint.descendant_mask & ~(attribute.ancestor_mask | 1 << attribute.id)
+            # walk down through the constraints that still cover the attribute
+            visited = {constraint}
+            frontier = [constraint]
+            while frontier != []:
+                for sub_group in frontier.pop().sub_groups:
+                    if sub_group in visited:
+                        continue
+                    visited.add(sub_group)
+                    if not_covering >> sub_group.id & 1 == 0:
+                        frontier.append(sub_group)
+                    elif sub_group.ancestor_mask & not_covering == 0:
+                        if others & S.below(i, sub_group):
+                            yield self.replace(i, sub_group)
+
+    def minimal_generalizations(self, positive_example: list[Taxonomy], G: Union["BoundarySet", "BoundaryIndex"]):
+        """
+        The hypotheses with every constraint replaced by a most specific one above it that covers the attribute of positive_example,
+        keeping only those at most as general as a member of G. Partial tuples of constraints no member of G is above are dropped early.
+        """
+        G = G if isinstance(G, BoundaryIndex) else BoundaryIndex(G.members)
+        possible_new_constraints: list[list[Taxonomy]] = []
+        for constraint, attribute in zip(self.constraints, positive_example):
             if constraint >= attribute:
-                possible_new_constraints[i].append(constraint)
+                possible_new_constraints.append([constraint])
                 continue
-            more_general_constraints = constraint.parent_groups
-            end_loop = False
-            while more_general_constraints != []:
-                for more_general_constraint in more_general_constraints:
-                    if more_general_constraint >= attribute:
-                        end_loop = True
-                        possible_new_constraints[i].append(more_general_constraint)
-                if end_loop:
-                    break
-                more_general_constraints: list[Taxonomy] = list(set(
-                    new_parent for parent in more_general_constraints for new_parent in parent.parent_groups
-                ))
-        for minimal_generalization in product(*possible_new_constraints):
-            new_hypothesis = Hypothesis(list(minimal_generalization))
-            if new_hypothesis.cover(positive_example) and any(g > new_hypothesis for g in G.members):
-                yield new_hypothesis
+            covering = (constraint.ancestor_mask | 1 << constraint.id) & (attribute.ancestor_mask | 1 << attribute.id)
+            # walk up through the constraints that do not cover the attribute yet
+            new_constraints: list[Taxonomy] = []
+            visited = {constraint}
+            frontier = [constraint]
+            while frontier != []:
+                for parent in frontier.pop().parent_groups:
+                    if parent in visited:
+                        continue
+                    visited.add(parent)
+                    if covering >> parent.id & 1 == 0:
+                        frontier.append(parent)
+                    elif parent.descendant_mask & covering == 0:
+                        new_constraints.append(parent)
+            possible_new_constraints.append(new_constraints)
+        partials: list[tuple[tuple[Taxonomy, ...], int]] = [((), G.all)]
+        for i, new_constraints in enumerate(possible_new_constraints):
+            partials = [
+                (constraints + (new_constraint,), above)
+                for constraints, mask in partials for new_constraint in new_constraints
+                for above in (mask & G.above(i, new_constraint),) if above
+            ]
+        for constraints, _ in partials:
+            yield Hypothesis(constraints)
 
     def __repr__(self):
         return f"<{', '.join(constraint.name for constraint in self.constraints)}>"
 
+class Encoding:
+    """
+    Hypotheses over the same frozen taxonomies packed into ints: the id of each constraint in its taxonomy,
+    in a field of fixed width per attribute.
+    """
+
+    def __init__(self, indices: tuple[TaxonomyIndex, ...]):
+        self.indices = indices
+        self.widths = [max(1, (len(index) - 1).bit_length()) for index in indices]
+        self.shifts = [sum(self.widths[:i]) for i in range(len(indices))]
+        self.bits = sum(self.widths)
+
+    # one Encoding per tuple of taxonomies
+    encodings: "dict[tuple[TaxonomyIndex, ...], Encoding]" = {}
+
+    @staticmethod
+    def of(hypothesis: Hypothesis) -> "Encoding":
+        return Encoding.over(tuple(constraint.index for constraint in hypothesis.constraints))
+
+    @staticmethod
+    def over(indices: tuple[TaxonomyIndex, ...]) -> "Encoding":
+        encoding = Encoding.encodings.get(indices)
+        if encoding is None:
+            encoding = Encoding.encodings[indices] = Encoding(indices)
+        return encoding
+
+    def encode(self, hypothesis: Hypothesis) -> int:
+        code = 0
+        for constraint, index, shift in zip(hypothesis.constraints, self.indices, self.shifts):
+            assert constraint.index is index, f"{hypothesis} does not use the taxonomies of this encoding."
+            code |= constraint.id << shift
+        return code
+
+    def decode(self, code: int) -> Hypothesis:
+        return Hypothesis(
+            index.nodes[code >> shift & (1 << width) - 1] for index, shift, width in zip(self.indices, self.shifts, self.widths)
+        )
+
+def bitset(positions: list[int], size: int) -> int:
+    bits = bytearray((size + 7) // 8)
+    for position in positions:
+        bits[position >> 3] |= 1 << (position & 7)
+    return int.from_bytes(bits, "little")
+
+class BoundaryIndex:
+    """
+    For a list of hypotheses, per attribute, a bitset (bit k for members[k]) of the members having each constraint,
+    to find the members above or below a constraint without comparing with each of them.
+    """
+
+    def __init__(self, members: list[Hypothesis]):
+        self.members = members
+        self.all = (1 << len(members)) - 1
+        self.postings: list[dict[Taxonomy, int]] = []
+        for i in range(len(members[0].constraints) if members else 0):
+            positions: dict[Taxonomy, list[int]] = {}
+            for position, hypothesis in enumerate(members):
+                positions.setdefault(hypothesis.constraints[i], []).append(position)
+            self.postings.append({constraint: bitset(constraint_positions, len(members)) for constraint, constraint_positions in positions.items()})
+        self.cache: dict[tuple[int, Taxonomy, bool], int] = {}
+
+    def above(self, i: int, constraint: Taxonomy) -> int:
+        """
+        return
+            bitset of the members whose constraint on attribute i is at or above constraint
+        """
+        key = (i, constraint, True)
+        if key not in self.cache:
+            self.cache[key] = sum(bits for other, bits in self.postings[i].items() if other >= constraint) if self.members else 0
+        return self.cache[key]
+
+    def below(self, i: int, constraint: Taxonomy) -> int:
+        """
+        return
+            bitset of the members whose constraint on attribute i is at or below constraint
+        """
+        key = (i, constraint, False)
+        if key not in self.cache:
+            self.cache[key] = sum(bits for other, bits in self.postings[i].items() if constraint >= other) if self.members else 0
+        return self.cache[key]
+
+def undominated(hypotheses: Iterable[Hypothesis], keep_general: bool) -> list[Hypothesis]:
+    """
+    The hypotheses no other one is more specific than (or more general than, with keep_general), without comparing all pairs:
+    the hypotheses a given one dominates are the AND across attributes of the BoundaryIndex bitsets below (above) its constraints.
+    """
+    hypotheses = list(dict.fromkeys(hypotheses))
+    index = BoundaryIndex(hypotheses)
+    result = []
+    for position, hypothesis in enumerate(hypotheses):
+        dominated = index.all
+        for i, constraint in enumerate(hypothesis.constraints):
+            dominated &= index.above(i, constraint) if keep_general else index.below(i, constraint)
+            if dominated == 1 << position:
+                break
+        if dominated == 1 << position:
+            result.append(hypothesis)
+    return result
+
+def update(members: list[Hypothesis], example: list[Taxonomy], classification: bool, other: BoundaryIndex) -> list[Hypothesis]:
+    """
+    members with those inconsistent with example replaced by their minimal generalizations (other is then G)
+    or minimal specializations (other is then S).
+    """
+    new_members: list[Hypothesis] = []
+    for hypothesis in members:
+        if hypothesis.cover(example) is classification:
+            new_members.append(hypothesis)
+        elif classification is True:
+            new_members.extend(hypothesis.minimal_generalizations(example, other))
+        else:
+            new_members.extend(hypothesis.minimal_specializations(example, other))
+    return new_members
+
+# encoding of the hypotheses in a worker process, set once by init_worker
+worker_state: "Encoding"
+
+def init_worker(encoding: "Encoding"):
+    global worker_state
+    worker_state = encoding
+
+def update_codes(codes: array, other_codes: array, example_ids: list[int], classification: bool):
+    """
+    update on encoded hypotheses, in a worker process.
+    """
+    encoding = worker_state
+    example = [index.nodes[node_id] for index, node_id in zip(encoding.indices, example_ids)]
+    other = BoundaryIndex([encoding.decode(code) for code in other_codes])
+    return [encoding.encode(hypothesis) for hypothesis in update([encoding.decode(code) for code in codes], example, classification, other)]
+
 class BoundarySet:
+    """
+    Members are kept as packed codes of an Encoding (an array of 8-byte ints when they fit in 64 bits),
+    and decoded to Hypothesis on access to members.
+    """
 
     def __init__(self, init_members: list[Hypothesis]):
+        self.encoding: Optional[Encoding] = None
         self.members = init_members
 
+    @property
+    def members(self) -> list[Hypothesis]:
+        return [self.encoding.decode(code) for code in self.codes]
+
+    @members.setter
+    def members(self, members: list[Hypothesis]):
+        if self.encoding is None and members != []:
+            self.encoding = Encoding.of(members[0])
+        self.codes: Union[array, list[int]] = array("Q") if self.encoding is None or self.encoding.bits <= 64 else []
+        self.codes.extend(self.encoding.encode(hypothesis) for hypothesis in members)
+
+    @classmethod
+    def from_codes(cls, encoding: Encoding, codes: Iterable[int]) -> "BoundarySet":
+        boundary_set = cls([])
+        boundary_set.encoding = encoding
+        boundary_set.codes = array("Q", codes) if encoding.bits <= 64 else list(codes)
+        return boundary_set
+
+    def __len__(self):
+        return len(self.codes)
+
     def remove_inconsistency(self, example: list[Taxonomy], classification: bool):
         if classification is True:
             self.members = [hypothesis for hypothesis in self.members if hypothesis.cover(example)]
         else:
             self.members = [hypothesis for hypothesis in self.members if not hypothesis.cover(example)]
 
-    def generalize(self, positive_example: list[Taxonomy], G: "BoundarySet"):
-        new_S_members: list[Hypothesis] = []
-        for s in self.members:
-            if not s.cover(positive_example):
-                for new_s in s.minimal_generalizations(positive_example, G):
-                    new_S_members.append(new_s)
-            else:
-                new_S_members.append(s)
-        self.members = [s for s in new_S_members if not any(s > another for another in new_S_members)]
-
-    def specialize(self, negative_example: list[Taxonomy], S: "BoundarySet"):
-        new_G_members: list[Hypothesis] = []
-        for g in self.members:
-            if g.cover(negative_example):
-                for new_g in g.minimal_specializations(negative_example, S):
-                    new_G_members.append(new_g)
-            else:
-                new_G_members.append(g)
-        self.members = [g for g in new_G_members if not any(another > g for another in new_G_members)]
+    def updated(self, example: list[Taxonomy], classification: bool, other: "BoundarySet", pool: Optional[ProcessPoolExecutor] = None):
+        """
+        The members after update, computed in chunks on pool if given.
+        """
+        if pool is None or len(self) < 2:
+            return update(self.members, example, classification, BoundaryIndex(other.members))
+        chunk = -(-len(self) // 32)
+        tasks = [
+            pool.submit(update_codes, self.codes[start:start + chunk], other.codes, [attribute.id for attribute in example], classification)
+            for start in range(0, len(self), chunk)
+        ]
+        return [self.encoding.decode(code) for task in tasks for code in task.result()]
+
+    def generalize(self, positive_example: list[Taxonomy], G: "BoundarySet", pool: Optional[ProcessPoolExecutor] = None):
+        self.members = undominated(self.updated(positive_example, True, G, pool), keep_general=False)
+
+    def specialize(self, negative_example: list[Taxonomy], S: "BoundarySet", pool: Optional[ProcessPoolExecutor] = None):
+        self.members = undominated(self.updated(negative_example, False, S, pool), keep_general=True)
 
     def __repr__(self):
         return f"{{{', '.join(str(hypothesis) for hypothesis in self.members)}}}"
 
 class VersionSpace:
 
+    # checkpoint layout: MAGIC, version and header length, a JSON header, then the codes of S and G,
+    # each in (encoding.bits + 7) // 8 little-endian bytes
+    MAGIC = b"CEVS"
+    VERSION = 1
+    PREFIX = Struct("<4sII")
+
     def __init__(self, init_S: BoundarySet, init_G: BoundarySet):
         self.S = init_S
         self.G = init_G
+        self.num_examples = 0
+
+    @property
+    def collapsed(self):
+        """
+        True once no hypothesis is consistent with every example (the examples are noisy or the concept is not representable).
+        """
+        return len(self.S) == 0 or len(self.G) == 0
 
-    def learn(self, examples: Iterable[tuple[list[Taxonomy], bool]]):
+    def update(self, example: list[Taxonomy], classification: bool, pool: Optional[ProcessPoolExecutor] = None):
+        """
+        Learn one example, silently. Once the version space has collapsed, examples are only counted.
+        return
+            False if the version space has collapsed
+        """
+        self.num_examples += 1
+        if self.collapsed:
+            return False
+        self.__dict__.pop("hypotheses", None)
+        if classification is True:
+            self.G.remove_inconsistency(example, classification)
+            self.S.generalize(example, self.G, pool)
+        else:
+            self.S.remove_inconsistency(example, classification)
+            self.G.specialize(example, self.S, pool)
+        return not self.collapsed
+
+    def learn(
+        self, examples: Iterable[tuple[list[Taxonomy], bool]], instrumentation: Optional[Instrumentation] = None, processes: int = 1,
+        checkpoint_path: Optional[str] = None, checkpoint_every: int = 1000
+    ):
+        """
+        update with every example, stopping early if the version space collapses.
+        To learn from the rows of a ColumnarDataset, pass columnar_examples(dataset, ...).
+        instrumentation (kept in self.instrumentation) times the boundary updates,
+        counts examples, and passes an event with the example and the new S and G to its callbacks for every example.
+        processes > 1 updates the members of a boundary set in chunks on a process pool, worth it for large boundary sets.
+        checkpoint_path saves the version space every checkpoint_every examples and at the end. To resume, load it
+        and learn from the examples after the first num_examples.
+        return
+            False if the version space has collapsed
+        """
         S, G = self.S, self.G
-        print("Initial Version Space")
-        print(f"S0: {S}")
-        print(f"G0: {G}\n")
-        for i, (example, classification) in enumerate(examples, start=1):
-            if classification is True:
-                G.remove_inconsistency(example, classification)
-                S.generalize(example, G)
-            else:
-                S.remove_inconsistency(example, classification)
-                G.specialize(example, S)
-            print(f"{i}: {'+' if classification is True else '-'}{example}")
-            print(f"S{i}: {S}")
-            print(f"G{i}: {G}\n")
-        self.generate_intermediate_hypotheses()
-        print("Final Version Space")
-        self.show()
+        instrumentation = self.instrumentation = instrumentation or Instrumentation()
+        instrumentation.begin("VersionSpace")
+        update_phase = instrumentation.phase("boundary_update")
+        encoding = S.encoding or G.encoding
+        with ProcessPoolExecutor(processes, initializer=init_worker, initargs=(encoding,)) if processes > 1 else nullcontext() as pool:
+            for example, classification in examples:
+                with update_phase:
+                    consistent = self.update(example, classification, pool)
+                instrumentation.count("examples")
+                if instrumentation.callbacks:
+                    instrumentation.example("VersionSpace", self.num_examples, example=example, classification=classification, S=S, G=G)
+                if checkpoint_path is not None and self.num_examples % checkpoint_every == 0:
+                    with instrumentation.phase("checkpoint"):
+                        self.save(checkpoint_path)
+                if not consistent:
+                    instrumentation.count("collapsed")
+                    break
+        if checkpoint_path is not None:
+            with instrumentation.phase("checkpoint"):
+                self.save(checkpoint_path)
+        instrumentation.end("VersionSpace")
+        return not self.collapsed
+
+    def save(self, path: str):
+        """
+        Write a checkpoint: the number of examples learned and a fingerprint of every attribute's taxonomy in a JSON header,
+        followed by the codes of S and G. The file is replaced atomically, so a crash never leaves a torn checkpoint.
+        """
+        encoding = self.S.encoding or self.G.encoding
+        assert encoding is not None, "Cannot save a version space with no hypotheses in S nor G."
+        header = json.dumps({
+            "num_examples": self.num_examples,
+            "taxonomies": [index.fingerprint() for index in encoding.indices],
+            "S": len(self.S),
+            "G": len(self.G)
+        }).encode()
+        width = (encoding.bits + 7) // 8
+        with open(f"{path}.tmp", "wb") as file:
+            file.write(VersionSpace.PREFIX.pack(VersionSpace.MAGIC, VersionSpace.VERSION, len(header)))
+            file.write(header)
+            for boundary_set in (self.S, self.G):
+                file.write(b"".join(code.to_bytes(width, "little") for code in boundary_set.codes))
+        os.replace(f"{path}.tmp", path)
+
+    @classmethod
+    def load(cls, path: str, taxonomies: list[Taxonomy]) -> "VersionSpace":
+        """
+        taxonomies: a node (the root, say) of the taxonomy of every attribute, in order, built the same way as when saving
+        """
+        with open(path, "rb") as file:
+            magic, version, header_len = VersionSpace.PREFIX.unpack(file.read(VersionSpace.PREFIX.size))
+            if magic != VersionSpace.MAGIC:
+                raise ValueError(f"{path} is not a VersionSpace checkpoint.")
+            if version != VersionSpace.VERSION:
+                raise ValueError(f"{path} has checkpoint version {version}, this code reads version {VersionSpace.VERSION}.")
+            header = json.loads(file.read(header_len))
+            data = file.read()
+        encoding = Encoding.over(tuple(taxonomy.freeze() for taxonomy in taxonomies))
+        if [index.fingerprint() for index in encoding.indices] != header["taxonomies"]:
+            raise ValueError(f"{path} was saved with different taxonomies.")
+        width = (encoding.bits + 7) // 8
+        codes = [int.from_bytes(data[start:start + width], "little") for start in range(0, len(data), width)]
+        version_space = cls(
+            BoundarySet.from_codes(encoding, codes[:header["S"]]), BoundarySet.from_codes(encoding, codes[header["S"]:])
+        )
+        version_space.num_examples = header["num_examples"]
+        return version_space
+
+    @cached_property
+    def hypotheses(self) -> list[list[Hypothesis]]:
+        """
+        The version space layer by layer, generated on first access after an update.
+        """
+        return self.generate_intermediate_hypotheses()
 
     def generate_intermediate_hypotheses(self):
         S, G = self.S, self.G
+        S_members = S.members
         self.hypotheses = [G.members]
-        base_layer = G.members
+        base_layer = self.hypotheses[0]
         middle_layer: set[Hypothesis] = set()
         generated: set[Hypothesis] = set()
         while True:
@@ -168,10 +590,8 @@ class VersionSpace:
                 for i, constraint in enumerate(b.constraints):
                     more_specific_constraints = constraint.sub_groups
                     for more_specific_constraint in more_specific_constraints:
-                        new_constraints = b.constraints.copy()
-                        new_constraints[i] = more_specific_constraint
-                        new_hypothesis = Hypothesis(new_constraints)
-                        if new_hypothesis not in generated and any(new_hypothesis > s for s in S.members):
+                        new_hypothesis = b.replace(i, more_specific_constraint)
+                        if new_hypothesis not in generated and any(new_hypothesis > s for s in S_members):
                             middle_layer.add(new_hypothesis)
             if len(middle_layer) == 0:
                 break
@@ -179,37 +599,233 @@ class VersionSpace:
                 self.hypotheses.append(list(middle_layer))
                 generated.update(middle_layer)
                 base_layer, middle_layer = middle_layer, set()
-        self.hypotheses.append(S.members)
+        self.hypotheses.append(S_members)
+        return self.hypotheses
 
     def show(self):
-        if not hasattr(self, "hypotheses"):
-            self.generate_intermediate_hypotheses()
         print("Most General")
         for layer in self.hypotheses:
             print(", ".join(str(hypothesis) for hypothesis in layer))
         print("Most Specific\n")
 
-    def classify(self, new_instance: list[Taxonomy]):
+    def count(self, instance: Optional[list[Taxonomy]] = None) -> int:
+        """
+        return
+            number of hypotheses in the version space (covering instance if given), counted from S and G without generating them
+        """
+        allowed = None if instance is None else [attribute.ancestor_mask | 1 << attribute.id for attribute in instance]
+        return count_between(BoundaryIndex(self.S.members), BoundaryIndex(self.G.members), allowed)
+
+    def iter_hypotheses(self):
         """
+        Every hypothesis of the version space once, generated lazily constraint by constraint.
+        """
+        S, G = BoundaryIndex(self.S.members), BoundaryIndex(self.G.members)
+        if S.members == [] or G.members == []:
+            return
+        num_attributes = len(S.members[0].constraints)
+        def extend(constraints: tuple[Taxonomy, ...], lower: int, upper: int):
+            if len(constraints) == num_attributes:
+                yield Hypothesis(constraints)
+                return
+            for (new_lower, new_upper), new_constraints in narrow(S, G, len(constraints), lower, upper).items():
+                for new_constraint in new_constraints:
+                    yield from extend(constraints + (new_constraint,), new_lower, new_upper)
+        yield from extend((), S.all, G.all)
+
+    def classify(self, new_instance: list[Taxonomy], materialize: bool = False):
+        """
+        Majority vote of the hypotheses of the version space, counted from the boundaries.
+        materialize votes over the hypotheses of generate_intermediate_hypotheses instead, which lists all of them
+        (and counts a hypothesis in both S and G twice).
         return
             classification: bool
             confidence: float
         """
-        if not hasattr(self, "hypotheses"):
-            self.generate_intermediate_hypotheses()
-        positive, all = 0, 0
-        for layer in self.hypotheses:
-            for hypothesis in layer:
-                if hypothesis.cover(new_instance):
-                    positive += 1
-                all += 1
-        if positive * 2 > all:
-            return True, positive / all
+        if materialize:
+            positive, all = 0, 0
+            for layer in self.hypotheses:
+                for hypothesis in layer:
+                    if hypothesis.cover(new_instance):
+                        positive += 1
+                    all += 1
         else:
-            return False, (all - positive) / all
+            positive, all = self.count(new_instance), self.count()
+        return vote(positive, all)
+
+    def classify_many(self, instances: Iterable[list[Taxonomy]], materialize: bool = False, processes: int = 1):
+        """
+        classify for a batch of instances, giving the same results with the coverage of every attribute value worked out once
+        for the whole batch (see classify_batch). processes > 1 classifies chunks of the batch on a process pool.
+        return
+            (classification, confidence) for every instance
+        """
+        instances = list(instances)
+        hypotheses = None
+        if materialize:
+            hypotheses = [hypothesis for layer in self.hypotheses for hypothesis in layer]
+        if processes == 1 or len(instances) < 2:
+            return classify_batch(instances, self.S.members, self.G.members, hypotheses)
+        encoding = self.S.encoding or self.G.encoding
+        codes = None if hypotheses is None else [encoding.encode(hypothesis) for hypothesis in hypotheses]
+        chunk = -(-len(instances) // (processes * 4))
+        with ProcessPoolExecutor(processes, initializer=init_worker, initargs=(encoding,)) as pool:
+            tasks = [
+                pool.submit(
+                    classify_codes, [[attribute.id for attribute in instance] for instance in instances[start:start + chunk]],
+                    self.S.codes, self.G.codes, codes
+                )
+                for start in range(0, len(instances), chunk)
+            ]
+            return [result for task in tasks for result in task.result()]
+
+def vote(positive: int, all: int):
+    if positive * 2 > all:
+        return True, positive / all
+    else:
+        return False, (all - positive) / all
+
+def classify_batch(
+    instances: list[list[Taxonomy]], S_members: list[Hypothesis], G_members: list[Hypothesis], hypotheses: Optional[list[Hypothesis]] = None
+):
+    """
+    Votes for a batch of instances over the version space of S_members and G_members,
+    or over hypotheses (a materialized version space, possibly with repeats) if given.
+    For hypotheses, a BoundaryIndex gives per attribute value the bitset of the hypotheses covering it, ANDed across attributes.
+    Otherwise count_between counts the covering hypotheses, with the bitsets of the members of S and G below and above
+    each constraint cached for the whole batch. The vote of every distinct instance is cached too.
+    """
+    votes: dict[tuple[Taxonomy, ...], tuple[bool, float]] = {}
+    results = []
+    if hypotheses is not None:
+        index = BoundaryIndex(hypotheses)
+        all = len(hypotheses)
+    else:
+        S, G = BoundaryIndex(S_members), BoundaryIndex(G_members)
+        all = count_between(S, G)
+    for instance in instances:
+        key = tuple(instance)
+        if key not in votes:
+            if hypotheses is not None:
+                covering = index.all
+                for i, attribute in enumerate(instance):
+                    covering &= index.above(i, attribute)
+                positive = covering.bit_count()
+            else:
+                positive = count_between(S, G, [attribute.ancestor_mask | 1 << attribute.id for attribute in instance])
+            votes[key] = vote(positive, all)
+        results.append(votes[key])
+    return results
+
+def classify_codes(instance_ids: list[list[int]], S_codes: array, G_codes: array, codes: Optional[list[int]]):
+    """
+    classify_batch on encoded instances and hypotheses, in a worker process.
+    """
+    encoding = worker_state
+    instances = [[index.nodes[node_id] for index, node_id in zip(encoding.indices, node_ids)] for node_ids in instance_ids]
+    return classify_batch(
+        instances, [encoding.decode(code) for code in S_codes], [encoding.decode(code) for code in G_codes],
+        None if codes is None else [encoding.decode(code) for code in codes]
+    )
+
+def narrow(S: BoundaryIndex, G: BoundaryIndex, attribute: int, lower: int, upper: int, allowed: Optional[list[int]] = None):
+    """
+    A hypothesis is in the version space when some member of S is below it and some member of G above it, on every attribute.
+    Given lower and upper, the bitsets of the members of S and G below and above a hypothesis on the attributes before attribute,
+    return
+        the constraints it can take on attribute (restricted to the ids in allowed[attribute] if given),
+        grouped by the new bitsets {(lower, upper): [constraint, ...]}
+    """
+    groups: dict[tuple[int, int], list[Taxonomy]] = {}
+    for constraint in S.members[0].constraints[attribute].index.nodes:
+        if allowed is not None and allowed[attribute] >> constraint.id & 1 == 0:
+            continue
+        new_lower = lower & S.below(attribute, constraint)
+        if new_lower:
+            new_upper = upper & G.above(attribute, constraint)
+            if new_upper:
+                groups.setdefault((new_lower, new_upper), []).append(constraint)
+    return groups
+
+def count_between(S: BoundaryIndex, G: BoundaryIndex, allowed: Optional[list[int]] = None) -> int:
+    """
+    Number of hypotheses in the version space of S and G, attribute by attribute with narrow,
+    memoized on the attribute and the bitsets of members still below and above.
+    """
+    if S.members == [] or G.members == []:
+        return 0
+    num_attributes = len(S.members[0].constraints)
+    counts: dict[tuple[int, int, int], int] = {}
+    def count(attribute: int, lower: int, upper: int) -> int:
+        if attribute == num_attributes:
+            return 1
+        if (attribute, lower, upper) not in counts:
+            counts[attribute, lower, upper] = sum(
+                len(constraints) * count(attribute + 1, new_lower, new_upper)
+                for (new_lower, new_upper), constraints in narrow(S, G, attribute, lower, upper, allowed).items()
+            )
+        return counts[attribute, lower, upper]
+    return count(0, S.all, G.all)
+
+def columnar_instances(dataset: ColumnarDataset, attributes: list[tuple[str, Taxonomy]], chunk_size: int = 65536):
+    """
+    The rows of dataset as instances for learn and classify_many, one chunk at a time:
+    attributes pairs the categorical column of every attribute with the root of its taxonomy (frozen if it is not yet),
+    whose node of the same name stands for a value of the column.
+    """
+    tables = []
+    for name, root in attributes:
+        if not dataset.is_categorical(name):
+            raise ValueError(f"{name} is numeric in {dataset.path}, an attribute needs a categorical column.")
+        nodes = {node.name: node for node in reversed(root.freeze().nodes)}
+        unknown = [value for value in dataset.values[name] if value not in nodes]
+        if unknown != []:
+            raise ValueError(f"The taxonomy of {name} has no nodes named {unknown}.")
+        tables.append([nodes[value] for value in dataset.values[name]])
+    names = [name for name, _ in attributes]
+    for chunk in dataset.chunks(chunk_size, names):
+        columns = [chunk[name].tolist() for name in names]
+        if any(ColumnarDataset.MISSING in column for column in columns):
+            raise ValueError(f"Every instance needs a value of every attribute, {dataset.path} has empty cells in {names}.")
+        for codes in zip(*columns):
+            yield [table[code] for table, code in zip(tables, codes)]
+
+def columnar_examples(dataset: ColumnarDataset, attributes: list[tuple[str, Taxonomy]], target: str, positive: str = "Yes", chunk_size: int = 65536):
+    """
+    columnar_instances classified by the categorical column target, positive where its value is positive.
+    """
+    if not dataset.is_categorical(target) or positive not in dataset.values[target]:
+        raise ValueError(f"{target} in {dataset.path} is not a categorical column with the value {positive}.")
+    positive_code = dataset.values[target].index(positive)
+    labels = (code == positive_code for chunk in dataset.chunks(chunk_size, [target]) for code in chunk[target].tolist())
+    return zip(columnar_instances(dataset, attributes, chunk_size), labels)
+
+class BoundaryPrinter(Callback):
+    """
+    Print the version space before learning, the boundary sets after every example, and the final version space.
+    """
+
+    def __init__(self, version_space: VersionSpace):
+        self.version_space = version_space
+
+    def on_begin(self, learner: str, metrics: Metrics):
+        print("Initial Version Space")
+        print(f"S0: {self.version_space.S}")
+        print(f"G0: {self.version_space.G}\n")
+
+    def on_example(self, learner: str, metrics: Metrics, index: int, **values):
+        print(f"{index}: {'+' if values['classification'] is True else '-'}{values['example']}")
+        print(f"S{index}: {values['S']}")
+        print(f"G{index}: {values['G']}\n")
+
+    def on_end(self, learner: str, metrics: Metrics):
+        print("Final Version Space")
+        self.version_space.show()
 
 if __name__ == "__main__":
 
+    from tempfile import TemporaryDirectory
+
     # EnjoySport
 
     # Sky
@@ -249,6 +865,9 @@ if __name__ == "__main__":
     Change = Taxonomy("Change", [NoForecast])
     AnyForecast = Taxonomy("?", [Same, Change])
 
+    for root in (AnySky, AnyAirTemp, AnyHumidity, AnyWind, AnyWater, AnyForecast):
+        root.freeze()
+
     EXAMPLES = [
         ([Sunny, Hot, Normal, Strong, Warm, Same], True),
         ([Sunny, Hot, High, Strong, Warm, Same], True),
@@ -259,7 +878,7 @@ if __name__ == "__main__":
     S = BoundarySet([Hypothesis([NoSky, NoAirTemp, NoHumidity, NoWind, NoWater, NoForecast])])
     G = BoundarySet([Hypothesis([AnySky, AnyAirTemp, AnyHumidity, AnyWind, AnyWater, AnyForecast])])
     VS = VersionSpace(S, G)
-    VS.learn(EXAMPLES)
+    VS.learn(EXAMPLES, Instrumentation([BoundaryPrinter(VS)]))
 
     NEW_INSTANCES = [
         [Sunny, Hot, Normal, Strong, Cool, Change],
@@ -267,12 +886,25 @@ if __name__ == "__main__":
         [Sunny, Hot, Normal, Weak, Warm, Same],
         [Sunny, Cold, Normal, Strong, Warm, Same],
     ]
-    for new_instance in NEW_INSTANCES:
-        classification, confidence = VS.classify(new_instance)
+    for new_instance, (classification, confidence) in zip(NEW_INSTANCES, VS.classify_many(NEW_INSTANCES)):
         print(f"Classify: {new_instance}")
         print(f"Classification: {'Positive' if classification is True else 'Negative'}")
         print(f"Confidence: {confidence}\n")
 
+    # resume from a checkpoint after the first 2 examples, silently, with update
+    with TemporaryDirectory() as directory:
+        VS = VersionSpace(
+            BoundarySet([Hypothesis([NoSky, NoAirTemp, NoHumidity, NoWind, NoWater, NoForecast])]),
+            BoundarySet([Hypothesis([AnySky, AnyAirTemp, AnyHumidity, AnyWind, AnyWater, AnyForecast])])
+        )
+        VS.learn(EXAMPLES[:2], checkpoint_path=os.path.join(directory, "enjoy_sport.vs"))
+        VS = VersionSpace.load(os.path.join(directory, "enjoy_sport.vs"), [AnySky, AnyAirTemp, AnyHumidity, AnyWind, AnyWater, AnyForecast])
+        print(f"Resumed after {VS.num_examples} examples")
+        for example, classification in EXAMPLES[VS.num_examples:]:
+            VS.update(example, classification)
+        print(f"S{VS.num_examples}: {VS.S}\nG{VS.num_examples}: {VS.G}")
+        print(f"Contradicting the first example collapses it: {not VS.update(EXAMPLES[0][0], False)}\n")
+
     ##########################################################################################################
 
     # # LiveTogether
@@ -318,7 +950,7 @@ if __name__ == "__main__":
     # S = BoundarySet([Hypothesis([NoSex, NoHair, NoHeight, NoNationality, NoSex, NoHair, NoHeight, NoNationality])])
     # G = BoundarySet([Hypothesis([AnySex, AnyHair, AnyHeight, AnyNationality, AnySex, AnyHair, AnyHeight, AnyNationality])])
     # VS = VersionSpace(S, G)
-    # VS.learn(EXAMPLES)
+    # VS.learn(EXAMPLES, Instrumentation([BoundaryPrinter(VS)]))
 
     # NEW_INSTANCE = [Male, Black, Short, Portuguese, Female, Blonde, Tall, Indian]
     # classification, confidence = VS.classify(NEW_INSTANCE)
@@ -0,0 +1,298 @@
+"""
+Run from the repository root: python -m Dataset.Columnar
+"""
+from typing import Iterable, Iterator, Optional, Union
+from mmap import mmap, ACCESS_READ
+from struct import Struct
+import csv
+import json
+import os
+import sys
+import numpy as np
+
+class ColumnarDataset:
+    """
+    A table converted once from CSV (see from_csv) into one file of typed columns, opened by memory-mapping it:
+    every column is a read-only np.ndarray view into the mapping, so opening takes the same time however many rows there are,
+    and only the pages that are read come from disk. Processes opening the same file share one copy through the page cache.
+    A categorical column stores int32 codes into self.values[name], its dictionary, with MISSING for an empty cell.
+    A numeric column stores int64 if every cell is an integer, otherwise float64 with NaN for an empty cell.
+    matrix and samples raise a ValueError on an empty numeric cell instead of passing NaN to a learner.
+    """
+
+    MISSING = -1
+
+    # file layout: MAGIC, version and the offset of the JSON header, the columns, each aligned to ALIGNMENT, then the header
+    MAGIC = b"COLS"
+    VERSION = 1
+    PREFIX = Struct("<4sIQ")
+    ALIGNMENT = 64
+
+    def __init__(self, path: str, num_rows: int, columns: dict[str, np.ndarray], values: dict[str, Optional[list[str]]]):
+        self.path = path
+        self.num_rows = num_rows
+        self.columns = columns
+        self.values = values
+        self.names = list(columns)
+
+    def __len__(self):
+        return self.num_rows
+
+    def column(self, name: str) -> np.ndarray:
+        return self.columns[name]
+
+    def is_categorical(self, name: str) -> bool:
+        return self.values[name] is not None
+
+    @staticmethod
+    def infer_types(csv_path: str, delimiter: str = ","):
+        """
+        One pass over the CSV, in constant memory.
+        return
+            names: list[str]
+            dtypes: list[Optional[str]], "<i8" or "<f8" for a numeric column and None for a categorical one
+            num_rows: int
+        """
+        with open(csv_path, newline="") as file:
+            reader = csv.reader(file, delimiter=delimiter)
+            names = next(reader)
+            integer, numeric = [True] * len(names), [True] * len(names)
+            num_rows = 0
+            for num_rows, row in enumerate(reader, start=1):
+                assert len(row) == len(names), f"Row {num_rows} of {csv_path} has {len(row)} cells, expected {len(names)}."
+                for i, cell in enumerate(row):
+                    if not numeric[i]:
+                        continue
+                    if cell == "":
+                        integer[i] = False
+                        continue
+                    try:
+                        float(cell)
+                    except ValueError:
+                        numeric[i] = integer[i] = False
+                        continue
+                    if integer[i]:
+                        try:
+                            int(cell)
+                        except ValueError:
+                            integer[i] = False
+        dtypes = ["<i8" if is_integer else "<f8" if is_numeric else None for is_integer, is_numeric in zip(integer, numeric)]
+        return names, dtypes, num_rows
+
+    @classmethod
+    def from_csv(
+        cls, csv_path: str, path: str, categorical: Iterable[str] = (), delimiter: str = ",", chunk_size: int = 65536
+    ) -> "ColumnarDataset":
+        """
+        Convert a CSV file with a header row into the columnar format at path, in two passes holding chunk_size rows at a time:
+        the first infers the type of every column, the second encodes the rows and writes them through a memory mapping.
+        A column is numeric when every non-empty cell parses as a number, unless it is named in categorical.
+        The file is written to path.tmp and renamed, so path is never left half-written.
+        return
+            the new dataset, opened
+        """
+        assert sys.byteorder == "little", "The columnar format stores little-endian arrays."
+        names, dtypes, num_rows = cls.infer_types(csv_path, delimiter)
+        categorical = set(categorical)
+        assert categorical <= set(names), f"No columns named {sorted(categorical - set(names))} in {csv_path}."
+        dtypes = [None if name in categorical else dtype for name, dtype in zip(names, dtypes)]
+        offsets, offset = [], cls.ALIGNMENT
+        for dtype in dtypes:
+            offsets.append(offset)
+            offset += -(-num_rows * np.dtype(dtype or "<i4").itemsize // cls.ALIGNMENT) * cls.ALIGNMENT
+        values: list[Optional[list[str]]] = [None if dtype is not None else [] for dtype in dtypes]
+        value_codes: list[dict[str, int]] = [{} for _ in names]
+        with open(path + ".tmp", "wb+") as file:
+            file.truncate(offset)
+            mapping = mmap(file.fileno(), offset)
+            columns = [
+                np.ndarray(num_rows, dtype=dtype or "<i4", buffer=mapping, offset=column_offset)
+                for dtype, column_offset in zip(dtypes, offsets)
+            ]
+            with open(csv_path, newline="") as csv_file:
+                reader = csv.reader(csv_file, delimiter=delimiter)
+                next(reader)
+                start = 0
+                while start < num_rows:
+                    rows = [row for _, row in zip(range(chunk_size), reader)]
+                    for i, cells in enumerate(zip(*rows)):
+                        if dtypes[i] is None:
+                            codes, dictionary = value_codes[i], values[i]
+                            for cell in cells:
+                                if cell != "" and cell not in codes:
+                                    codes[cell] = len(dictionary)
+                                    dictionary.append(cell)
+                            columns[i][start:start + len(rows)] = [codes[cell] if cell != "" else cls.MISSING for cell in cells]
+                        elif dtypes[i] == "<i8":
+                            columns[i][start:start + len(rows)] = [int(cell) for cell in cells]
+                        else:
+                            columns[i][start:start + len(rows)] = [float(cell) if cell != "" else float("nan") for cell in cells]
+                    start += len(rows)
+            del columns
+            mapping.flush()
+            mapping.close()
+            header = json.dumps({
+                "num_rows": num_rows,
+                "columns": [
+                    {"name": name, "dtype": dtype or "<i4", "offset": column_offset, "values": dictionary}
+                    for name, dtype, column_offset, dictionary in zip(names, dtypes, offsets, values)
+                ]
+            }).encode()
+            file.seek(0)
+            file.write(cls.PREFIX.pack(cls.MAGIC, cls.VERSION, offset))
+            file.seek(offset)
+            file.write(header)
+        os.replace(path + ".tmp", path)
+        return cls.open(path)
+
+    @classmethod
+    def open(cls, path: str) -> "ColumnarDataset":
+        assert sys.byteorder == "little", "The columnar format stores little-endian arrays."
+        with open(path, "rb") as file:
+            mapping = mmap(file.fileno(), 0, access=ACCESS_READ)
+        magic, version, header_offset = cls.PREFIX.unpack_from(mapping)
+        if magic != cls.MAGIC:
+            raise ValueError(f"{path} is not a columnar dataset.")
+        if version != cls.VERSION:
+            raise ValueError(f"{path} has format version {version}, this code reads version {cls.VERSION}.")
+        header = json.loads(mapping[header_offset:].decode())
+        num_rows = header["num_rows"]
+        columns = {
+            column["name"]: np.frombuffer(mapping, dtype=column["dtype"], count=num_rows, offset=column["offset"])
+            for column in header["columns"]
+        }
+        return cls(path, num_rows, columns, {column["name"]: column["values"] for column in header["columns"]})
+
+    def chunks(self, chunk_size: int = 65536, names: Optional[list[str]] = None, start: int = 0, stop: Optional[int] = None) -> Iterator[dict[str, np.ndarray]]:
+        """
+        Views of rows start:stop of the columns in names (all by default), chunk_size rows at a time.
+        """
+        names = self.names if names is None else names
+        stop = self.num_rows if stop is None else stop
+        for chunk_start in range(start, stop, chunk_size):
+            yield {name: self.columns[name][chunk_start:min(chunk_start + chunk_size, stop)] for name in names}
+
+    def records(self, names: Optional[list[str]] = None, chunk_size: int = 65536) -> Iterator[dict[str, Union[str, int, float]]]:
+        """
+        Every row as a dict like the examples of DecisionTree, decoded one chunk at a time.
+        Categorical cells become their values and numeric cells Python numbers, empty cells are left out.
+        """
+        names = self.names if names is None else names
+        for chunk in self.chunks(chunk_size, names):
+            decoded = []
+            for name in names:
+                if self.values[name] is None:
+                    decoded.append(chunk[name].tolist())
+                else:
+                    # MISSING (-1) picks the trailing None
+                    dictionary = self.values[name] + [None]
+                    decoded.append([dictionary[code] for code in chunk[name].tolist()])
+            for row in zip(*decoded):
+                yield {name: value for name, value in zip(names, row) if value is not None and value == value}
+
+    def check_present(self, name: str, column: np.ndarray, start: int = 0):
+        """
+        Raise a ValueError if the view column of the numeric column name, starting at row start, has an empty cell (NaN).
+        """
+        if column.dtype.kind == "f":
+            missing = np.flatnonzero(np.isnan(column))
+            if len(missing) > 0:
+                raise ValueError(
+                    f"Row {start + missing[0]} of {self.path} has no value of {name}"
+                    f"{f' ({len(missing)} empty cells in rows {start}:{start + len(column)})' if len(missing) > 1 else ''}."
+                )
+
+    def width(self, names: list[str]) -> int:
+        """
+        return
+            number of matrix columns of names: one per numeric column and one per value of a categorical column
+        """
+        return sum(1 if self.values[name] is None else len(self.values[name]) for name in names)
+
+    def matrix(self, names: list[str], start: int = 0, stop: Optional[int] = None, dtype: str = "float64") -> np.ndarray:
+        """
+        Rows start:stop of the columns in names side by side as one (stop - start, width(names)) array,
+        with every categorical column one-hot encoded (all zeros where it is missing).
+        Raises a ValueError naming the column and row if a numeric column has an empty cell in these rows.
+        This copies, unlike column: ask for a range of rows at a time to keep memory bounded.
+        """
+        stop = self.num_rows if stop is None else min(stop, self.num_rows)
+        result = np.zeros((max(stop - start, 0), self.width(names)), dtype=dtype)
+        position = 0
+        for name in names:
+            column = self.columns[name][start:stop]
+            if self.values[name] is None:
+                self.check_present(name, column, start)
+                result[:, position] = column
+                position += 1
+            else:
+                present = np.flatnonzero(column != ColumnarDataset.MISSING)
+                result[present, position + column[present]] = 1
+                position += len(self.values[name])
+        return result
+
+    def samples(self, features: list[str], target: str, start: int = 0, stop: Optional[int] = None) -> "ColumnarSamples":
+        return ColumnarSamples(self.path, features, target, start, self.num_rows if stop is None else min(stop, self.num_rows))
+
+class ColumnarSamples:
+    """
+    Rows start:stop of a columnar dataset as (x, y) samples of numeric columns for NormalEquation: x is a float for one feature,
+    otherwise a list of floats. An empty cell raises a ValueError naming its column and row. It only holds the path, and every iteration opens the file and reads it chunk by chunk,
+    so it is picklable and shards (see shards) can be sent to worker processes.
+    """
+
+    def __init__(self, path: str, features: list[str], target: str, start: int, stop: int, chunk_size: int = 65536):
+        self.path = path
+        self.features = features
+        self.target = target
+        self.start, self.stop = start, stop
+        self.chunk_size = chunk_size
+
+    def __len__(self):
+        return max(self.stop - self.start, 0)
+
+    def __iter__(self) -> Iterator[tuple[Union[float, list[float]], float]]:
+        dataset = ColumnarDataset.open(self.path)
+        categorical = [name for name in (*self.features, self.target) if dataset.is_categorical(name)]
+        assert categorical == [], f"Samples need numeric columns, {categorical} are categorical."
+        chunk_start = self.start
+        for chunk in dataset.chunks(self.chunk_size, [*self.features, self.target], self.start, self.stop):
+            for name, column in chunk.items():
+                dataset.check_present(name, column, chunk_start)
+            chunk_start += len(chunk[self.target])
+            targets = chunk[self.target].tolist()
+            if len(self.features) == 1:
+                yield from zip(chunk[self.features[0]].tolist(), targets)
+            else:
+                yield from zip(np.column_stack([chunk[name] for name in self.features]).tolist(), targets)
+
+    def shards(self, num_shards: int) -> list["ColumnarSamples"]:
+        share = -(-len(self) // num_shards)
+        return [
+            ColumnarSamples(self.path, self.features, self.target, start, min(start + share, self.stop), self.chunk_size)
+            for start in range(self.start, self.stop, share)
+        ]
+
+if __name__ == "__main__":
+    from tempfile import TemporaryDirectory
+    from random import Random
+    rng = Random(0)
+    with TemporaryDirectory() as directory:
+        csv_path, path = os.path.join(directory, "weather.csv"), os.path.join(directory, "weather.cols")
+        with open(csv_path, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(["Outlook", "Temperature", "Humidity", "Windy", "Play"])
+            for _ in range(10):
+                outlook = rng.choice(["Sunny", "Overcast", "Rain"])
+                humidity = rng.choice(["", str(rng.randint(60, 100))])
+                writer.writerow([outlook, f"{rng.uniform(15, 35):.1f}", humidity, rng.choice(["True", "False"]), rng.choice(["Yes", "No"])])
+        dataset = ColumnarDataset.from_csv(csv_path, path, categorical=["Windy"], chunk_size=4)
+        for name in dataset.names:
+            column = dataset.column(name)
+            print(f"{name}: {column.dtype} {column.tolist()} {'values ' + str(dataset.values[name]) if dataset.is_categorical(name) else ''}")
+        print(f"First records: {list(dataset.records())[:2]}")
+        print(f"Matrix of Outlook and Temperature:\n{dataset.matrix(['Outlook', 'Temperature'], 0, 3)}")
+        try:
+            list(dataset.samples(['Temperature'], 'Humidity'))
+        except ValueError as error:
+            print(f"Samples of Temperature and Humidity: {error}")
@@ -1,6 +1,19 @@
-from typing import Union
+"""
+Run from the repository root: python -m DecisionTree.ID3
+"""
+from typing import Iterable, Optional, Sequence, Union
+import sys
 from collections import Counter
-from math import log2
+from copy import copy
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from array import array
+from mmap import mmap, ACCESS_READ
+from struct import Struct
+from math import log, log2, sqrt
+import numpy as np
+from Instrumentation.Callbacks import Instrumentation
+from Dataset.Columnar import ColumnarDataset
 
 class Node:
 
@@ -8,29 +21,483 @@ class Node:
         self.classifier = classifier
 
     def classify(self, instance: dict[str, str]) -> str:
-        if isinstance(self.classifier, str):
-            return self.classifier
-        else:
-            test_attribute, children, default_value = self.classifier
-            return children.get(instance.get(test_attribute, default_value), children["__other__"]).classify(instance)
+        node = self
+        while not isinstance(node.classifier, str):
+            test_attribute, children, default_value = node.classifier
+            node = children.get(instance.get(test_attribute, default_value), children["__other__"])
+        return node.classifier
 
     def stringify(self, indent_level: int) -> str:
-        if isinstance(self.classifier, str):
-            return self.classifier
-        else:
-            test_attribute, children, default_value = self.classifier
-            indentation = '\t' * indent_level
-            return ('\n' if indent_level != 0 else '') + indentation + f"\n{indentation}EL".join(f"IF {test_attribute} = {value}{' (default)' if value == default_value else ''} THEN {children[value].stringify(indent_level + 1)}" for value in children)
+        # an explicit stack of strings and (node, indent level) pairs still to write, so deep trees do not exhaust the recursion limit
+        parts: list[str] = []
+        stack: list[Union[str, tuple[Node, int]]] = [(self, indent_level)]
+        while stack != []:
+            item = stack.pop()
+            if isinstance(item, str):
+                parts.append(item)
+                continue
+            node, level = item
+            if isinstance(node.classifier, str):
+                parts.append(node.classifier)
+                continue
+            test_attribute, children, default_value = node.classifier
+            indentation = '\t' * level
+            # values sharing one child (a grouped split) are printed as a single branch
+            groups: dict[int, list[str]] = {}
+            for value, child in children.items():
+                groups.setdefault(id(child), []).append(value)
+            pending: list[Union[str, tuple[Node, int]]] = [('\n' if level != 0 else '') + indentation]
+            for i, values in enumerate(groups.values()):
+                pending.append(
+                    (f"\n{indentation}EL" if i != 0 else '')
+                    + f"IF {test_attribute} {'= ' + values[0] if len(values) == 1 else 'IN {' + ', '.join(values) + '}'}{' (default)' if default_value in values else ''} THEN "
+                )
+                pending.append((children[values[0]], level + 1))
+            stack.extend(reversed(pending))
+        return ''.join(parts)
 
-class DecisionTree:
+class EncodedExamples:
+    """
+    Column-oriented copy of the examples where every attribute value is replaced by an integer code.
+    A missing attribute is encoded as -1.
+    """
+
+    MISSING = -1
 
     def __init__(self, examples: list[dict[str, str]], target: str):
         self.target = target
-        self.root = self.ID3(
-            examples,
-            target,
-            {attr for example in examples for attr in example} - {target}
+        # in order of first appearance, so the encoding (and how gain ties are broken) does not depend on set iteration order
+        self.attributes = list(dict.fromkeys(attr for example in examples for attr in example if attr != target))
+        self.attribute_index = {attr: i for i, attr in enumerate(self.attributes)}
+        self.values: list[list[str]] = [[] for _ in self.attributes]
+        self.value_codes: list[dict[str, int]] = [{} for _ in self.attributes]
+        self.columns = [array("i") for _ in self.attributes]
+        self.labels: list[str] = []
+        self.label_codes: dict[str, int] = {}
+        self.label_column = array("i")
+        for example in examples:
+            for i, attr in enumerate(self.attributes):
+                value = example.get(attr)
+                self.columns[i].append(EncodedExamples.MISSING if value is None else self.encode_value(i, value))
+            label = example[target]
+            code = self.label_codes.get(label)
+            if code is None:
+                code = self.label_codes[label] = len(self.labels)
+                self.labels.append(label)
+            self.label_column.append(code)
+
+    @classmethod
+    def from_columnar(cls, dataset: ColumnarDataset, target: str) -> "EncodedExamples":
+        """
+        Wrap the categorical columns of dataset without copying them: its codes and dictionaries already are an encoding,
+        and ColumnarDataset.MISSING is EncodedExamples.MISSING.
+        """
+        numeric = [name for name in dataset.names if not dataset.is_categorical(name)]
+        if numeric != []:
+            raise ValueError(f"DecisionTree splits on categorical columns only, {numeric} are numeric. Convert the CSV with them in categorical.")
+        label_column = dataset.column(target)
+        if (label_column == ColumnarDataset.MISSING).any():
+            raise ValueError(f"Every example needs a value of the target attribute {target}.")
+        data = cls([], target)
+        data.attributes = [name for name in dataset.names if name != target]
+        data.attribute_index = {attr: i for i, attr in enumerate(data.attributes)}
+        data.values = [dataset.values[attr] for attr in data.attributes]
+        data.value_codes = [{value: code for code, value in enumerate(values)} for values in data.values]
+        data.columns = [memoryview(dataset.column(attr)) for attr in data.attributes]
+        data.labels = dataset.values[target]
+        data.label_codes = {label: code for code, label in enumerate(data.labels)}
+        data.label_column = memoryview(label_column)
+        return data
+
+    def __len__(self):
+        return len(self.label_column)
+
+    def share(self):
+        """
+        Move the columns into one shared memory block so that worker processes attach to it instead of receiving a pickled copy.
+        """
+        num_rows, columns = len(self), self.columns + [self.label_column]
+        self.shared_memory = SharedMemory(create=True, size=max(1, len(columns) * num_rows * 4))
+        buffer = self.shared_memory.buf.cast("i")
+        for i, column in enumerate(columns):
+            buffer[i * num_rows:(i + 1) * num_rows] = column
+        buffer.release()
+        self.attach()
+
+    def attach(self):
+        buffer = self.shared_memory.buf.cast("i")
+        num_rows = len(buffer) // (len(self.attributes) + 1)
+        *self.columns, self.label_column = [buffer[i * num_rows:(i + 1) * num_rows] for i in range(len(self.attributes) + 1)]
+        buffer.release()
+
+    def unshare(self):
+        for column in self.columns + [self.label_column]:
+            column.release()
+        self.columns, self.label_column = [], array("i")
+        self.shared_memory.close()
+        self.shared_memory.unlink()
+
+    def __getstate__(self):
+        assert hasattr(self, "shared_memory"), "Call share() before sending EncodedExamples to another process."
+        return {key: value for key, value in self.__dict__.items() if key not in ("columns", "label_column")}
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self.attach()
+
+    def encode_value(self, attr_index: int, value: str) -> int:
+        codes = self.value_codes[attr_index]
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(self.values[attr_index])
+            self.values[attr_index].append(value)
+        return code
+
+class CompiledTree:
+    """
+    Flat-array form of a trained tree, nodes are numbered in pre-order with the root at 0.
+    Node i tests attribute node_attribute[i] (LEAF for a leaf, which predicts labels[node_label[i]]).
+    Its children are edge_child[edge_start[i]:edge_start[i + 1]], keyed by the value codes in edge_value in increasing order,
+    a missing value is replaced by node_default[i] and a value without an edge goes to node_other[i].
+    """
+
+    LEAF = -1
+    MISSING = -1
+    UNKNOWN = -2
+
+    # file layout: header, the int32 arrays in the order of ARRAYS, value_count per attribute,
+    # then target, attribute names, values and labels as a string table of uint32 lengths, each followed by that many UTF-8 bytes
+    MAGIC = b"ID3T"
+    VERSION = 1
+    HEADER = Struct("<4sIIIIII")
+    LENGTH = Struct("<I")
+    # entries per node and edge up to which build_lookup makes a dense table
+    DENSE_LIMIT = 4
+    ARRAYS = ("node_attribute", "node_default", "node_other", "node_label", "edge_start", "edge_value", "edge_child")
+
+    def __init__(
+        self, target: str, attributes: list[str], values: list[list[str]], labels: list[str],
+        node_attribute: Sequence[int], node_default: Sequence[int], node_other: Sequence[int], node_label: Sequence[int],
+        edge_start: Sequence[int], edge_value: Sequence[int], edge_child: Sequence[int]
+    ):
+        self.target = target
+        self.attributes = attributes
+        self.values = values
+        self.labels = labels
+        self.node_attribute, self.node_default, self.node_other, self.node_label = node_attribute, node_default, node_other, node_label
+        self.edge_start, self.edge_value, self.edge_child = edge_start, edge_value, edge_child
+        # built on first use so that a loaded tree is ready at once
+        self.lookup: Optional[tuple[np.ndarray, ...]] = None
+        self.value_codes: Optional[list[dict[str, int]]] = None
+
+    @classmethod
+    def from_node(cls, root: Node, target: str = "") -> "CompiledTree":
+        attributes: list[str] = []
+        values: list[list[str]] = []
+        value_codes: list[dict[str, int]] = []
+        labels: list[str] = []
+        label_codes: dict[str, int] = {}
+
+        def encode_value(attr: str, value: str) -> int:
+            if attr not in attributes:
+                attributes.append(attr)
+                values.append([])
+                value_codes.append({})
+            attr_index = attributes.index(attr)
+            codes = value_codes[attr_index]
+            if value not in codes:
+                codes[value] = len(values[attr_index])
+                values[attr_index].append(value)
+            return codes[value]
+
+        # number the nodes, a node reachable through several values is stored once
+        order: list[Node] = []
+        index: dict[int, int] = {}
+        stack = [root]
+        while stack != []:
+            node = stack.pop()
+            if id(node) in index:
+                continue
+            index[id(node)] = len(order)
+            order.append(node)
+            if not isinstance(node.classifier, str):
+                stack.extend(reversed(node.classifier[1].values()))
+        node_attribute, node_default, node_other, node_label = array("i"), array("i"), array("i"), array("i")
+        edge_start, edge_value, edge_child = array("i", [0]), array("i"), array("i")
+        for node in order:
+            if isinstance(node.classifier, str):
+                if node.classifier not in label_codes:
+                    label_codes[node.classifier] = len(labels)
+                    labels.append(node.classifier)
+                node_attribute.append(CompiledTree.LEAF)
+                node_default.append(CompiledTree.MISSING)
+                node_other.append(CompiledTree.LEAF)
+                node_label.append(label_codes[node.classifier])
+            else:
+                test_attribute, children, default_value = node.classifier
+                node_default.append(encode_value(test_attribute, default_value))
+                node_attribute.append(attributes.index(test_attribute))
+                node_other.append(index[id(children["__other__"])])
+                node_label.append(CompiledTree.LEAF)
+                # edges in value code order, see build_lookup
+                for code, child in sorted((encode_value(test_attribute, value), index[id(child)]) for value, child in children.items() if value != "__other__"):
+                    edge_value.append(code)
+                    edge_child.append(child)
+            edge_start.append(len(edge_value))
+        compiled = cls(target, attributes, values, labels, node_attribute, node_default, node_other, node_label, edge_start, edge_value, edge_child)
+        compiled.value_codes = value_codes
+        return compiled
+
+    def save(self, path: str):
+        assert sys.byteorder == "little", "The model format stores little-endian int32 arrays."
+        value_count = array("i", [len(values) for values in self.values])
+        strings = b"".join(
+            CompiledTree.LENGTH.pack(len(encoded)) + encoded
+            for encoded in (string.encode() for string in [self.target, *self.attributes, *(value for values in self.values for value in values), *self.labels])
         )
+        with open(path, "wb") as file:
+            file.write(CompiledTree.HEADER.pack(
+                CompiledTree.MAGIC, CompiledTree.VERSION, len(self.attributes), len(self.labels),
+                len(self.node_attribute), len(self.edge_value), len(strings)
+            ))
+            for name in CompiledTree.ARRAYS:
+                file.write(array("i", getattr(self, name)).tobytes())
+            file.write(value_count.tobytes())
+            file.write(strings)
+
+    @classmethod
+    def load(cls, path: str) -> "CompiledTree":
+        """
+        Memory-map a file written by save. The node arrays are views into the mapping and are never copied,
+        so processes loading the same file share one copy through the page cache.
+        """
+        assert sys.byteorder == "little", "The model format stores little-endian int32 arrays."
+        with open(path, "rb") as file:
+            mapping = mmap(file.fileno(), 0, access=ACCESS_READ)
+        magic, version, num_attributes, num_labels, num_nodes, num_edges, strings_size = CompiledTree.HEADER.unpack_from(mapping)
+        if magic != CompiledTree.MAGIC:
+            raise ValueError(f"{path} is not a compiled decision tree.")
+        if version != CompiledTree.VERSION:
+            raise ValueError(f"{path} has format version {version}, this code reads version {CompiledTree.VERSION}.")
+        arrays: dict[str, memoryview] = {}
+        offset = CompiledTree.HEADER.size
+        sizes = {"edge_start": num_nodes + 1, "edge_value": num_edges, "edge_child": num_edges}
+        for name in (*CompiledTree.ARRAYS, "value_count"):
+            size = num_attributes if name == "value_count" else sizes.get(name, num_nodes)
+            arrays[name] = memoryview(mapping)[offset:offset + 4 * size].cast("i")
+            offset += 4 * size
+        strings, end = [], offset + strings_size
+        while offset < end:
+            (length,), offset = CompiledTree.LENGTH.unpack_from(mapping, offset), offset + CompiledTree.LENGTH.size
+            strings.append(mapping[offset:offset + length].decode())
+            offset += length
+        target, attributes, strings = strings[0], strings[1:1 + num_attributes], strings[1 + num_attributes:]
+        values: list[list[str]] = []
+        for count in arrays.pop("value_count"):
+            values.append(strings[:count])
+            strings = strings[count:]
+        return cls(target, attributes, values, strings[:num_labels], *(arrays[name] for name in CompiledTree.ARRAYS))
+
+    def encode(self, instances: list[dict[str, str]]) -> list[np.ndarray]:
+        """
+        return
+            one int32 column of value codes per attribute in self.attributes,
+            MISSING where the instance lacks the attribute and UNKNOWN for a value never seen by the tree
+        This is one dict lookup per instance and tested attribute, and costs more than the walk of classify_encoded:
+        batches that are already encoded (or a ColumnarDataset) should go to classify_encoded directly.
+        """
+        if self.value_codes is None:
+            self.value_codes = [{value: code for code, value in enumerate(values)} for values in self.values]
+        columns = []
+        for attr, codes in zip(self.attributes, self.value_codes):
+            # instance.get gives None for a missing attribute
+            get = {None: CompiledTree.MISSING, **codes}.get
+            columns.append(np.fromiter((get(instance.get(attr), CompiledTree.UNKNOWN) for instance in instances), np.int32, len(instances)))
+        return columns
+
+    def encode_columnar(self, dataset: ColumnarDataset) -> list[np.ndarray]:
+        """
+        encode for the rows of a columnar dataset, translating its codes through one table per attribute.
+        """
+        if self.value_codes is None:
+            self.value_codes = [{value: code for code, value in enumerate(values)} for values in self.values]
+        columns = []
+        for attr, codes in zip(self.attributes, self.value_codes):
+            if attr not in dataset.values:
+                columns.append(np.full(len(dataset), CompiledTree.MISSING, np.int32))
+                continue
+            if not dataset.is_categorical(attr):
+                raise ValueError(f"The tree tests {attr}, which is numeric in {dataset.path}.")
+            # ColumnarDataset.MISSING (-1) picks the trailing MISSING
+            table = np.array([codes.get(value, CompiledTree.UNKNOWN) for value in dataset.values[attr]] + [CompiledTree.MISSING], np.int32)
+            columns.append(table[dataset.column(attr)])
+        return columns
+
+    def classify_many(self, instances: Union[list[dict[str, str]], ColumnarDataset]) -> list[str]:
+        if isinstance(instances, ColumnarDataset):
+            return self.classify_encoded(self.encode_columnar(instances), len(instances))
+        return self.classify_encoded(self.encode(instances), len(instances))
+
+    def build_lookup(self) -> tuple:
+        """
+        What classify_encoded needs to find the child of a node for a value code, in one of two forms.
+        dense: the child of every node for every value code in one flat table, node i's children by code c at offsets[i] + c - UNKNOWN,
+        with MISSING mapped to the child of the default value and UNKNOWN (or a value without an edge) to node_other.
+        It has one row per inner node and one entry per value of its attribute, so it is only built while it has at most
+        DENSE_LIMIT entries per node and edge.
+        sparse: a search key per edge, node i * width + code c, with width one more than the largest number of values of an attribute,
+        which are sorted when the edges of every node are (as from_node writes them, otherwise they are sorted here).
+        Memory grows with the number of edges, and the node and edge arrays of a loaded tree stay views into its mapping.
+        return
+            node_attribute, node_label, (offsets, table) or None, (node_default, node_other, edge_child, width, keys) or None
+        """
+        node_attribute, node_label = np.asarray(self.node_attribute, np.int32), np.asarray(self.node_label, np.int32)
+        value_count = np.array([len(values) for values in self.values] + [0], np.int64)
+        # leaves (attribute LEAF picks the trailing 0) get no entries
+        sizes = np.where(node_attribute == CompiledTree.LEAF, 0, value_count[node_attribute] - CompiledTree.UNKNOWN)
+        edge_start = np.asarray(self.edge_start, np.int64)
+        edge_node = np.repeat(np.arange(len(node_attribute), dtype=np.int64), np.diff(edge_start))
+        edge_value, edge_child = np.asarray(self.edge_value, np.int64), np.asarray(self.edge_child, np.int32)
+        node_default, node_other = np.asarray(self.node_default, np.int32), np.asarray(self.node_other, np.int32)
+        if sizes.sum() <= CompiledTree.DENSE_LIMIT * (len(node_attribute) + len(edge_value)):
+            offsets = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+            table = np.repeat(node_other, sizes)
+            table[offsets[edge_node] + edge_value - CompiledTree.UNKNOWN] = edge_child
+            inner = np.flatnonzero(node_attribute != CompiledTree.LEAF)
+            table[offsets[inner] + CompiledTree.MISSING - CompiledTree.UNKNOWN] = table[offsets[inner] + node_default[inner] - CompiledTree.UNKNOWN]
+            self.lookup = (node_attribute, node_label, (offsets, table), None)
+            return self.lookup
+        width = np.int64(value_count.max() + 1)
+        keys = edge_node * width + edge_value
+        if np.any(keys[1:] < keys[:-1]):
+            order = np.argsort(keys, kind="stable")
+            keys, edge_child = keys[order], edge_child[order]
+        # a sentinel no key reaches, so searchsorted always gives a valid position
+        keys = np.append(keys, np.iinfo(np.int64).max)
+        self.lookup = (node_attribute, node_label, None, (node_default, node_other, edge_child, width, keys))
+        return self.lookup
+
+    def classify_encoded(self, columns: Sequence[Sequence[int]], num_instances: int) -> list[str]:
+        """
+        The fast path of classify_many: columns holds one column of value codes per attribute in self.attributes, as from encode.
+        All instances descend the tree together, one level per step, each step a few array operations over the instances
+        not yet at a leaf (a take from the dense table of build_lookup, or a searchsorted over its edge keys),
+        so the Python work grows with the depth of the tree instead of the number of instances.
+        """
+        node_attribute, node_label, dense, sparse = self.lookup or self.build_lookup()
+        codes = np.array(columns, np.int32).reshape(len(self.attributes), num_instances)
+        node = np.zeros(num_instances, np.int32)
+        active = np.arange(num_instances)
+        while len(active) > 0:
+            attr_index = node_attribute[node[active]]
+            inner = attr_index != CompiledTree.LEAF
+            active, attr_index = active[inner], attr_index[inner]
+            current = node[active]
+            code = codes[attr_index, active]
+            if dense is not None:
+                offsets, table = dense
+                node[active] = table[offsets[current] + code - CompiledTree.UNKNOWN]
+                continue
+            node_default, node_other, edge_child, width, keys = sparse
+            code = np.where(code == CompiledTree.MISSING, node_default[current], code)
+            key = current * width + code
+            position = np.searchsorted(keys, key)
+            # UNKNOWN, or a value without an edge, goes to node_other
+            found = (keys[position] == key) & (code >= 0)
+            child = node_other[current]
+            child[found] = edge_child[position[found]]
+            node[active] = child
+        labels = self.labels
+        return [labels[code] for code in node_label[node].tolist()]
+
+# state of a worker process building parts of a tree, set once by init_worker
+worker_state: tuple["DecisionTree", EncodedExamples]
+
+def init_worker(tree: "DecisionTree", data: EncodedExamples):
+    global worker_state
+    worker_state = (tree, data)
+
+def score_attributes(rows: Optional[Sequence[int]], attr_indices: list[int], parent_entropy: float):
+    tree, data = worker_state
+    rows = range(len(data)) if rows is None else rows
+    return [tree.compute_encoded_information_gain(data, rows, attr_index, parent_entropy) for attr_index in attr_indices]
+
+def build_subtree(rows: Sequence[int], attrs: set[str], depth: int):
+    tree, data = worker_state
+    tree.pruned = Counter()
+    return tree.encoded_ID3(data, rows, attrs, depth), tree.pruned
+
+class DecisionTree:
+
+    def __init__(
+        self, examples: Union[list[dict[str, str]], ColumnarDataset], target: str, encode: bool = True, processes: int = 1, parallel_depth: int = 1,
+        max_depth: Optional[int] = None, min_samples_split: int = 2, min_gain: Optional[float] = None,
+        max_nodes: Optional[int] = None, max_branches: Optional[int] = None, instrumentation: Optional[Instrumentation] = None
+    ):
+        """
+        processes > 1 builds the tree on a process pool sharing the encoded examples:
+        nodes shallower than parallel_depth score their candidate attributes in parallel,
+        and the subtrees rooted at parallel_depth are built by the workers.
+        The result is the serial tree: the encoded engine scores attributes in the order they first appear in the examples,
+        breaks ties in gain in that order and builds children in value code order, in the workers as in this process.
+        Every node waits for its tasks, so on most data the build is slower than serial (see the decision_tree suite of Benchmark.Suite).
+
+        Growth limits (encoded engine only) turn a node into a majority leaf when
+            its depth reaches max_depth,
+            it has fewer than min_samples_split examples,
+            its best information gain is below min_gain,
+            or splitting it would take the tree past max_nodes nodes (counted depth-first, so no subtrees are built in parallel).
+        An attribute with more than max_branches values at a node is split into at most max_branches groups of values
+        instead of once per value (see compute_grouped_split), every value of a group leading to the same child.
+        Like any split it is used up, so a path tests each attribute at most once and the depth stays below the number of attributes.
+        self.pruned counts the nodes each limit turned into leaves.
+
+        instrumentation (kept in self.instrumentation) times the gain computation and partitioning of the nodes built in this process,
+        counts examples and splits, and passes a node-split event to its callbacks for every split.
+
+        examples can be a ColumnarDataset of categorical columns, which the encoded engine reads in place instead of encoding.
+        """
+        self.target = target
+        self.processes = processes
+        self.parallel_depth = parallel_depth
+        self.max_depth = max_depth
+        self.min_samples_split = min_samples_split
+        self.min_gain = min_gain
+        self.max_nodes = max_nodes
+        self.max_branches = max_branches
+        self.pruned: Counter[str] = Counter()
+        self.num_nodes = 1
+        assert max_branches is None or max_branches >= 2, "A split needs at least 2 branches."
+        limited = max_depth is not None or min_samples_split > 2 or min_gain is not None or max_nodes is not None or max_branches is not None
+        assert encode or processes > 1 or not limited, "Growth limits need the encoded engine."
+        columnar = isinstance(examples, ColumnarDataset)
+        if columnar and not encode and processes <= 1:
+            examples, columnar = list(examples.records()), False
+        attrs = (set(examples.names) if columnar else {attr for example in examples for attr in example}) - {target}
+        # workers build silently, their callbacks would run in another process
+        worker_tree = copy(self)
+        worker_tree.instrumentation = Instrumentation()
+        self.instrumentation = instrumentation or Instrumentation()
+        self.instrumentation.begin("DecisionTree")
+        self.instrumentation.count("examples", len(examples))
+        try:
+            if processes > 1:
+                data = EncodedExamples.from_columnar(examples, target) if columnar else EncodedExamples(examples, target)
+                data.share()
+                try:
+                    with ProcessPoolExecutor(processes, initializer=init_worker, initargs=(worker_tree, data)) as self.pool:
+                        self.root = self.encoded_ID3(data, None, attrs)
+                finally:
+                    del self.pool
+                    data.unshare()
+            elif encode:
+                with self.instrumentation.phase("encode"):
+                    data = EncodedExamples.from_columnar(examples, target) if columnar else EncodedExamples(examples, target)
+                self.root = self.encoded_ID3(data, range(len(data)), attrs)
+            else:
+                self.root = self.ID3(examples, target, attrs)
+        finally:
+            self.instrumentation.end("DecisionTree")
 
     def show(self):
         print(f"[Target Attribute is '{self.target}']")
@@ -39,14 +506,39 @@ class DecisionTree:
     def classify(self, instance: dict[str, str]):
         return f"{self.target} = {self.root.classify(instance)}"
 
-    def ID3(self, examples: list[dict[str, str]], target: str, attrs: set[str]):
+    def compile(self) -> CompiledTree:
+        self.compiled = CompiledTree.from_node(self.root, self.target)
+        return self.compiled
+
+    def save(self, path: str):
+        """
+        Write the compiled tree in the binary format read by CompiledTree.load.
+        """
+        self.compile().save(path)
+
+    def classify_many(self, instances: Union[list[dict[str, str]], ColumnarDataset]) -> list[str]:
+        """
+        return
+            the label Node.classify gives for every instance (or row of a ColumnarDataset), computed with the compiled tree
+        Dict instances must first be encoded one dict lookup at a time (see CompiledTree.encode), which leaves the batch
+        about as fast as calling Node.classify in a loop. The speedup is for a ColumnarDataset or columns passed to
+        self.compiled.classify_encoded.
+        """
+        if not hasattr(self, "compiled"):
+            self.compile()
+        return self.compiled.classify_many(instances)
+
+    def ID3(self, examples: list[dict[str, str]], target: str, attrs: set[str], depth: int = 0):
         target_count = Counter(example[target] for example in examples)
         if len(target_count) == 1:
             return Node(target_count.popitem()[0])
         elif len(attrs) == 0:
             return Node(target_count.most_common(1)[0][0])
         else:
-            optimal_classifier, default_value = self.get_optimal_classifier(examples, target, attrs)
+            with self.instrumentation.phase("gain"):
+                optimal_classifier, default_value = self.get_optimal_classifier(examples, target, attrs)
+            self.instrumentation.count("splits")
+            self.instrumentation.node_split("DecisionTree", optimal_classifier, depth, num_examples=len(examples))
             children: dict[str, Node] = {}
             possible_values = {example.get(optimal_classifier, default_value) for example in examples}
             for value in possible_values:
@@ -54,7 +546,8 @@ class DecisionTree:
                 children[value] = self.ID3(
                     sub_group,
                     target,
-                    attrs - {optimal_classifier}
+                    attrs - {optimal_classifier},
+                    depth + 1
                 )
             children["__other__"] = Node(target_count.most_common(1)[0][0])
             return Node((optimal_classifier, children, default_value))
@@ -79,11 +572,309 @@ class DecisionTree:
 
     def compute_entropy(self, examples: list[dict[str, str]], target: str):
         target_value_count = Counter(example[target] for example in examples)
-        num_example = len(examples)
-        return sum(-(count/num_example)*log2(count/num_example) for count in target_value_count.values())
+        return self.entropy_from_counts(target_value_count.values(), len(examples))
+
+    @staticmethod
+    def entropy_from_counts(counts: Iterable[int], num_example: int):
+        return sum(-(count/num_example)*log2(count/num_example) for count in counts)
+
+    # The encoded engine below builds exactly the same tree as ID3 above, but works on
+    # integer-coded columns and lists of row indices instead of copying lists of dicts.
+    # Counters are filled in row order so that ties are broken the same way as ID3.
+
+    def encoded_ID3(self, data: EncodedExamples, rows: Optional[Sequence[int]], attrs: set[str], depth: int = 0):
+        """
+        rows is None for the root of a parallel build, which stands for every example without sending the row numbers to the workers
+        """
+        all_rows = range(len(data)) if rows is None else rows
+        target_count = Counter(map(data.label_column.__getitem__, all_rows))
+        if len(target_count) == 1:
+            return Node(data.labels[target_count.popitem()[0]])
+        elif len(attrs) == 0:
+            return Node(data.labels[target_count.most_common(1)[0][0]])
+        majority_leaf = Node(data.labels[target_count.most_common(1)[0][0]])
+        if self.max_depth is not None and depth >= self.max_depth:
+            self.pruned["max_depth"] += 1
+            return majority_leaf
+        if len(all_rows) < self.min_samples_split:
+            self.pruned["min_samples_split"] += 1
+            return majority_leaf
+        parent_entropy = self.entropy_from_counts(target_count.values(), len(all_rows))
+        with self.instrumentation.phase("gain"):
+            optimal_classifier, (gain, default_code, groups) = self.get_encoded_optimal_classifier(data, rows, attrs, parent_entropy, depth)
+        if optimal_classifier is None:
+            return majority_leaf
+        if self.min_gain is not None and gain < self.min_gain:
+            self.pruned["min_gain"] += 1
+            return majority_leaf
+        attr_index = data.attribute_index[optimal_classifier]
+        column, values = data.columns[attr_index], data.values[attr_index]
+        # rows by value code, or by group index for a grouped split
+        partitions: dict[int, list[int]] = {}
+        with self.instrumentation.phase("partition"):
+            if groups is None:
+                for row in all_rows:
+                    code = column[row]
+                    partitions.setdefault(default_code if code == EncodedExamples.MISSING else code, []).append(row)
+            else:
+                group_of = {code: i for i, group in enumerate(groups) for code in group}
+                for row in all_rows:
+                    code = column[row]
+                    partitions.setdefault(group_of[default_code if code == EncodedExamples.MISSING else code], []).append(row)
+        num_children = len(partitions) + 1
+        if self.max_nodes is not None:
+            if self.num_nodes + num_children > self.max_nodes:
+                self.pruned["max_nodes"] += 1
+                return majority_leaf
+            self.num_nodes += num_children
+        self.instrumentation.count("splits")
+        self.instrumentation.node_split("DecisionTree", optimal_classifier, depth, gain=gain, num_examples=len(all_rows), num_children=num_children)
+        keys = sorted(partitions)
+        if hasattr(self, "pool") and self.max_nodes is None and depth + 1 == self.parallel_depth:
+            subtrees = [self.pool.submit(build_subtree, array("i", partitions[key]), attrs - {optimal_classifier}, depth + 1) for key in keys]
+            nodes = []
+            for subtree in subtrees:
+                node, pruned = subtree.result()
+                nodes.append(node)
+                self.pruned.update(pruned)
+        else:
+            nodes = [self.encoded_ID3(data, partitions[key], attrs - {optimal_classifier}, depth + 1) for key in keys]
+        children: dict[str, Node] = {}
+        for key, node in zip(keys, nodes):
+            # every value of a group shares one child
+            for code in [key] if groups is None else sorted(groups[key]):
+                children[values[code]] = node
+        children["__other__"] = majority_leaf
+        return Node((optimal_classifier, children, values[default_code]))
+
+    def get_encoded_optimal_classifier(self, data: EncodedExamples, rows: Optional[Sequence[int]], attrs: set[str], parent_entropy: float, depth: int):
+        # scored in encoded order, a tie in gain goes to the attribute encoded first, in the workers as in this process
+        attr_indices = sorted(data.attribute_index[attr] for attr in attrs)
+        attr_list = [data.attributes[attr_index] for attr_index in attr_indices]
+        if hasattr(self, "pool") and depth < self.parallel_depth:
+            # one task per process, each scoring a contiguous share of the attributes
+            shared_rows = None if rows is None else array("i", rows)
+            share = -(-len(attr_indices) // self.processes)
+            tasks = [
+                self.pool.submit(score_attributes, shared_rows, attr_indices[start:start + share], parent_entropy)
+                for start in range(0, len(attr_indices), share)
+            ]
+            gains = [gain for task in tasks for gain in task.result()]
+        else:
+            rows = range(len(data)) if rows is None else rows
+            gains = [self.compute_encoded_information_gain(data, rows, attr_index, parent_entropy) for attr_index in attr_indices]
+        information_gain = {attr: gain for attr, gain in zip(attr_list, gains) if gain is not None}
+        if information_gain == {}:
+            return None, (0.0, None, None)
+        optimal_classifier = max(information_gain, key=lambda attr: information_gain[attr][0])
+        return optimal_classifier, information_gain[optimal_classifier]
+
+    def compute_encoded_information_gain(self, data: EncodedExamples, rows: Sequence[int], attr_index: int, parent_entropy: float):
+        """
+        return
+            information gain: float
+            default value code: int
+            groups of value codes of a grouped split (see compute_grouped_split), None when there is one child per value
+        or None when no example at the node has the attribute
+        """
+        column, label_column = data.columns[attr_index], data.label_column
+        # contingency table of (value, label) built in a single pass over the rows
+        contingency: dict[int, dict[int, int]] = {}
+        for (code, label), count in Counter(zip(map(column.__getitem__, rows), map(label_column.__getitem__, rows))).items():
+            contingency.setdefault(code, {})[label] = count
+        missing = contingency.pop(EncodedExamples.MISSING, None)
+        possible_values = Counter({code: sum(label_count.values()) for code, label_count in contingency.items()})
+        if len(possible_values) == 0:
+            return None
+        default_code = possible_values.most_common(1)[0][0]
+        if missing is not None:
+            # examples without the attribute fall into the default group, keep their first-seen label order
+            default_group = (default_code, EncodedExamples.MISSING)
+            contingency[default_code] = Counter(label_column[row] for row in rows if column[row] in default_group)
+        num_example = len(rows)
+        if self.max_branches is not None and len(possible_values) > self.max_branches:
+            gain, groups = self.compute_grouped_split(contingency, num_example, parent_entropy)
+            return gain, default_code, groups
+        new_entropy = 0
+        for code in possible_values:
+            label_count = contingency[code].values()
+            sub_group_size = sum(label_count)
+            new_entropy += (sub_group_size / num_example) * self.entropy_from_counts(label_count, sub_group_size)
+        return parent_entropy - new_entropy, default_code, None
+
+    def compute_grouped_split(self, contingency: dict[int, dict[int, int]], num_example: int, parent_entropy: float):
+        """
+        Split of the values into at most max_branches groups, each a run of the values ordered by the share of the majority label
+        (for two labels the best split in two is such a run, Breiman et al. 1984), so it costs one sort instead of trying every partition.
+        Starting from a single group, the cut that lowers the entropy the most is made until there are max_branches groups
+        or no cut lowers it, each round one pass over the values with array operations.
+        return
+            information gain, list of the groups of value codes
+        """
+        codes = sorted(contingency)
+        labels = sorted({label for label_count in contingency.values() for label in label_count})
+        counts = np.array([[contingency[code].get(label, 0) for label in labels] for code in codes], np.float64)
+        majority = counts.sum(axis=0).argmax()
+        order = np.argsort(counts[:, majority] / counts.sum(axis=1), kind="stable")
+        cumulative = np.vstack((np.zeros(len(labels)), np.cumsum(counts[order], axis=0)))
+
+        def spread(label_counts: np.ndarray) -> np.ndarray:
+            # entropy times the number of examples, for the rows of label_counts
+            sizes = label_counts.sum(axis=-1)
+            with np.errstate(divide="ignore", invalid="ignore"):
+                return np.nan_to_num(sizes * np.log2(sizes)) - np.nan_to_num(label_counts * np.log2(label_counts)).sum(axis=-1)
+
+        bounds = [0, len(codes)]
+        while len(bounds) <= self.max_branches:
+            best_decrease, best_cut = 0.0, None
+            for start, stop in zip(bounds, bounds[1:]):
+                if stop - start < 2:
+                    continue
+                cuts = cumulative[start + 1:stop]
+                decrease = spread(cumulative[stop] - cumulative[start]) - spread(cuts - cumulative[start]) - spread(cumulative[stop] - cuts)
+                i = int(decrease.argmax())
+                # the first cut is always made, so there are at least two groups
+                if best_cut is None and len(bounds) == 2 or decrease[i] > best_decrease:
+                    best_decrease, best_cut = decrease[i], start + 1 + i
+            if best_cut is None or len(bounds) > 2 and best_decrease <= 1e-9:
+                break
+            bounds.insert(np.searchsorted(bounds, best_cut), best_cut)
+        new_entropy = 0.0
+        for start, stop in zip(bounds, bounds[1:]):
+            label_count = [count for count in (cumulative[stop] - cumulative[start]).tolist() if count > 0]
+            sub_group_size = sum(label_count)
+            new_entropy += (sub_group_size / num_example) * self.entropy_from_counts(label_count, sub_group_size)
+        return parent_entropy - new_entropy, [frozenset(codes[i] for i in order[start:stop].tolist()) for start, stop in zip(bounds, bounds[1:])]
+
+class LearningLeaf(Node):
+    """
+    Leaf of a HoeffdingTree. It keeps the sufficient statistics for choosing a split:
+    label counts, overall and per (attribute, value), of the examples that reached it.
+    It predicts the label of its parent until it has seen an example, then its own majority label.
+    """
+
+    def __init__(self, used_attrs: frozenset[str], prediction: str):
+        self.used_attrs = used_attrs
+        self.label_count: Counter[str] = Counter()
+        self.stats: dict[str, dict[str, Counter[str]]] = {}
+        self.num_since_check = 0
+        super().__init__(prediction)
+
+    def update(self, example: dict[str, str], target: str):
+        label = example[target]
+        self.label_count[label] += 1
+        for attr, value in example.items():
+            if attr != target and attr not in self.used_attrs:
+                self.stats.setdefault(attr, {}).setdefault(value, Counter())[label] += 1
+        self.num_since_check += 1
+        if label != self.classifier and self.label_count[label] > self.label_count[self.classifier]:
+            self.classifier = label
+
+    def compute_information_gain(self, attr: str):
+        """
+        Same gain as DecisionTree.compute_information_gain, examples without the attribute count towards the default value.
+        """
+        value_count = self.stats[attr]
+        possible_values = Counter({value: sum(label_count.values()) for value, label_count in value_count.items()})
+        default_value = possible_values.most_common(1)[0][0]
+        missing = self.label_count - sum(value_count.values(), Counter())
+        num_example = self.label_count.total()
+        new_entropy = 0
+        for value, label_count in value_count.items():
+            if value == default_value:
+                label_count = label_count + missing
+            sub_group_size = label_count.total()
+            new_entropy += (sub_group_size / num_example) * DecisionTree.entropy_from_counts(label_count.values(), sub_group_size)
+        old_entropy = DecisionTree.entropy_from_counts(self.label_count.values(), num_example)
+        return old_entropy - new_entropy, default_value
+
+    def split(self, attr: str, default_value: str):
+        used_attrs = self.used_attrs | {attr}
+        children: dict[str, Node] = {
+            value: LearningLeaf(used_attrs, label_count.most_common(1)[0][0]) for value, label_count in self.stats[attr].items()
+        }
+        children["__other__"] = LearningLeaf(used_attrs, self.classifier)
+        self.classifier = (attr, children, default_value)
+        del self.stats, self.label_count
+
+class HoeffdingTree:
+    """
+    Incremental decision tree learner (VFDT, Domingos & Hulten 2000) with the same classify/show surface as DecisionTree.
+    Memory does not depend on the length of the stream: a leaf only stores counts,
+    and is split on the attribute with the highest information gain once the Hoeffding bound shows
+    with probability 1 - delta that it beats the runner-up, or the two are closer than tie_threshold.
+    """
+
+    def __init__(self, target: str, delta: float = 1e-7, tie_threshold: float = 0.05, grace_period: int = 200, max_leaves: Optional[int] = None):
+        self.target = target
+        self.delta = delta
+        self.tie_threshold = tie_threshold
+        self.grace_period = grace_period
+        self.max_leaves = max_leaves
+        self.num_leaves = 1
+        self.root: Node = LearningLeaf(frozenset(), "")
+
+    def show(self):
+        print(f"[Target Attribute is '{self.target}']")
+        print(self.root.stringify(0))
+
+    def classify(self, instance: dict[str, str]):
+        return f"{self.target} = {self.root.classify(instance)}"
+
+    def sort(self, instance: dict[str, str]) -> LearningLeaf:
+        node = self.root
+        while not isinstance(node.classifier, str):
+            test_attribute, children, default_value = node.classifier
+            node = children.get(instance.get(test_attribute, default_value), children["__other__"])
+        return node
+
+    def learn(self, examples: Union[Iterable[dict[str, str]], ColumnarDataset], instrumentation: Optional[Instrumentation] = None):
+        """
+        A ColumnarDataset is streamed through its records.
+        instrumentation (kept in self.instrumentation) times the gain computation of split attempts, counts examples and splits,
+        and passes an event to its callbacks for every example and split.
+        """
+        if isinstance(examples, ColumnarDataset):
+            examples = examples.records()
+        instrumentation = self.instrumentation = instrumentation or Instrumentation()
+        instrumentation.begin("HoeffdingTree")
+        num_examples = 0
+        try:
+            for num_examples, example in enumerate(examples, start=1):
+                leaf = self.sort(example)
+                leaf.update(example, self.target)
+                if leaf.num_since_check >= self.grace_period:
+                    leaf.num_since_check = 0
+                    self.attempt_split(leaf)
+                if instrumentation.callbacks:
+                    instrumentation.example("HoeffdingTree", num_examples - 1, num_leaves=self.num_leaves)
+        finally:
+            instrumentation.count("examples", num_examples)
+            instrumentation.end("HoeffdingTree")
+
+    def attempt_split(self, leaf: LearningLeaf):
+        if len(leaf.label_count) == 1 or leaf.stats == {} or (self.max_leaves is not None and self.num_leaves >= self.max_leaves):
+            return
+        with self.instrumentation.phase("gain"):
+            information_gain = {attr: leaf.compute_information_gain(attr) for attr in leaf.stats}
+        ranking = sorted(information_gain, key=lambda attr: information_gain[attr][0], reverse=True)
+        best_gain = information_gain[ranking[0]][0]
+        second_gain = information_gain[ranking[1]][0] if len(ranking) > 1 else 0.0
+        value_range = log2(len(leaf.label_count))
+        epsilon = sqrt(value_range * value_range * log(1 / self.delta) / (2 * leaf.label_count.total()))
+        if best_gain > 0 and (best_gain - second_gain > epsilon or epsilon < self.tie_threshold):
+            num_examples = leaf.label_count.total()
+            leaf.split(ranking[0], information_gain[ranking[0]][1])
+            self.num_leaves += len(leaf.classifier[1]) - 1
+            self.instrumentation.count("splits")
+            # every split on the path uses up one attribute
+            self.instrumentation.node_split("HoeffdingTree", ranking[0], len(leaf.used_attrs), gain=best_gain, epsilon=epsilon, num_examples=num_examples)
 
 if __name__ == "__main__":
 
+    from tempfile import TemporaryDirectory
+    from Instrumentation.Callbacks import ProgressLogger
+
     # PLayTennis
 
     EXAMPLES = [
@@ -103,12 +894,27 @@ if __name__ == "__main__":
         {"Outlook": "Rain", "Temperature": "Mild", "Humidity": "High", "Wind": "Strong", "PlayTennis": "No"},
     ]
 
-    DECISION_TREE = DecisionTree(EXAMPLES, "PlayTennis")
+    DECISION_TREE = DecisionTree(EXAMPLES, "PlayTennis", instrumentation=Instrumentation([ProgressLogger(interval=0)]))
     DECISION_TREE.show()
 
     NEW_INSTANCE = {"Outlook": "Sunny", "Temperature": "Hot", "Humidity": "High", "Wind": "Strong"}
     print(f"Classify: {NEW_INSTANCE}")
     print(f"Classification: {DECISION_TREE.classify(NEW_INSTANCE)}")
+    print(f"Batch classification: {DECISION_TREE.classify_many(EXAMPLES)}")
+
+    with TemporaryDirectory() as directory:
+        DECISION_TREE.save(f"{directory}/PlayTennis.id3")
+        LOADED_TREE = CompiledTree.load(f"{directory}/PlayTennis.id3")
+        print(f"Loaded model agrees with Node.classify: {LOADED_TREE.classify_many(EXAMPLES) == [DECISION_TREE.root.classify(example) for example in EXAMPLES]}")
+
+    LIMITED_TREE = DecisionTree(EXAMPLES, "PlayTennis", max_depth=1)
+    LIMITED_TREE.show()
+    print(f"Nodes turned into leaves by each limit: {dict(LIMITED_TREE.pruned)}")
+
+    HOEFFDING_TREE = HoeffdingTree("PlayTennis", grace_period=len(EXAMPLES))
+    HOEFFDING_TREE.learn(example for _ in range(100) for example in EXAMPLES)
+    HOEFFDING_TREE.show()
+    print(f"Classification: {HOEFFDING_TREE.classify(NEW_INSTANCE)}")
 
     #######################################################################################################################
 
@@ -0,0 +1,205 @@
+"""
+Run from the repository root: python -m HyperparameterSearch.Sweep
+"""
+from typing import Any, Callable, Iterable, Optional
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from itertools import product
+from math import exp, log
+from random import Random
+from time import perf_counter
+import csv
+import numpy as np
+from LinearRegression.GradientDescent import LinearModel, VectorizedLinearRegression
+from NeuralNetwork.BackPropagation import Adam, ArrayDataset, Network, SGD
+
+class Uniform:
+
+    def __init__(self, low: float, high: float):
+        self.low, self.high = low, high
+
+    def sample(self, rng: Random):
+        return rng.uniform(self.low, self.high)
+
+class LogUniform(Uniform):
+    """
+    Uniform in log space, for scale parameters such as learning rates.
+    """
+
+    def sample(self, rng: Random):
+        return exp(rng.uniform(log(self.low), log(self.high)))
+
+def grid(space: dict[str, list]) -> list[dict[str, Any]]:
+    """
+    Every combination of the values listed for each parameter.
+    """
+    return [dict(zip(space, values)) for values in product(*space.values())]
+
+def random_search(space: dict[str, Any], num_trials: int, seed: int = 0) -> list[dict[str, Any]]:
+    """
+    num_trials configurations, each parameter drawn from a list of choices, a Uniform or a LogUniform, or fixed to a single value.
+    """
+    rng = Random(seed)
+    def draw(domain):
+        if isinstance(domain, Uniform):
+            return domain.sample(rng)
+        if isinstance(domain, list):
+            return rng.choice(domain)
+        return domain
+    return [{name: draw(domain) for name, domain in space.items()} for _ in range(num_trials)]
+
+# Trainers continue a trial for num_epochs more epochs and return its loss on the validation rows and its state
+# (None for a new trial). They run in the workers, so they must be module-level functions.
+Trainer = Callable[[dict[str, Any], np.ndarray, np.ndarray, np.ndarray, np.ndarray, int, Any], tuple[float, Any]]
+
+def train_network(params: dict[str, Any], inputs: np.ndarray, targets: np.ndarray, validation_inputs: np.ndarray, validation_targets: np.ndarray, num_epochs: int, state: Optional[tuple[Network, Any]]):
+    """
+    params: hidden_len, batch_size, learning_rate, and optionally optimizer ("sgd", "momentum" or "adam") and seed
+    """
+    if state is None:
+        network = Network(inputs.shape[1], params["hidden_len"], targets.shape[1], "sigmoid", seed=params.get("seed", 0))
+        optimizer = {
+            "sgd": lambda rate: SGD(rate),
+            "momentum": lambda rate: SGD(rate, momentum=0.9),
+            "adam": lambda rate: Adam(rate)
+        }[params.get("optimizer", "sgd")](params["learning_rate"])
+    else:
+        network, optimizer = state
+    network.learn(ArrayDataset(inputs, targets), params["batch_size"], num_epochs, optimizer, prefetch=0)
+    return network.loss(ArrayDataset(validation_inputs, validation_targets)), (network, optimizer)
+
+def train_linear_regression(params: dict[str, Any], inputs: np.ndarray, targets: np.ndarray, validation_inputs: np.ndarray, validation_targets: np.ndarray, num_epochs: int, state: Optional[tuple[LinearModel, int]]):
+    """
+    params: batch_size, learning_rate, and optionally l2 and seed
+    """
+    model, epochs_done = state if state is not None else (None, 0)
+    model = VectorizedLinearRegression(
+        inputs, targets[:, 0], params["batch_size"], num_epochs, params["learning_rate"],
+        l2=params.get("l2", 0.0), seed=params.get("seed", 0) + epochs_done, model=model
+    )
+    errors = model.predict(validation_inputs) - validation_targets[:, 0]
+    loss = float(errors @ errors) / len(errors)
+    return loss if np.isfinite(loss) else float("inf"), (model, epochs_done + num_epochs)
+
+# state of a worker process running trials, set once by init_worker
+worker_state: tuple[list[np.ndarray], list[SharedMemory]]
+
+def init_worker(descriptions: list[tuple[str, tuple[int, ...], str]]):
+    global worker_state
+    shared_memory = [SharedMemory(name=name) for name, _, _ in descriptions]
+    arrays = [np.ndarray(shape, dtype=dtype, buffer=memory.buf) for memory, (_, shape, dtype) in zip(shared_memory, descriptions)]
+    worker_state = (arrays, shared_memory)
+
+def run_trial(trainer: Trainer, params: dict[str, Any], num_epochs: int, state: Any):
+    """
+    return
+        loss: float
+        state: the trainer's state to continue the trial later
+        elapsed: float, wall time in seconds
+    """
+    arrays, _ = worker_state
+    start = perf_counter()
+    loss, state = trainer(params, *arrays, num_epochs, state)
+    return loss, state, perf_counter() - start
+
+class Sweep:
+    """
+    Runs trials of a trainer over configurations on a process pool.
+    The dataset is shuffled once, split into training and validation rows, and copied into shared memory that every worker maps,
+    so no trial pickles it. With min_epochs, the sweep uses successive halving (Jamieson & Talwalkar 2016):
+    every trial trains for min_epochs, then only the best 1/eta go on to eta times as many epochs in total, and so on up to max_epochs,
+    each continuing from its state.
+    """
+
+    def __init__(
+        self, trainer: Trainer, inputs: np.ndarray, targets: np.ndarray, processes: int = 1,
+        validation_fraction: float = 0.2, seed: int = 0
+    ):
+        self.trainer = trainer
+        self.processes = processes
+        inputs = np.asarray(inputs, dtype=np.float64).reshape(len(inputs), -1)
+        targets = np.asarray(targets, dtype=np.float64).reshape(len(targets), -1)
+        order = np.random.default_rng(seed).permutation(len(inputs))
+        num_validation = max(1, int(len(inputs) * validation_fraction))
+        train_rows, validation_rows = order[num_validation:], order[:num_validation]
+        self.arrays = [inputs[train_rows], targets[train_rows], inputs[validation_rows], targets[validation_rows]]
+
+    def share(self):
+        self.shared_memory = [SharedMemory(create=True, size=max(array.nbytes, 1)) for array in self.arrays]
+        for memory, array in zip(self.shared_memory, self.arrays):
+            np.ndarray(array.shape, dtype=array.dtype, buffer=memory.buf)[...] = array
+        return [(memory.name, array.shape, array.dtype.str) for memory, array in zip(self.shared_memory, self.arrays)]
+
+    def unshare(self):
+        for memory in self.shared_memory:
+            memory.close()
+            memory.unlink()
+        del self.shared_memory
+
+    def run(
+        self, configs: Iterable[dict[str, Any]], max_epochs: int, min_epochs: Optional[int] = None, eta: int = 3,
+        results_path: Optional[str] = None
+    ) -> list[dict[str, Any]]:
+        """
+        return
+            one row per trial, best first: trial, the parameters, epochs, wall_time, loss and stopped (True if halving stopped it early)
+        results_path also writes them as CSV.
+        """
+        configs = list(configs)
+        budgets = [max_epochs]
+        if min_epochs is not None:
+            budgets = []
+            budget = min_epochs
+            while budget < max_epochs:
+                budgets.append(budget)
+                budget *= eta
+            budgets.append(max_epochs)
+        rows = [{"trial": trial, **params, "epochs": 0, "wall_time": 0.0, "loss": float("inf"), "stopped": False} for trial, params in enumerate(configs)]
+        states: list[Any] = [None] * len(configs)
+        alive = list(range(len(configs)))
+        try:
+            with ProcessPoolExecutor(self.processes, initializer=init_worker, initargs=(self.share(),)) as pool:
+                for rung, budget in enumerate(budgets):
+                    tasks = {trial: pool.submit(run_trial, self.trainer, configs[trial], budget - rows[trial]["epochs"], states[trial]) for trial in alive}
+                    for trial, task in tasks.items():
+                        loss, states[trial], elapsed = task.result()
+                        rows[trial].update(epochs=budget, wall_time=rows[trial]["wall_time"] + elapsed, loss=loss)
+                    if rung < len(budgets) - 1:
+                        alive.sort(key=lambda trial: rows[trial]["loss"])
+                        for trial in alive[max(1, len(alive) // eta):]:
+                            rows[trial]["stopped"] = True
+                            states[trial] = None
+                        alive = alive[:max(1, len(alive) // eta)]
+        finally:
+            self.unshare()
+        rows.sort(key=lambda row: row["loss"])
+        if results_path is not None:
+            fields = list(dict.fromkeys(field for row in rows for field in row))
+            with open(results_path, "w", newline="") as file:
+                writer = csv.DictWriter(file, fields)
+                writer.writeheader()
+                writer.writerows(rows)
+        return rows
+
+if __name__ == "__main__":
+
+    from os import cpu_count
+
+    def show(rows: list[dict[str, Any]], top: int = 5):
+        for row in rows[:top]:
+            print(", ".join(f"{key} = {value:.4g}" if isinstance(value, float) else f"{key} = {value}" for key, value in row.items()))
+
+    processes = min(4, cpu_count() or 1)
+
+    print("LINEAR REGRESSION, random search")
+    rng = np.random.default_rng(0)
+    inputs = rng.uniform(-5, 5, (20000, 3))
+    targets = inputs @ np.array([1.5, -2.0, 0.5]) + 4.0 + rng.normal(0, 0.1, len(inputs))
+    sweep = Sweep(train_linear_regression, inputs, targets, processes)
+    show(sweep.run(random_search({"batch_size": [32, 128, 512], "learning_rate": LogUniform(1e-4, 0.1)}, 12), max_epochs=9, min_epochs=1))
+
+    print("NETWORK, grid search")
+    inputs = rng.uniform(0, 1, (2000, 8))
+    targets = (inputs[:, :4].sum(axis=1, keepdims=True) > inputs[:, 4:].sum(axis=1, keepdims=True)).astype(np.float64)
+    sweep = Sweep(train_network, inputs, targets, processes)
+    show(sweep.run(grid({"hidden_len": [2, 8], "batch_size": [16, 64], "learning_rate": [0.01, 0.1], "optimizer": ["adam"]}), max_epochs=27, min_epochs=3))
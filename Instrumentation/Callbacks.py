@@ -0,0 +1,232 @@
+from typing import Callable, Iterable, Optional
+from collections import Counter
+from time import perf_counter
+import cProfile
+import pstats
+import tracemalloc
+
+class Phase:
+    """
+    Accumulated wall time of one phase of learning, timed with `with metrics.phase(name):`.
+    """
+
+    __slots__ = ("elapsed", "calls", "started")
+
+    def __init__(self):
+        self.elapsed = 0.0
+        self.calls = 0
+        self.started = 0.0
+
+    def __enter__(self):
+        self.started = perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.elapsed += perf_counter() - self.started
+        self.calls += 1
+
+class Metrics:
+    """
+    Per-phase timers and event counters of one learning run.
+    """
+
+    def __init__(self):
+        self.phases: dict[str, Phase] = {}
+        self.counts: Counter[str] = Counter()
+        self.start = perf_counter()
+        self.stop: Optional[float] = None
+
+    def phase(self, name: str) -> Phase:
+        phase = self.phases.get(name)
+        if phase is None:
+            phase = self.phases[name] = Phase()
+        return phase
+
+    def count(self, name: str, n: int = 1):
+        self.counts[name] += n
+
+    def elapsed(self):
+        return (perf_counter() if self.stop is None else self.stop) - self.start
+
+    def rate(self, name: str):
+        """
+        return
+            events counted under name per second of the run so far
+        """
+        elapsed = self.elapsed()
+        return self.counts[name] / elapsed if elapsed > 0 else 0.0
+
+    def summary(self) -> dict[str, float]:
+        summary = {"elapsed": self.elapsed()}
+        for name, phase in self.phases.items():
+            summary[f"{name}_seconds"] = phase.elapsed
+            summary[f"{name}_calls"] = phase.calls
+        for name, count in self.counts.items():
+            summary[name] = count
+            summary[f"{name}_per_second"] = self.rate(name)
+        return summary
+
+    def __str__(self):
+        elapsed = self.elapsed()
+        lines = [f"{elapsed:.3f}s"]
+        for name, phase in sorted(self.phases.items(), key=lambda item: item[1].elapsed, reverse=True):
+            if phase.calls == 0:
+                continue
+            share = phase.elapsed / elapsed if elapsed > 0 else 0.0
+            lines.append(f"  {name}: {phase.elapsed:.3f}s in {phase.calls} calls ({share:.0%})")
+        for name, count in self.counts.items():
+            lines.append(f"  {name}: {count} ({self.rate(name):.0f}/s)")
+        return "\n".join(lines)
+
+class Callback:
+    """
+    Hooks a learner calls while learning, every hook does nothing unless overridden.
+    learner is the name of the learner class, metrics the Metrics of the run,
+    and values whatever the learner reports with the event (losses, gains, boundary sets, ...).
+    """
+
+    def on_begin(self, learner: str, metrics: Metrics):
+        pass
+
+    def on_epoch(self, learner: str, metrics: Metrics, epoch: int, **values):
+        pass
+
+    def on_step(self, learner: str, metrics: Metrics, step: int, **values):
+        pass
+
+    def on_node_split(self, learner: str, metrics: Metrics, attribute: str, depth: int, **values):
+        pass
+
+    def on_example(self, learner: str, metrics: Metrics, index: int, **values):
+        pass
+
+    def on_end(self, learner: str, metrics: Metrics):
+        pass
+
+class Instrumentation:
+    """
+    What a learner reports to: timers and counters in self.metrics, reset by begin, and events passed on to callbacks.
+    Without callbacks it only keeps the metrics, and learners skip assembling the values of per-step and per-example events.
+    """
+
+    def __init__(self, callbacks: Iterable[Callback] = ()):
+        self.callbacks = list(callbacks)
+        self.metrics = Metrics()
+
+    def phase(self, name: str) -> Phase:
+        return self.metrics.phase(name)
+
+    def count(self, name: str, n: int = 1):
+        self.metrics.count(name, n)
+
+    def begin(self, learner: str):
+        self.metrics = Metrics()
+        for callback in self.callbacks:
+            callback.on_begin(learner, self.metrics)
+
+    def epoch(self, learner: str, epoch: int, **values):
+        for callback in self.callbacks:
+            callback.on_epoch(learner, self.metrics, epoch, **values)
+
+    def step(self, learner: str, step: int, **values):
+        for callback in self.callbacks:
+            callback.on_step(learner, self.metrics, step, **values)
+
+    def node_split(self, learner: str, attribute: str, depth: int, **values):
+        for callback in self.callbacks:
+            callback.on_node_split(learner, self.metrics, attribute, depth, **values)
+
+    def example(self, learner: str, index: int, **values):
+        for callback in self.callbacks:
+            callback.on_example(learner, self.metrics, index, **values)
+
+    def end(self, learner: str):
+        self.metrics.stop = perf_counter()
+        for callback in self.callbacks:
+            callback.on_end(learner, self.metrics)
+
+class ProgressLogger(Callback):
+    """
+    Log events at most once every interval seconds, and the metrics of the run at the end.
+    Values that are not numbers are left out.
+    """
+
+    def __init__(self, interval: float = 5.0, counter: str = "examples", log: Callable[[str], None] = print):
+        self.interval = interval
+        self.counter = counter
+        self.log = log
+        self.last_log = float("-inf")
+
+    def on_begin(self, learner: str, metrics: Metrics):
+        self.last_log = float("-inf")
+
+    def report(self, learner: str, metrics: Metrics, event: str, values: dict):
+        now = perf_counter()
+        if now - self.last_log < self.interval:
+            return
+        self.last_log = now
+        numbers = ", ".join(f"{name} = {value:.6g}" for name, value in values.items() if isinstance(value, (int, float)))
+        self.log(f"[{learner}] {event}{': ' if numbers else ''}{numbers} ({metrics.rate(self.counter):.0f} {self.counter}/s)")
+
+    def on_epoch(self, learner: str, metrics: Metrics, epoch: int, **values):
+        self.report(learner, metrics, f"epoch {epoch}", values)
+
+    def on_step(self, learner: str, metrics: Metrics, step: int, **values):
+        self.report(learner, metrics, f"step {step}", values)
+
+    def on_node_split(self, learner: str, metrics: Metrics, attribute: str, depth: int, **values):
+        self.report(learner, metrics, f"split on {attribute} at depth {depth}", values)
+
+    def on_example(self, learner: str, metrics: Metrics, index: int, **values):
+        self.report(learner, metrics, f"example {index}", values)
+
+    def on_end(self, learner: str, metrics: Metrics):
+        self.log(f"[{learner}] done in {metrics}")
+
+class Profiler(Callback):
+    """
+    Opt-in cProfile of a whole run. The profile is kept in self.stats, printed (top functions by sort) or dumped to path.
+    """
+
+    def __init__(self, path: Optional[str] = None, sort: str = "cumulative", top: int = 20):
+        self.path = path
+        self.sort = sort
+        self.top = top
+        self.stats: Optional[pstats.Stats] = None
+
+    def on_begin(self, learner: str, metrics: Metrics):
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+
+    def on_end(self, learner: str, metrics: Metrics):
+        self.profile.disable()
+        self.stats = pstats.Stats(self.profile)
+        if self.path is not None:
+            self.stats.dump_stats(self.path)
+        else:
+            self.stats.sort_stats(self.sort).print_stats(self.top)
+        del self.profile
+
+class MemoryTracer(Callback):
+    """
+    Opt-in tracemalloc of a whole run: self.peak is the peak traced memory in bytes,
+    self.top the top allocation sites by size still allocated at the end.
+    """
+
+    def __init__(self, top: int = 10, frames: int = 1):
+        self.num_top = top
+        self.frames = frames
+        self.peak = 0
+        self.top: list[tracemalloc.Statistic] = []
+
+    def on_begin(self, learner: str, metrics: Metrics):
+        self.started = not tracemalloc.is_tracing()
+        if self.started:
+            tracemalloc.start(self.frames)
+        tracemalloc.reset_peak()
+
+    def on_end(self, learner: str, metrics: Metrics):
+        self.peak = tracemalloc.get_traced_memory()[1]
+        self.top = tracemalloc.take_snapshot().statistics("lineno")[:self.num_top]
+        if self.started:
+            tracemalloc.stop()
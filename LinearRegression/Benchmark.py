@@ -0,0 +1,39 @@
+"""
+Compare the vectorized engine with the per-example LinearRegression on 10⁶ rows, and run it on 10⁷,
+next to the one-pass closed-form solver.
+Run from the repository root: python -m LinearRegression.Benchmark
+"""
+from time import perf_counter
+import numpy as np
+from LinearRegression.GradientDescent import LinearRegression, VectorizedLinearRegression
+from LinearRegression.NormalEquation import NormalEquation
+
+def make_data(num_examples: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    inputs = rng.uniform(1, 10, num_examples)
+    return inputs, 2 * inputs + 3 + rng.normal(0, 0.1, num_examples)
+
+def benchmark(num_examples: int, batch_size: int, num_epochs: int, learning_rate: float, loop: bool = True):
+    inputs, targets = make_data(num_examples)
+    start = perf_counter()
+    model = VectorizedLinearRegression(inputs, targets, batch_size, num_epochs, learning_rate, shuffle=False)
+    vectorized_time = perf_counter() - start
+    print(f"{num_examples} rows vectorized: {vectorized_time:.3f}s ({num_examples * num_epochs / vectorized_time:.0f} examples/s), {model}")
+    start = perf_counter()
+    shuffled_model = VectorizedLinearRegression(inputs, targets, batch_size, num_epochs, learning_rate, seed=0)
+    shuffled_time = perf_counter() - start
+    print(f"{num_examples} rows vectorized, shuffled: {shuffled_time:.3f}s ({num_examples * num_epochs / shuffled_time:.0f} examples/s), {shuffled_model}")
+    if loop:
+        data = list(zip(inputs.tolist(), targets.tolist()))
+        start = perf_counter()
+        h = LinearRegression(data, batch_size, num_epochs, learning_rate)
+        loop_time = perf_counter() - start
+        difference = max(abs(h(x) - model(x)) for x in (1.0, 10.0))
+        print(f"{num_examples} rows loop: {loop_time:.3f}s, speedup {loop_time / vectorized_time:.1f}x, max prediction difference {difference:.2e}")
+        start = perf_counter()
+        h = NormalEquation(data)
+        print(f"{num_examples} rows closed form (one pure-Python pass): {perf_counter() - start:.3f}s, y = {h.statistics.solve()[0][0]:.4f}x + {h.statistics.solve()[1]:.4f}")
+
+if __name__ == "__main__":
+    benchmark(10 ** 6, 1000, 1, 0.01)
+    benchmark(10 ** 7, 1000, 1, 0.01, loop=False)
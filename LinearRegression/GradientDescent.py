@@ -1,40 +1,142 @@
-from typing import Callable
+"""
+Run from the repository root: python -m LinearRegression.GradientDescent
+"""
+from typing import Callable, Optional, Union
 from random import randint
+import numpy as np
+from Instrumentation.Callbacks import Instrumentation
 
 Hypothesis = Callable[[float], float]
 
-def LinearRegression(data: list[tuple[float, float]], batch_size: int, num_epochs: int, learning_rate: float):
+def LinearRegression(data: list[tuple[float, float]], batch_size: int, num_epochs: int, learning_rate: float, instrumentation: Optional[Instrumentation] = None):
     """
     y = ax + b
+    instrumentation times the gradient and update phases, counts examples and steps,
+    and passes epoch and step events (with h and its loss on the step) to its callbacks.
     """
+    instrumentation = instrumentation or Instrumentation()
     a = b = 0
     h: Hypothesis = lambda x: a * x + b
+    instrumentation.begin("LinearRegression")
+    gradient_phase, update_phase = instrumentation.phase("gradient"), instrumentation.phase("update")
     for epoch in range(1, num_epochs + 1):
-        print(f"Epoch {epoch}:\n")
         start, stop = 0, batch_size
         step_data = data[start:stop]
         step = 1
         while step_data != []:
             n = len(step_data)
-            a_gradient = sum((h(x) - y) * x for x, y in step_data) / n
-            b_gradient = sum(h(x) - y for x, y in step_data) / n
-            a = a - learning_rate * a_gradient
-            b = b - learning_rate * b_gradient
-            loss = sum((h(x) - y) ** 2 for x, y in step_data) / n
-            print(f"Step {step}: h is y = {a}x + {b}, loss = {loss}")
+            with gradient_phase:
+                a_gradient = sum((h(x) - y) * x for x, y in step_data) / n
+                b_gradient = sum(h(x) - y for x, y in step_data) / n
+            with update_phase:
+                a = a - learning_rate * a_gradient
+                b = b - learning_rate * b_gradient
+            instrumentation.count("examples", n)
+            if instrumentation.callbacks:
+                loss = sum((h(x) - y) ** 2 for x, y in step_data) / n
+                instrumentation.step("LinearRegression", step, epoch=epoch, a=a, b=b, loss=loss)
             start, stop = stop, stop + batch_size
             step_data = data[start:stop]
             step += 1
-        print("")
+        instrumentation.epoch("LinearRegression", epoch, a=a, b=b)
+    instrumentation.end("LinearRegression")
     return h
 
+class LinearModel:
+    """
+    y = w·x + b, scoring a whole batch of inputs at once with predict.
+    Called on a single x (a float for one feature), it answers like the h returned by LinearRegression.
+    """
+
+    def __init__(self, weights: np.ndarray, intercept: float):
+        self.weights = weights
+        self.intercept = intercept
+
+    def predict(self, inputs: np.ndarray) -> np.ndarray:
+        """
+        inputs: one example per row, or a 1-D array of single-feature examples
+        """
+        inputs = np.asarray(inputs, dtype=self.weights.dtype)
+        if inputs.ndim == 1:
+            inputs = inputs.reshape(-1, len(self.weights))
+        return inputs @ self.weights + self.intercept
+
+    def __call__(self, x: Union[float, list[float]]) -> float:
+        return float(self.predict(np.atleast_1d(np.asarray(x, dtype=self.weights.dtype)))[0])
+
+    def __repr__(self):
+        return f"y = {self.weights.tolist()}·x + {self.intercept}"
+
+def VectorizedLinearRegression(
+    inputs: np.ndarray, targets: np.ndarray, batch_size: int, num_epochs: int, learning_rate: float,
+    l2: float = 0.0, shuffle: bool = True, seed: Optional[int] = None, model: Optional[LinearModel] = None,
+    instrumentation: Optional[Instrumentation] = None
+) -> LinearModel:
+    """
+    Minibatch gradient descent on the mean squared error (plus l2 |w|²/2, the intercept is not penalized), like LinearRegression
+    but for n-feature inputs held in arrays (np.memmap and ColumnarDataset columns work too) with every minibatch computed as matrix products.
+    inputs has one example per row, or is 1-D for a single feature, with no NaN (a missing value raises a ValueError). shuffle visits the examples in a new random order (from seed) every epoch.
+    Pass model to continue learning from its weights instead of from zero.
+    """
+    instrumentation = instrumentation or Instrumentation()
+    instrumentation.begin("VectorizedLinearRegression")
+    gradient_phase, update_phase = instrumentation.phase("gradient"), instrumentation.phase("update")
+    inputs = inputs.reshape(len(inputs), -1)
+    targets = targets.reshape(-1)
+    assert len(inputs) == len(targets), f"Got {len(inputs)} inputs but {len(targets)} targets."
+    dtype = inputs.dtype if inputs.dtype.kind == "f" else np.dtype("float64")
+    num_examples, num_features = inputs.shape
+    weights, intercept = (np.zeros(num_features, dtype=dtype), 0.0) if model is None else (model.weights.astype(dtype), model.intercept)
+    rng = np.random.default_rng(seed)
+    for epoch in range(1, num_epochs + 1):
+        order = rng.permutation(num_examples) if shuffle else None
+        squared_error = 0.0
+        for step, start in enumerate(range(0, num_examples, batch_size), start=1):
+            if order is None:
+                step_inputs, step_targets = inputs[start:start + batch_size], targets[start:start + batch_size]
+            else:
+                # gather in ascending index order, which reads memory-mapped arrays more sequentially
+                rows = np.sort(order[start:start + batch_size])
+                step_inputs, step_targets = inputs[rows], targets[rows]
+            n = len(step_inputs)
+            with gradient_phase:
+                errors = step_inputs @ weights + (intercept - step_targets)
+                weights_gradient = step_inputs.T @ errors / n
+                intercept_gradient = errors.sum() / n
+            if np.isnan(errors).any():
+                # a NaN input or target (an empty cell of a ColumnarDataset column) would silently turn every weight into NaN
+                missing = np.flatnonzero(np.isnan(step_inputs).any(axis=1) | np.isnan(step_targets))
+                if len(missing) > 0:
+                    row = start + missing[0] if order is None else rows[missing[0]]
+                    raise ValueError(f"Example {row} has a missing (NaN) input or target.")
+            with update_phase:
+                if l2 != 0:
+                    weights_gradient += l2 * weights
+                weights -= learning_rate * weights_gradient
+                intercept -= learning_rate * float(intercept_gradient)
+            step_loss = float(errors @ errors)
+            squared_error += step_loss
+            instrumentation.count("examples", n)
+            if instrumentation.callbacks:
+                instrumentation.step("VectorizedLinearRegression", step, epoch=epoch, loss=step_loss / n)
+        instrumentation.epoch("VectorizedLinearRegression", epoch, loss=squared_error / num_examples)
+    instrumentation.end("VectorizedLinearRegression")
+    return LinearModel(weights, intercept)
+
 if __name__ == "__main__":
+    from Instrumentation.Callbacks import ProgressLogger
     true_a, true_b = 2, 3
     true_h: Hypothesis = lambda x: true_a * x + true_b
-    h = LinearRegression([(x, true_h(x)) for x in (randint(1, 10) for _ in range(100))], 50, 1000, 0.01)
+    h = LinearRegression([(x, true_h(x)) for x in (randint(1, 10) for _ in range(100))], 50, 1000, 0.01, Instrumentation([ProgressLogger(interval=0.01)]))
     print(f"True h is y = {true_a}x + {true_b}")
     print("Prediction:")
     for i in range(1, 11):
         prediction = h(i)
         gold = true_h(i)
         print(f"h({i}) = {prediction}, gold = {gold}, error = {prediction - gold}")
+
+    true_weights, true_intercept = np.array([1.5, -2.0, 0.5]), 4.0
+    inputs = np.random.default_rng(0).uniform(-5, 5, (100000, 3))
+    model = VectorizedLinearRegression(inputs, inputs @ true_weights + true_intercept, 256, 5, 0.01, seed=0)
+    print(f"True h is y = {true_weights.tolist()}·x + {true_intercept}, vectorized fit: {model}")
+    print(f"Batch prediction: {model.predict(inputs[:3]).round(3).tolist()}, gold = {(inputs[:3] @ true_weights + true_intercept).round(3).tolist()}")
@@ -0,0 +1,179 @@
+"""
+Run from the repository root: python -m LinearRegression.NormalEquation
+"""
+from typing import Callable, Iterable, Optional, Union
+from concurrent.futures import ProcessPoolExecutor
+from numbers import Real
+from random import randint, uniform
+from Instrumentation.Callbacks import Instrumentation
+
+Hypothesis = Callable[[Union[float, list[float]]], float]
+Sample = tuple[Union[float, list[float]], float]
+
+class SufficientStatistics:
+    """
+    Everything a least-squares fit needs from the data, in O(num_features²) memory however many examples are added:
+    the count, the means of x and y, and the centered second moments Σ(x - x̄)(x - x̄)ᵀ, Σ(x - x̄)(y - ȳ) and Σ(y - ȳ)².
+    Centering keeps the normal equations well conditioned when x is far from 0.
+    Statistics of separate shards merge into the statistics of their union (Chan et al. 1979), with + or merge.
+    """
+
+    def __init__(self, num_features: int):
+        self.num_features = num_features
+        self.n = 0
+        self.mean_x = [0.0] * num_features
+        self.mean_y = 0.0
+        self.xx = [[0.0] * num_features for _ in range(num_features)]
+        self.xy = [0.0] * num_features
+        self.yy = 0.0
+
+    def update(self, x: Union[float, list[float]], y: float):
+        # Real also covers NumPy scalars, as from iterating over an array
+        x = [x] if isinstance(x, Real) else x
+        assert len(x) == self.num_features, f"Expected {self.num_features} features but got {len(x)}."
+        self.n += 1
+        dx = [value - mean for value, mean in zip(x, self.mean_x)]
+        dy = y - self.mean_y
+        self.mean_x = [mean + d / self.n for mean, d in zip(self.mean_x, dx)]
+        self.mean_y += dy / self.n
+        # deviations from the new means
+        ex = [value - mean for value, mean in zip(x, self.mean_x)]
+        ey = y - self.mean_y
+        for i, d in enumerate(dx):
+            row = self.xx[i]
+            for j, e in enumerate(ex):
+                row[j] += d * e
+            self.xy[i] += d * ey
+        self.yy += dy * ey
+
+    def update_many(self, data: Iterable[Sample]):
+        for x, y in data:
+            self.update(x, y)
+        return self
+
+    def merge(self, other: "SufficientStatistics"):
+        assert self.num_features == other.num_features, "Cannot merge statistics of different numbers of features."
+        if other.n == 0:
+            return self
+        n = self.n + other.n
+        dx = [b - a for a, b in zip(self.mean_x, other.mean_x)]
+        dy = other.mean_y - self.mean_y
+        weight = self.n * other.n / n
+        for i in range(self.num_features):
+            for j in range(self.num_features):
+                self.xx[i][j] += other.xx[i][j] + dx[i] * dx[j] * weight
+            self.xy[i] += other.xy[i] + dx[i] * dy * weight
+        self.yy += other.yy + dy * dy * weight
+        self.mean_x = [a + d * other.n / n for a, d in zip(self.mean_x, dx)]
+        self.mean_y += dy * other.n / n
+        self.n = n
+        return self
+
+    def __add__(self, other: "SufficientStatistics"):
+        result = SufficientStatistics(self.num_features)
+        return result.merge(self).merge(other)
+
+    def solve(self, l2: float = 0.0):
+        """
+        Minimize Σ(w·x + b - y)² + l2 |w|² (the intercept is not penalized).
+        return
+            weights: list[float]
+            intercept: float
+        """
+        assert self.n > 0, "No examples to fit."
+        matrix = [[value + (l2 if i == j else 0.0) for j, value in enumerate(row)] for i, row in enumerate(self.xx)]
+        weights = solve_linear_system(matrix, self.xy)
+        intercept = self.mean_y - sum(w * mean for w, mean in zip(weights, self.mean_x))
+        return weights, intercept
+
+    def loss(self, weights: list[float], intercept: float):
+        """
+        return
+            mean squared error of w·x + b over the examples, computed from the statistics alone
+        """
+        # with centered statistics, residual = (w·dx - dy) + (w·x̄ + b - ȳ)
+        quadratic = sum(weights[i] * weights[j] * self.xx[i][j] for i in range(self.num_features) for j in range(self.num_features))
+        cross = sum(w * xy for w, xy in zip(weights, self.xy))
+        offset = sum(w * mean for w, mean in zip(weights, self.mean_x)) + intercept - self.mean_y
+        return (quadratic - 2 * cross + self.yy) / self.n + offset * offset
+
+def solve_linear_system(matrix: list[list[float]], vector: list[float]):
+    """
+    Gaussian elimination with partial pivoting, on copies of matrix and vector.
+    """
+    size = len(vector)
+    augmented = [row[:] + [value] for row, value in zip(matrix, vector)]
+    scale = max((abs(value) for row in matrix for value in row), default=0.0)
+    for column in range(size):
+        pivot = max(range(column, size), key=lambda row: abs(augmented[row][column]))
+        if abs(augmented[pivot][column]) <= 1e-12 * scale:
+            raise ValueError("The features are linearly dependent (or one is constant). Remove them or use l2 > 0.")
+        augmented[column], augmented[pivot] = augmented[pivot], augmented[column]
+        pivot_row = augmented[column]
+        for row in range(column + 1, size):
+            factor = augmented[row][column] / pivot_row[column]
+            if factor != 0.0:
+                target = augmented[row]
+                for k in range(column, size + 1):
+                    target[k] -= factor * pivot_row[k]
+    solution = [0.0] * size
+    for row in reversed(range(size)):
+        solution[row] = (augmented[row][size] - sum(augmented[row][k] * solution[k] for k in range(row + 1, size))) / augmented[row][row]
+    return solution
+
+def accumulate(shard: Iterable[Sample], num_features: int):
+    return SufficientStatistics(num_features).update_many(shard)
+
+def NormalEquation(
+    data: Union[Iterable[Sample], list[Iterable[Sample]]], num_features: int = 1, l2: float = 0.0,
+    processes: int = 1, instrumentation: Optional[Instrumentation] = None
+) -> Hypothesis:
+    """
+    y = w·x + b fitted exactly by least squares in one pass over data, without keeping it in memory.
+    x is a float when num_features is 1, otherwise a list of num_features floats.
+    processes > 1 accumulates shards on a process pool and merges their statistics: data is then a list of shards,
+    each a picklable iterable (a list, or an object whose __iter__ opens its own file, like the shards of ColumnarSamples). A plain list of examples is cut into processes shards.
+    Returns h like LinearRegression, which takes x as given in data. h.statistics keeps the statistics for merging more data later.
+    """
+    instrumentation = instrumentation or Instrumentation()
+    instrumentation.begin("NormalEquation")
+    with instrumentation.phase("accumulate"):
+        if processes > 1:
+            shards = data
+            if isinstance(data, list) and len(data) > 0 and isinstance(data[0], tuple):
+                share = -(-len(data) // processes)
+                shards = [data[start:start + share] for start in range(0, len(data), share)]
+            with ProcessPoolExecutor(processes) as pool:
+                statistics = SufficientStatistics(num_features)
+                for shard_statistics in pool.map(accumulate, shards, [num_features] * len(shards)):
+                    statistics.merge(shard_statistics)
+        else:
+            statistics = accumulate(data, num_features)
+    instrumentation.count("examples", statistics.n)
+    with instrumentation.phase("solve"):
+        weights, intercept = statistics.solve(l2)
+    if num_features == 1:
+        a, b = weights[0], intercept
+        h: Hypothesis = lambda x: a * x + b
+    else:
+        h: Hypothesis = lambda x: sum(w * value for w, value in zip(weights, x)) + intercept
+    h.statistics = statistics
+    instrumentation.epoch("NormalEquation", 1, loss=statistics.loss(weights, intercept))
+    instrumentation.end("NormalEquation")
+    return h
+
+if __name__ == "__main__":
+    true_a, true_b = 2, 3
+    true_h: Hypothesis = lambda x: true_a * x + true_b
+    h = NormalEquation((x, true_h(x)) for x in (randint(1, 10) for _ in range(100)))
+    print(f"True h is y = {true_a}x + {true_b}")
+    print("Prediction:")
+    for i in range(1, 11):
+        prediction = h(i)
+        gold = true_h(i)
+        print(f"h({i}) = {prediction}, gold = {gold}, error = {prediction - gold}")
+
+    true_weights, true_intercept = [1.5, -2.0, 0.5], 4.0
+    DATA = [(x, sum(w * value for w, value in zip(true_weights, x)) + true_intercept + uniform(-0.1, 0.1)) for x in ([uniform(-5, 5) for _ in range(3)] for _ in range(10000))]
+    h = NormalEquation(DATA, num_features=3, processes=2)
+    print(f"True h is y = {true_weights}·x + {true_intercept}, fitted on 2 shards: y = {[round(w, 3) for w in h.statistics.solve()[0]]}·x + {h.statistics.solve()[1]:.3f}")
@@ -1,99 +1,775 @@
-from functools import partial
-from random import uniform
-from math import exp
-from typing import Callable
-from tqdm import tqdm
+"""
+Run from the repository root: python -m NeuralNetwork.BackPropagation
+"""
+from math import cos, pi, sqrt
+from random import Random
+from typing import Callable, Iterable, Iterator, Optional, Union
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+from queue import Full, Queue
+from struct import Struct
+from threading import Event, Thread
+import json
+import os
+import numpy as np
+from Instrumentation.Callbacks import Instrumentation
+from Dataset.Columnar import ColumnarDataset
+
+# state of a worker process computing gradients for learn(processes=n), set once by init_worker
+worker_state: tuple["Network", np.ndarray, np.ndarray, np.ndarray, list[SharedMemory]]
+
+def init_worker(structure: tuple[int, int, int], activation_func_name: str, dtype: str, batch_size: int, processes: int, shared_memory: list[SharedMemory]):
+    global worker_state
+    parameters, batch, gradients = shared_memory
+    num_parameters = Network.num_parameters(structure)
+    network = Network(*structure, activation_func_name, dtype, parameters=np.ndarray(num_parameters, dtype=dtype, buffer=parameters.buf))
+    inputs, targets = Network.batch_views(batch.buf, structure, dtype, batch_size)
+    gradient_slots = np.ndarray((processes, num_parameters), dtype=dtype, buffer=gradients.buf)
+    worker_state = (network, inputs, targets, gradient_slots, shared_memory)
+
+def compute_shard_gradients(shard: int, start: int, stop: int):
+    """
+    Sum the gradients of rows start:stop of the shared minibatch into gradient slot shard.
+    return
+        loss: float
+    """
+    network, inputs, targets, gradient_slots, _ = worker_state
+    network.gradients = Network.layer_views(gradient_slots[shard], network.structure)
+    hidden, outputs = network.forward(inputs[start:stop])
+    return network.backward(inputs[start:stop], hidden, outputs, targets[start:stop])
+
+Example = tuple[list[float], list[float]]
+Batch = tuple[np.ndarray, np.ndarray]
+
+class ArrayDataset:
+    """
+    Training examples stored as an inputs array and a targets array, one example per row.
+    The arrays can be np.memmap (see ArrayDataset.open), so only the minibatches being assembled are read from disk.
+    Network.learn accepts any object with a batches method like this one.
+    """
+
+    def __init__(self, inputs: np.ndarray, targets: np.ndarray):
+        assert inputs.ndim == 2 and targets.ndim == 2 and len(inputs) == len(targets),\
+            f"Incompatible arrays. Expected one row of inputs and one row of targets per example but got shapes {inputs.shape} and {targets.shape}."
+        self.inputs, self.targets = inputs, targets
+
+    def __len__(self):
+        return len(self.inputs)
+
+    @classmethod
+    def from_examples(cls, examples: list[Example], dtype: str = "float64") -> "ArrayDataset":
+        return cls(
+            np.array([input_values for input_values, _ in examples], dtype=dtype).reshape(len(examples), -1),
+            np.array([target_outputs for _, target_outputs in examples], dtype=dtype).reshape(len(examples), -1)
+        )
+
+    @classmethod
+    def open(cls, inputs_path: str, targets_path: str, mmap_mode: str = "r") -> "ArrayDataset":
+        """
+        Memory-map the .npy files written by ArrayDataset.write or np.save.
+        """
+        return cls(np.load(inputs_path, mmap_mode=mmap_mode), np.load(targets_path, mmap_mode=mmap_mode))
+
+    @staticmethod
+    def write(
+        examples: Iterable[Example], num_examples: int, input_len: int, output_len: int,
+        inputs_path: str, targets_path: str, dtype: str = "float64"
+    ):
+        """
+        Stream examples into .npy files without holding them in memory.
+        """
+        inputs = np.lib.format.open_memmap(inputs_path, "w+", dtype, (num_examples, input_len))
+        targets = np.lib.format.open_memmap(targets_path, "w+", dtype, (num_examples, output_len))
+        count = 0
+        for count, (input_values, target_outputs) in enumerate(examples, 1):
+            assert count <= num_examples, f"Got more than {num_examples} examples."
+            assert len(input_values) == input_len and len(target_outputs) == output_len,\
+                f"Incompatible example {count - 1}. Every example must have {input_len} input values and {output_len} output values."
+            inputs[count - 1], targets[count - 1] = input_values, target_outputs
+        assert count == num_examples, f"Expected {num_examples} examples but got {count}."
+        inputs.flush()
+        targets.flush()
+
+    def rows(self, start: int, stop: int) -> Batch:
+        return self.inputs[start:stop], self.targets[start:stop]
+
+    def batches(self, batch_size: int, rng: Random, shuffle_buffer: int = 0) -> Iterator[Batch]:
+        """
+        shuffle_buffer > 0 visits blocks of shuffle_buffer contiguous rows in random order and shuffles the rows within each block,
+        so at most one block is in memory and reads stay sequential. shuffle_buffer >= len(self) is a full shuffle.
+        """
+        if shuffle_buffer <= 0:
+            for start in range(0, len(self), batch_size):
+                yield self.rows(start, start + batch_size)
+            return
+        block_size = max(shuffle_buffer, batch_size)
+        block_starts = list(range(0, len(self), block_size))
+        rng.shuffle(block_starts)
+        leftover_inputs, leftover_targets = self.rows(0, 0)
+        for block_start in block_starts:
+            order = list(range(min(block_size, len(self) - block_start)))
+            rng.shuffle(order)
+            block_inputs, block_targets = self.rows(block_start, block_start + block_size)
+            inputs = np.concatenate((leftover_inputs, block_inputs[order]))
+            targets = np.concatenate((leftover_targets, block_targets[order]))
+            num_full = len(inputs) - len(inputs) % batch_size
+            for start in range(0, num_full, batch_size):
+                yield inputs[start:start + batch_size], targets[start:start + batch_size]
+            leftover_inputs, leftover_targets = inputs[num_full:], targets[num_full:]
+        if len(leftover_inputs) > 0:
+            yield leftover_inputs, leftover_targets
+
+class ColumnarExamples(ArrayDataset):
+    """
+    Examples read from the columns of a ColumnarDataset: the inputs are the columns named in inputs and the targets those in targets,
+    side by side with every categorical column one-hot encoded (see ColumnarDataset.matrix).
+    Only the rows of the minibatch or shuffle block being assembled are copied out of the mapping.
+    """
+
+    def __init__(self, dataset: ColumnarDataset, inputs: list[str], targets: list[str], dtype: str = "float64"):
+        self.dataset = dataset
+        self.input_names, self.target_names = inputs, targets
+        self.dtype = dtype
+        self.input_len, self.output_len = dataset.width(inputs), dataset.width(targets)
+
+    def __len__(self):
+        return len(self.dataset)
+
+    def rows(self, start: int, stop: int) -> Batch:
+        return self.dataset.matrix(self.input_names, start, stop, self.dtype), self.dataset.matrix(self.target_names, start, stop, self.dtype)
+
+def shuffled(examples: Iterable[Example], rng: Random, shuffle_buffer: int) -> Iterator[Example]:
+    """
+    Approximately shuffle a stream, holding at most shuffle_buffer examples: each incoming example replaces a random one in the buffer,
+    which is yielded.
+    """
+    buffer = []
+    for example in examples:
+        if len(buffer) < shuffle_buffer:
+            buffer.append(example)
+            continue
+        i = rng.randrange(shuffle_buffer)
+        yield buffer[i]
+        buffer[i] = example
+    rng.shuffle(buffer)
+    yield from buffer
+
+def stream_batches(examples: Iterable[Example], batch_size: int, rng: Random, shuffle_buffer: int = 0) -> Iterator[Batch]:
+    if shuffle_buffer > 0:
+        examples = shuffled(examples, rng, shuffle_buffer)
+    batch = []
+    for example in examples:
+        batch.append(example)
+        if len(batch) == batch_size:
+            yield [input_values for input_values, _ in batch], [target_outputs for _, target_outputs in batch]
+            batch = []
+    if batch != []:
+        yield [input_values for input_values, _ in batch], [target_outputs for _, target_outputs in batch]
+
+class Prefetcher:
+    """
+    Run an iterator in a background thread, keeping up to size items ready in a bounded queue,
+    so that reading and assembling minibatches overlaps with training. Errors are raised in the consuming thread.
+    """
+
+    def __init__(self, iterator: Iterator, size: int):
+        self.queue = Queue(size)
+        self.stopped = Event()
+        self.thread = Thread(target=self.fill, args=(iterator,), daemon=True)
+        self.thread.start()
+
+    def put(self, item: tuple[str, object]):
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except Full:
+                pass
+        return False
+
+    def fill(self, iterator: Iterator):
+        try:
+            for item in iterator:
+                if not self.put(("item", item)):
+                    return
+        except BaseException as error:
+            self.put(("error", error))
+            return
+        self.put(("done", None))
+
+    def __iter__(self):
+        while True:
+            kind, item = self.queue.get()
+            if kind == "done":
+                return
+            if kind == "error":
+                raise item
+            yield item
+
+    def close(self):
+        self.stopped.set()
+        self.thread.join()
+
+Schedule = Callable[[int], float]
+
+class StepDecay:
+    """
+    Multiply the learning rate by factor every every epochs.
+    """
+
+    def __init__(self, learning_rate: float, factor: float = 0.5, every: int = 100):
+        self.learning_rate, self.factor, self.every = learning_rate, factor, every
+
+    def __call__(self, epoch: int):
+        return self.learning_rate * self.factor ** (epoch // self.every)
+
+class ExponentialDecay:
+
+    def __init__(self, learning_rate: float, decay: float = 0.99):
+        self.learning_rate, self.decay = learning_rate, decay
+
+    def __call__(self, epoch: int):
+        return self.learning_rate * self.decay ** epoch
+
+class CosineDecay:
+    """
+    Anneal the learning rate to final_learning_rate over num_epochs epochs along half a cosine.
+    """
+
+    def __init__(self, learning_rate: float, num_epochs: int, final_learning_rate: float = 0.0):
+        self.learning_rate, self.num_epochs, self.final_learning_rate = learning_rate, num_epochs, final_learning_rate
+
+    def __call__(self, epoch: int):
+        progress = min(epoch, self.num_epochs) / self.num_epochs
+        return self.final_learning_rate + (self.learning_rate - self.final_learning_rate) * (1 + cos(pi * progress)) / 2
+
+class Optimizer:
+    """
+    Updates the parameters in place from the mean error gradient dE/dw of a minibatch.
+    learning_rate is a float or a schedule, a function from the epoch to the learning rate.
+    Per-parameter state is allocated on the first step, so one optimizer serves one Network.
+    STATE names the attributes holding that state, which Network checkpoints save and restore.
+    """
+
+    STATE: tuple[str, ...] = ()
+
+    def __init__(self, learning_rate: Union[float, Schedule]):
+        self.learning_rate = learning_rate
+
+    def state(self) -> dict[str, Union[int, float, np.ndarray, None]]:
+        return {name: getattr(self, name) for name in self.STATE}
+
+    def load_state(self, state: dict[str, Union[int, float, np.ndarray, None]]):
+        for name in self.STATE:
+            setattr(self, name, state[name])
+
+    @property
+    def started(self):
+        return any(isinstance(value, np.ndarray) for value in self.state().values())
+
+    def rate(self, epoch: int):
+        return self.learning_rate(epoch) if callable(self.learning_rate) else self.learning_rate
+
+    def step(self, parameters: np.ndarray, gradient: np.ndarray, epoch: int):
+        raise NotImplementedError
+
+class SGD(Optimizer):
+    """
+    Gradient descent, with classical or Nesterov momentum if momentum > 0.
+    """
+
+    STATE = ("velocity",)
+
+    def __init__(self, learning_rate: Union[float, Schedule], momentum: float = 0.0, nesterov: bool = False):
+        super().__init__(learning_rate)
+        self.momentum, self.nesterov = momentum, nesterov
+        self.velocity: Optional[np.ndarray] = None
+
+    def step(self, parameters: np.ndarray, gradient: np.ndarray, epoch: int):
+        rate = self.rate(epoch)
+        if self.momentum == 0:
+            parameters -= rate * gradient
+            return
+        if self.velocity is None:
+            self.velocity = np.zeros_like(parameters)
+        self.velocity *= self.momentum
+        self.velocity -= rate * gradient
+        if self.nesterov:
+            # look ahead along the updated velocity
+            parameters += self.momentum * self.velocity - rate * gradient
+        else:
+            parameters += self.velocity
+
+class RMSProp(Optimizer):
+
+    STATE = ("mean_square",)
+
+    def __init__(self, learning_rate: Union[float, Schedule] = 0.001, decay: float = 0.9, epsilon: float = 1e-8):
+        super().__init__(learning_rate)
+        self.decay, self.epsilon = decay, epsilon
+        self.mean_square: Optional[np.ndarray] = None
+
+    def step(self, parameters: np.ndarray, gradient: np.ndarray, epoch: int):
+        if self.mean_square is None:
+            self.mean_square = np.zeros_like(parameters)
+        self.mean_square *= self.decay
+        self.mean_square += (1 - self.decay) * gradient * gradient
+        parameters -= self.rate(epoch) * gradient / (np.sqrt(self.mean_square) + self.epsilon)
+
+class Adam(Optimizer):
+
+    STATE = ("num_steps", "mean", "mean_square")
+
+    def __init__(self, learning_rate: Union[float, Schedule] = 0.001, beta1: float = 0.9, beta2: float = 0.999, epsilon: float = 1e-8):
+        super().__init__(learning_rate)
+        self.beta1, self.beta2, self.epsilon = beta1, beta2, epsilon
+        self.num_steps = 0
+        self.mean: Optional[np.ndarray] = None
+        self.mean_square: Optional[np.ndarray] = None
+
+    def step(self, parameters: np.ndarray, gradient: np.ndarray, epoch: int):
+        if self.mean is None:
+            self.mean, self.mean_square = np.zeros_like(parameters), np.zeros_like(parameters)
+        self.num_steps += 1
+        self.mean *= self.beta1
+        self.mean += (1 - self.beta1) * gradient
+        self.mean_square *= self.beta2
+        self.mean_square += (1 - self.beta2) * gradient * gradient
+        # bias-corrected step
+        rate = self.rate(epoch) * sqrt(1 - self.beta2 ** self.num_steps) / (1 - self.beta1 ** self.num_steps)
+        parameters -= rate * self.mean / (np.sqrt(self.mean_square) + self.epsilon)
 
 class Network:
 
-    Function = Callable[[float], float]
-    # activation functions and their derivatives
+    Function = Callable[[np.ndarray], np.ndarray]
+    # activation functions and their derivatives, applied element-wise
     activation: dict[str, tuple[Function, Function]] = {
-        "sigmoid": (lambda x: 1 / (1 + exp(-x)), lambda o: o * (1 - o))
+        "sigmoid": (lambda x: 1 / (1 + np.exp(-x)), lambda o: o * (1 - o))
     }
-    random_weight = partial(uniform, -1, 1)
 
-    def __init__(self, input_len: int, hidden_len: int, output_len: int, activation_func_name: str):
+    # checkpoint layout: MAGIC, version and header length, a JSON header, padding to ALIGNMENT, then self.parameters
+    # followed by the arrays of the optimizer state listed in the header, each shaped like self.parameters
+    MAGIC = b"BPNN"
+    VERSION = 1
+    PREFIX = Struct("<4sII")
+    ALIGNMENT = 64
+
+    def __init__(
+        self, input_len: int, hidden_len: int, output_len: int, activation_func_name: str,
+        dtype: str = "float64", seed: Optional[int] = None, parameters: Optional[np.ndarray] = None
+    ):
+        """
+        All weights live in one contiguous dtype ("float32" or "float64") array self.parameters,
+        self.weights are views into it, and likewise self.gradients into self.gradient_buffer.
+        seed seeds self.rng, which draws the initial weights unless parameters are given.
+        """
         self.structure = (input_len, hidden_len, output_len)
+        self.activation_func_name = activation_func_name
         self.activate, self.derivative = Network.activation[activation_func_name]
-        self.weights = (
-            [[Network.random_weight() for _ in range(input_len + 1)] for _ in range(hidden_len)], # hidden weight
-            [[Network.random_weight() for _ in range(hidden_len + 1)] for _ in range(output_len)] # output weight
-        )
+        self.dtype = np.dtype(dtype)
+        self.rng = Random(seed)
+        self.epoch = 0
+        self.history: list[tuple[int, float, Optional[float]]] = []
+        num_parameters = Network.num_parameters(self.structure)
+        if parameters is None:
+            parameters = np.array([self.rng.uniform(-1, 1) for _ in range(num_parameters)], dtype=self.dtype)
+        assert parameters.shape == (num_parameters,) and parameters.dtype == self.dtype,\
+            f"Incompatible parameters. This Network expects {num_parameters} {self.dtype} values."
+        self.parameters = parameters
+        # row i holds the weights into unit i, the last column is the bias
+        self.weights = Network.layer_views(self.parameters, self.structure) # hidden weight, output weight
         self.inter_values = (
-            [0.0] * hidden_len + [1], # hidden o
-            [0.0] * output_len # output o
+            np.append(np.zeros(hidden_len, dtype=self.dtype), self.dtype.type(1)), # hidden o
+            np.zeros(output_len, dtype=self.dtype) # output o
         )
         self.deltas = (
-            [0.0] * hidden_len, # hidden delta
-            [0.0] * output_len # output delta
+            np.zeros((0, hidden_len), dtype=self.dtype), # hidden delta of every example in the last minibatch
+            np.zeros((0, output_len), dtype=self.dtype) # output delta of every example in the last minibatch
         )
-        self.gradients = (
-            [[0.0] * (input_len + 1) for _ in range(hidden_len)], # hidden gradient
-            [[0.0] * (hidden_len + 1) for _ in range(output_len)] # output gradient
+        self.gradient_buffer = np.zeros(num_parameters, dtype=self.dtype)
+        self.gradients = Network.layer_views(self.gradient_buffer, self.structure) # hidden gradient, output gradient
+
+    @staticmethod
+    def num_parameters(structure: tuple[int, int, int]):
+        input_len, hidden_len, output_len = structure
+        return hidden_len * (input_len + 1) + output_len * (hidden_len + 1)
+
+    @staticmethod
+    def layer_views(block: np.ndarray, structure: tuple[int, int, int]):
+        """
+        return
+            hidden and output weight-shaped views of a block of num_parameters values
+        """
+        input_len, hidden_len, output_len = structure
+        return (
+            block[:hidden_len * (input_len + 1)].reshape(hidden_len, input_len + 1),
+            block[hidden_len * (input_len + 1):].reshape(output_len, hidden_len + 1)
         )
 
+    @staticmethod
+    def batch_views(buffer, structure: tuple[int, int, int], dtype: str, batch_size: int):
+        """
+        return
+            inputs (with the bias column) and targets of a minibatch stored in buffer
+        """
+        input_len, hidden_len, output_len = structure
+        inputs = np.ndarray((batch_size, input_len + 1), dtype=dtype, buffer=buffer)
+        targets = np.ndarray((batch_size, output_len), dtype=dtype, buffer=buffer, offset=inputs.nbytes)
+        return inputs, targets
+
+    def __getstate__(self):
+        # the activation functions are lambdas, rebuilt from their name
+        state = self.__dict__.copy()
+        del state["activate"], state["derivative"]
+        return state
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+        self.activate, self.derivative = Network.activation[self.activation_func_name]
+        # unpickled arrays are separate copies, so the layer views must be taken again
+        self.weights = Network.layer_views(self.parameters, self.structure)
+        self.gradients = Network.layer_views(self.gradient_buffer, self.structure)
+
+    def use_parameters(self, parameters: np.ndarray):
+        self.parameters = parameters
+        self.weights = Network.layer_views(parameters, self.structure)
+
     def reset_gradients(self):
-        input_len, hidden_len, output_len = self.structure
-        for i in range(output_len):
-            for j in range(hidden_len + 1):
-                self.gradients[1][i][j] = 0
-        for i in range(hidden_len):
-            for j in range(input_len + 1):
-                self.gradients[0][i][j] = 0
+        self.gradient_buffer.fill(0)
+
+    def save(self, path: str):
+        """
+        Write a checkpoint: the structure, dtype, number of epochs learned, RNG state and the state of the optimizer
+        of the last learn in a JSON header, followed by the raw parameters and the optimizer's arrays.
+        The file is replaced atomically, so a crash never leaves a torn checkpoint.
+        """
+        optimizer = getattr(self, "optimizer", None)
+        state = {} if optimizer is None else optimizer.state()
+        arrays = [name for name, value in state.items() if isinstance(value, np.ndarray)]
+        header = json.dumps({
+            "structure": self.structure,
+            "activation": self.activation_func_name,
+            "dtype": self.dtype.str,
+            "epoch": self.epoch,
+            "rng_state": self.rng.getstate(),
+            "optimizer": None if optimizer is None else {
+                "class": type(optimizer).__name__,
+                "arrays": arrays,
+                "scalars": {name: value for name, value in state.items() if name not in arrays}
+            }
+        }).encode()
+        data_offset = -(-(Network.PREFIX.size + len(header)) // Network.ALIGNMENT) * Network.ALIGNMENT
+        with open(f"{path}.tmp", "wb") as file:
+            file.write(Network.PREFIX.pack(Network.MAGIC, Network.VERSION, len(header)))
+            file.write(header)
+            file.write(bytes(data_offset - Network.PREFIX.size - len(header)))
+            file.write(np.ascontiguousarray(self.parameters).tobytes())
+            for name in arrays:
+                file.write(np.ascontiguousarray(state[name], dtype=self.dtype).tobytes())
+        os.replace(f"{path}.tmp", path)
+
+    @classmethod
+    def load(cls, path: str, mmap_mode: str = "c") -> "Network":
+        """
+        Memory-map the parameters of a checkpoint instead of reading them.
+        mmap_mode is "r" for read-only serving, "c" (copy-on-write) to keep learning without touching the file,
+        or "r+" to learn in place.
+        The optimizer state is read into self.optimizer_state, and learn resumes from it when given a new optimizer of the same class.
+        """
+        with open(path, "rb") as file:
+            magic, version, header_len = Network.PREFIX.unpack(file.read(Network.PREFIX.size))
+            if magic != Network.MAGIC:
+                raise ValueError(f"{path} is not a Network checkpoint.")
+            if version != Network.VERSION:
+                raise ValueError(f"{path} has checkpoint version {version}, this code reads version {Network.VERSION}.")
+            header = json.loads(file.read(header_len))
+        data_offset = -(-(Network.PREFIX.size + header_len) // Network.ALIGNMENT) * Network.ALIGNMENT
+        structure = tuple(header["structure"])
+        parameters = np.memmap(path, dtype=header["dtype"], mode=mmap_mode, offset=data_offset, shape=(Network.num_parameters(structure),))
+        network = cls(*structure, header["activation"], np.dtype(header["dtype"]).name, parameters=parameters)
+        network.epoch = header["epoch"]
+        rng_version, state, gauss_next = header["rng_state"]
+        network.rng.setstate((rng_version, tuple(state), gauss_next))
+        optimizer = header["optimizer"]
+        if optimizer is not None:
+            num_parameters = len(parameters)
+            state = dict(optimizer["scalars"])
+            for i, name in enumerate(optimizer["arrays"], start=1):
+                offset = data_offset + i * num_parameters * network.dtype.itemsize
+                state[name] = np.fromfile(path, dtype=network.dtype, count=num_parameters, offset=offset)
+            network.optimizer_state = (optimizer["class"], state)
+        return network
 
     def calculate(self, input_values: list[float]):
         input_len, hidden_len, output_len = self.structure
         assert input_len == len(input_values),\
             f"Incompatible input length. This Network expects {input_len} input values but gets {len(input_values)}."
         # hidden layer
-        for i in range(hidden_len):
-            self.inter_values[0][i] = self.activate(sum(weight * value for weight, value in zip(self.weights[0][i], input_values + [1])))
+        self.inter_values[0][:-1] = self.activate(self.weights[0][:, :-1] @ np.asarray(input_values, dtype=self.dtype) + self.weights[0][:, -1])
         # output layer
-        for i in range(output_len):
-            self.inter_values[1][i] = self.activate(sum(weight * value for weight, value in zip(self.weights[1][i], self.inter_values[0])))
+        self.inter_values[1][:] = self.activate(self.weights[1] @ self.inter_values[0])
 
-    def learn(self, training_examples: list[tuple[list[float], list[float]]], batch_size: int, num_epochs: int, learning_rate: float):
-        input_len, hidden_len, output_len = self.structure
-        assert all(len(inputs) == input_len and len(outputs) == output_len for inputs, outputs in training_examples),\
-            f"Incompatible training examples. Make sure that every example has {input_len} input values and {output_len} output values."
-        for _ in tqdm(range(num_epochs)):
-            start, stop = 0, batch_size
-            step_examples = training_examples[start:stop]
-            while step_examples != []:
-                self.reset_gradients()
-                for input_values, target_outputs in step_examples:
-                    self.calculate(input_values)
-                    # output delta
-                    for i, (o, t) in enumerate(zip(self.inter_values[1], target_outputs)):
-                        self.deltas[1][i] = self.derivative(o) * (t - o)
-                    # hidden delta
-                    for i, o in enumerate(self.inter_values[0][:-1]):
-                        self.deltas[0][i] = self.derivative(o) * sum(self.weights[1][k][i] * self.deltas[1][k] for k in range(output_len))
-                    # update gradients
-                    for i in range(output_len):
-                        for j in range(hidden_len + 1):
-                            self.gradients[1][i][j] += self.deltas[1][i] * self.inter_values[0][j]
-                    for i in range(hidden_len):
-                        for j, x in enumerate(input_values + [1]):
-                            self.gradients[0][i][j] += self.deltas[0][i] * x
+    def forward(self, inputs: np.ndarray):
+        """
+        inputs: one example per row, with a trailing column of ones for the bias
+        return
+            hidden o with a trailing column of ones, output o
+        """
+        hidden = np.ones((len(inputs), self.structure[1] + 1), dtype=self.dtype)
+        hidden[:, :-1] = self.activate(inputs @ self.weights[0].T)
+        return hidden, self.activate(hidden @ self.weights[1].T)
+
+    def backward(self, inputs: np.ndarray, hidden: np.ndarray, outputs: np.ndarray, targets: np.ndarray):
+        """
+        Sum the gradients of the examples in a minibatch into self.gradients.
+        Like the delta rule, self.gradients hold -dE/dw, the direction that decreases the error.
+        return
+            loss: float, the summed error 1/2 sum (t - o)^2 of the minibatch
+        """
+        errors = targets - outputs
+        # output delta
+        output_delta = self.derivative(outputs) * errors
+        # hidden delta
+        hidden_delta = self.derivative(hidden[:, :-1]) * (output_delta @ self.weights[1][:, :-1])
+        # update gradients
+        np.matmul(output_delta.T, hidden, out=self.gradients[1])
+        np.matmul(hidden_delta.T, inputs, out=self.gradients[0])
+        self.deltas = (hidden_delta, output_delta)
+        return float(np.vdot(errors, errors)) / 2
+
+    def learn(
+        self, training_data: Union[list[Example], Iterable[Example], ArrayDataset], batch_size: int, num_epochs: int,
+        learning_rate: Union[float, Optimizer], processes: int = 1, checkpoint_path: Optional[str] = None, checkpoint_every: int = 1,
+        shuffle_buffer: int = 0, prefetch: int = 2, validation_data: Union[list[Example], ArrayDataset, None] = None,
+        patience: Optional[int] = None, min_delta: float = 0.0, target_loss: Optional[float] = None, restore_best: bool = True,
+        instrumentation: Optional[Instrumentation] = None
+    ):
+        """
+        training_data is a list of (input values, target outputs), a re-iterable stream of them (read once per epoch),
+        or a dataset object with a batches method such as an ArrayDataset over memory-mapped .npy files
+        or ColumnarExamples over a ColumnarDataset.
+        shuffle_buffer > 0 shuffles the examples of every epoch within a buffer of that many examples (see ArrayDataset.batches and shuffled).
+        Minibatches are read and assembled by a background thread up to prefetch batches ahead, prefetch=0 assembles them inline.
+
+        learning_rate is the step size of plain gradient descent or an Optimizer such as Adam, which keeps its state across calls.
+
+        Learning stops before num_epochs once the monitored loss, the mean 1/2 sum (t - o)^2 of validation_data if given
+        or else of the training examples seen during the epoch, reaches target_loss, or has not improved by more than min_delta for patience epochs.
+        On stopping for patience with validation_data, restore_best puts back the weights with the lowest validation loss.
+        self.history records (epoch, training loss, validation loss or None) for every epoch.
+
+        processes > 1 trains data-parallel: the weights and the current minibatch live in shared memory,
+        every worker sums the gradients of one shard of the minibatch into its own shared slot,
+        and the slots are added up before the weight update. Up to floating-point rounding,
+        this gives the same weights as serial training from the same initial weights.
+
+        With checkpoint_path, a checkpoint is saved every checkpoint_every epochs. self.epoch counts the epochs learned so far,
+        so a run of N epochs resumes with Network.load(checkpoint_path).learn(..., num_epochs=N - network.epoch, ...),
+        which continues from the saved momentum or moments when learning_rate is a new optimizer of the same class.
+
+        instrumentation (kept in self.instrumentation) times the input, forward, backward, update, all_reduce, validation and checkpoint phases,
+        counts examples and steps, and passes epoch and step events to its callbacks. Learning is silent without them.
+        """
+        optimizer = learning_rate if isinstance(learning_rate, Optimizer) else SGD(learning_rate)
+        # resuming from a checkpoint: a new optimizer of the saved class continues from the saved state
+        saved = getattr(self, "optimizer_state", None)
+        if saved is not None and saved[0] == type(optimizer).__name__ and not optimizer.started:
+            optimizer.load_state(saved[1])
+            self.optimizer_state = None
+        self.optimizer = optimizer
+        if isinstance(validation_data, list):
+            validation_data = ArrayDataset.from_examples(validation_data, self.dtype.name)
+        # a list is already in memory, so its minibatches are assembled once and, unless shuffled, reused every epoch
+        in_memory = isinstance(training_data, list)
+        if in_memory:
+            training_data = ArrayDataset.from_examples(training_data, self.dtype.name)
+            prefetch = 0
+        elif not hasattr(training_data, "batches") and num_epochs > 1 and iter(training_data) is training_data:
+            raise ValueError("An iterator can only be read for one epoch. Pass a re-iterable object, e.g. one whose __iter__ reopens the file.")
+        batches = self.epoch_batches(training_data, batch_size, num_epochs, shuffle_buffer, reuse=in_memory and shuffle_buffer <= 0)
+        if prefetch > 0:
+            batches = Prefetcher(batches, prefetch)
+        if processes > 1:
+            self.start_workers(batch_size, processes)
+        instrumentation = self.instrumentation = instrumentation or Instrumentation()
+        instrumentation.begin("Network")
+        input_phase, forward_phase, backward_phase, update_phase = (instrumentation.phase(name) for name in ("input", "forward", "backward", "update"))
+        gradient = np.empty_like(self.gradient_buffer)
+        epoch_loss, epoch_examples = 0.0, 0
+        best_loss, best_epoch, best_parameters = float("inf"), self.epoch, None
+        try:
+            iterator = iter(batches)
+            while True:
+                with input_phase:
+                    step_inputs, step_targets = next(iterator, (None, None))
+                if step_inputs is None:
+                    break
+                if step_targets is None:
+                    # end of an epoch, step_inputs is the state of the shuffling RNG after it
+                    self.rng.setstate(step_inputs)
+                    self.epoch += 1
+                    training_loss = epoch_loss / max(epoch_examples, 1)
+                    validation_loss = None
+                    if validation_data is not None:
+                        with instrumentation.phase("validation"):
+                            validation_loss = self.loss(validation_data)
+                    self.history.append((self.epoch, training_loss, validation_loss))
+                    instrumentation.epoch("Network", self.epoch, training_loss=training_loss, validation_loss=validation_loss)
+                    epoch_loss, epoch_examples = 0.0, 0
+                    if checkpoint_path is not None and self.epoch % checkpoint_every == 0:
+                        with instrumentation.phase("checkpoint"):
+                            self.save(checkpoint_path)
+                    loss = training_loss if validation_loss is None else validation_loss
+                    if target_loss is not None and loss <= target_loss:
+                        break
+                    if loss < best_loss - min_delta:
+                        best_loss, best_epoch = loss, self.epoch
+                        if validation_data is not None and restore_best and patience is not None:
+                            best_parameters = self.parameters.copy()
+                    elif patience is not None and self.epoch - best_epoch >= patience:
+                        if best_parameters is not None:
+                            self.parameters[...] = best_parameters
+                        break
+                    continue
+                if processes > 1:
+                    with instrumentation.phase("all_reduce"):
+                        step_loss = self.all_reduce_gradients(step_inputs, step_targets)
+                else:
+                    with forward_phase:
+                        hidden, outputs = self.forward(step_inputs)
+                    with backward_phase:
+                        step_loss = self.backward(step_inputs, hidden, outputs, step_targets)
+                epoch_loss += step_loss
+                epoch_examples += len(step_inputs)
                 # update weights
-                num_examples = len(step_examples)
-                for i in range(output_len):
-                    for j in range(hidden_len + 1):
-                        self.weights[1][i][j] += learning_rate * (self.gradients[1][i][j] / num_examples)
-                for i in range(hidden_len):
-                    for j in range(input_len + 1):
-                        self.weights[0][i][j] += learning_rate * (self.gradients[0][i][j] / num_examples)
-                start, stop = stop, stop + batch_size
-                step_examples = training_examples[start:stop]
+                with update_phase:
+                    np.multiply(self.gradient_buffer, -1 / len(step_inputs), out=gradient)
+                    optimizer.step(self.parameters, gradient, self.epoch)
+                instrumentation.count("examples", len(step_inputs))
+                instrumentation.count("steps")
+                if instrumentation.callbacks:
+                    instrumentation.step("Network", instrumentation.metrics.counts["steps"], loss=step_loss / len(step_inputs), batch_size=len(step_inputs))
+        finally:
+            if prefetch > 0:
+                batches.close()
+            if processes > 1:
+                self.stop_workers()
+            instrumentation.end("Network")
+
+    def loss(self, data: Union[list[Example], ArrayDataset], batch_size: int = 1024):
+        """
+        return
+            mean error 1/2 sum (t - o)^2 over the examples of data
+        """
+        if isinstance(data, list):
+            data = ArrayDataset.from_examples(data, self.dtype.name)
+        total = 0.0
+        for start in range(0, len(data), batch_size):
+            inputs, targets = data.rows(start, start + batch_size)
+            errors = np.asarray(targets, dtype=self.dtype) - self.predict_many(inputs)
+            total += float(np.vdot(errors, errors)) / 2
+        return total / len(data)
+
+    def epoch_batches(
+        self, training_data: Union[Iterable[Example], ArrayDataset], batch_size: int, num_epochs: int, shuffle_buffer: int, reuse: bool = False
+    ):
+        """
+        Minibatches of inputs (with the bias column) and targets in self.dtype, followed by (RNG state, None) at the end of every epoch.
+        Uses its own copy of self.rng, as it may run ahead in the prefetch thread. reuse keeps the minibatches of the first epoch for the others.
+        """
+        input_len, hidden_len, output_len = self.structure
+        rng = Random()
+        rng.setstate(self.rng.getstate())
+        if reuse:
+            epoch = list(self.epoch_batches(training_data, batch_size, 1, shuffle_buffer))
+            for _ in range(num_epochs):
+                yield from epoch
+            return
+        for _ in range(num_epochs):
+            if hasattr(training_data, "batches"):
+                epoch = training_data.batches(batch_size, rng, shuffle_buffer)
+            else:
+                epoch = stream_batches(training_data, batch_size, rng, shuffle_buffer)
+            for input_batch, target_batch in epoch:
+                targets = np.array(target_batch, dtype=self.dtype)
+                assert targets.shape[1:] == (output_len,) and np.shape(input_batch) == (len(targets), input_len),\
+                    f"Incompatible training examples. Make sure that every example has {input_len} input values and {output_len} output values."
+                inputs = np.ones((len(targets), input_len + 1), dtype=self.dtype)
+                inputs[:, :-1] = input_batch
+                yield inputs, targets
+            yield rng.getstate(), None
+
+    def start_workers(self, batch_size: int, processes: int):
+        num_parameters = Network.num_parameters(self.structure)
+        input_len, hidden_len, output_len = self.structure
+        itemsize = self.dtype.itemsize
+        self.shared_memory = [
+            SharedMemory(create=True, size=num_parameters * itemsize), # weights
+            SharedMemory(create=True, size=batch_size * (input_len + 1 + output_len) * itemsize), # minibatch
+            SharedMemory(create=True, size=processes * num_parameters * itemsize) # one gradient slot per shard
+        ]
+        shared_parameters = np.ndarray(num_parameters, dtype=self.dtype, buffer=self.shared_memory[0].buf)
+        shared_parameters[...] = self.parameters
+        # learn in shared memory, stop_workers writes the result back to the original parameters
+        self.local_parameters = self.parameters
+        self.use_parameters(shared_parameters)
+        self.shared_batch = Network.batch_views(self.shared_memory[1].buf, self.structure, self.dtype.name, batch_size)
+        self.gradient_slots = np.ndarray((processes, num_parameters), dtype=self.dtype, buffer=self.shared_memory[2].buf)
+        self.pool = ProcessPoolExecutor(
+            processes, initializer=init_worker,
+            initargs=(self.structure, self.activation_func_name, self.dtype.name, batch_size, processes, self.shared_memory)
+        )
+
+    def all_reduce_gradients(self, step_inputs: np.ndarray, step_targets: np.ndarray):
+        num_examples = len(step_inputs)
+        shared_inputs, shared_targets = self.shared_batch
+        shared_inputs[:num_examples], shared_targets[:num_examples] = step_inputs, step_targets
+        bounds = np.linspace(0, num_examples, len(self.gradient_slots) + 1).astype(int)
+        shards = [(shard, start, stop) for shard, (start, stop) in enumerate(zip(bounds[:-1], bounds[1:])) if start < stop]
+        loss = sum(task.result() for task in [self.pool.submit(compute_shard_gradients, *shard) for shard in shards])
+        np.sum(self.gradient_slots[:len(shards)], axis=0, out=self.gradient_buffer)
+        return loss
+
+    def stop_workers(self):
+        self.pool.shutdown()
+        self.local_parameters[...] = self.parameters
+        self.use_parameters(self.local_parameters)
+        del self.pool, self.shared_batch, self.gradient_slots, self.local_parameters
+        for shared_memory in self.shared_memory:
+            shared_memory.close()
+            shared_memory.unlink()
+        del self.shared_memory
 
     def predict(self, input_values: list[float]):
+        """
+        Also leaves the hidden and output values of this input in self.inter_values, use predict_many from several threads.
+        """
         self.calculate(input_values)
-        return self.inter_values[1]
+        return self.inter_values[1].copy()
+
+    def predict_many(self, inputs: Union[np.ndarray, list[list[float]]], out: Optional[np.ndarray] = None):
+        """
+        Outputs for a batch of inputs, one per row. Only reads the weights and keeps its scratch space local to the call,
+        so one Network can serve many threads at once (NumPy releases the GIL during the matrix products) as long as it is not learning.
+        Pass out, of shape (len(inputs), output_len), to reuse an output buffer instead of allocating one.
+        """
+        input_len, hidden_len, output_len = self.structure
+        inputs = np.asarray(inputs, dtype=self.weights[0].dtype)
+        assert inputs.ndim == 2 and inputs.shape[1] == input_len,\
+            f"Incompatible inputs. This Network expects a batch of rows with {input_len} input values but gets shape {inputs.shape}."
+        if out is None:
+            out = np.empty((len(inputs), output_len), dtype=self.weights[1].dtype)
+        hidden = self.activate(inputs @ self.weights[0][:, :-1].T + self.weights[0][:, -1])
+        np.matmul(hidden, self.weights[1][:, :-1].T, out=out)
+        out += self.weights[1][:, -1]
+        out[...] = self.activate(out)
+        return out
 
 if __name__ == "__main__":
 
+    from tempfile import TemporaryDirectory
+    from Instrumentation.Callbacks import ProgressLogger
+
     print("XOR")
     XOR = [
         ([1.0,1.0],[0.0]),
@@ -101,16 +777,23 @@ if __name__ == "__main__":
         ([0.0,1.0],[1.0]),
         ([0.0,0.0],[0.0])
     ]
-    network = Network(2, 2, 1, "sigmoid")
-    network.learn(XOR, batch_size=4, num_epochs=10000, learning_rate=10)
+    network = Network(2, 2, 1, "sigmoid", seed=0)
+    network.learn(XOR, batch_size=4, num_epochs=2000, learning_rate=Adam(0.05), target_loss=0.001, instrumentation=Instrumentation([ProgressLogger(interval=1.0)]))
+    print(f"Reached loss {network.history[-1][1]:.4f} after {network.epoch} epochs")
     prediction = [1 if x > 0.5 else 0 for x in network.predict([1,1])]
-    print(f"1 XOR 1 -> {[round(x, 2) for x in network.inter_values[0][:-1]]} -> {prediction}")
+    print(f"1 XOR 1 -> {network.inter_values[0][:-1].round(2).tolist()} -> {prediction}")
     prediction = [1 if x > 0.5 else 0 for x in network.predict([1,0])]
-    print(f"1 XOR 0 -> {[round(x, 2) for x in network.inter_values[0][:-1]]} -> {prediction}")
+    print(f"1 XOR 0 -> {network.inter_values[0][:-1].round(2).tolist()} -> {prediction}")
     prediction = [1 if x > 0.5 else 0 for x in network.predict([0,1])]
-    print(f"0 XOR 1 -> {[round(x, 2) for x in network.inter_values[0][:-1]]} -> {prediction}")
+    print(f"0 XOR 1 -> {network.inter_values[0][:-1].round(2).tolist()} -> {prediction}")
     prediction = [1 if x > 0.5 else 0 for x in network.predict([0,0])]
-    print(f"0 XOR 0 -> {[round(x, 2) for x in network.inter_values[0][:-1]]} -> {prediction}")
+    print(f"0 XOR 0 -> {network.inter_values[0][:-1].round(2).tolist()} -> {prediction}")
+    print(f"Batch: {[[1 if x > 0.5 else 0 for x in outputs] for outputs in network.predict_many([inputs for inputs, _ in XOR])]}")
+    with TemporaryDirectory() as directory:
+        network.save(os.path.join(directory, "xor.bpnn"))
+        loaded_network = Network.load(os.path.join(directory, "xor.bpnn"), mmap_mode="r")
+        print(f"Loaded after {loaded_network.epoch} epochs: {[[1 if x > 0.5 else 0 for x in outputs] for outputs in loaded_network.predict_many([inputs for inputs, _ in XOR])]}")
+        del loaded_network
 
     print("8-BIT IDENTITY")
     IDENTITY = [
@@ -123,21 +806,22 @@ if __name__ == "__main__":
         ([0, 0, 0, 0, 0, 0, 1.0, 0], [0, 0, 0, 0, 0, 0, 1.0, 0]),
         ([0, 0, 0, 0, 0, 0, 0, 1.0], [0, 0, 0, 0, 0, 0, 0, 1.0]),
     ]
-    network = Network(8, 2, 8, "sigmoid")
-    network.learn(IDENTITY, batch_size=8, num_epochs=10000, learning_rate=10)
+    network = Network(8, 2, 8, "sigmoid", seed=0)
+    network.learn(IDENTITY, batch_size=8, num_epochs=5000, learning_rate=RMSProp(0.05), target_loss=0.001)
+    print(f"Reached loss {network.history[-1][1]:.4f} after {network.epoch} epochs")
     prediction = [1 if x > 0.5 else 0 for x in network.predict([1.0, 0, 0, 0, 0, 0, 0, 0])]
-    print(f"1 -> {[round(x, 2) for x in network.inter_values[0][:-1]]} -> {prediction}")
+    print(f"1 -> {network.inter_values[0][:-1].round(2).tolist()} -> {prediction}")
     prediction = [1 if x > 0.5 else 0 for x in network.predict([0, 1.0, 0, 0, 0, 0, 0, 0])]
-    print(f"2 -> {[round(x, 2) for x in network.inter_values[0][:-1]]} -> {prediction}")
+    print(f"2 -> {network.inter_values[0][:-1].round(2).tolist()} -> {prediction}")
     prediction = [1 if x > 0.5 else 0 for x in network.predict([0, 0, 1.0, 0, 0, 0, 0, 0])]
-    print(f"3 -> {[round(x, 2) for x in network.inter_values[0][:-1]]} -> {prediction}")
+    print(f"3 -> {network.inter_values[0][:-1].round(2).tolist()} -> {prediction}")
     prediction = [1 if x > 0.5 else 0 for x in network.predict([0, 0, 0, 1.0, 0, 0, 0, 0])]
-    print(f"4 -> {[round(x, 2) for x in network.inter_values[0][:-1]]} -> {prediction}")
+    print(f"4 -> {network.inter_values[0][:-1].round(2).tolist()} -> {prediction}")
     prediction = [1 if x > 0.5 else 0 for x in network.predict([0, 0, 0, 0, 1.0, 0, 0, 0])]
-    print(f"5 -> {[round(x, 2) for x in network.inter_values[0][:-1]]} -> {prediction}")
+    print(f"5 -> {network.inter_values[0][:-1].round(2).tolist()} -> {prediction}")
     prediction = [1 if x > 0.5 else 0 for x in network.predict([0, 0, 0, 0, 0, 1.0, 0, 0])]
-    print(f"6 -> {[round(x, 2) for x in network.inter_values[0][:-1]]} -> {prediction}")
+    print(f"6 -> {network.inter_values[0][:-1].round(2).tolist()} -> {prediction}")
     prediction = [1 if x > 0.5 else 0 for x in network.predict([0, 0, 0, 0, 0, 0, 1.0, 0])]
-    print(f"7 -> {[round(x, 2) for x in network.inter_values[0][:-1]]} -> {prediction}")
+    print(f"7 -> {network.inter_values[0][:-1].round(2).tolist()} -> {prediction}")
     prediction = [1 if x > 0.5 else 0 for x in network.predict([0, 0, 0, 0, 0, 0, 0, 1.0])]
-    print(f"8 -> {[round(x, 2) for x in network.inter_values[0][:-1]]} -> {prediction}")
+    print(f"8 -> {network.inter_values[0][:-1].round(2).tolist()} -> {prediction}")
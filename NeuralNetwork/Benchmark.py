@@ -0,0 +1,161 @@
+"""
+Compare the vectorized Network.learn with the original per-element loop implementation,
+data-parallel training with serial training, float32 parameters with float64,
+training from memory-mapped files with training from a list,
+the epochs and time optimizers need to reach a target loss,
+and the speed, size and drift of quantized inference.
+Run from the repository root: python -m NeuralNetwork.Benchmark
+"""
+from math import exp
+from os import cpu_count
+from random import seed, uniform
+from statistics import median
+from tempfile import TemporaryDirectory
+from time import perf_counter
+import os
+import numpy as np
+from NeuralNetwork.BackPropagation import Adam, ArrayDataset, Network, RMSProp, SGD
+from NeuralNetwork.Quantization import QuantizedNetwork
+
+def loop_learn(weights: tuple[list[list[float]], list[list[float]]], training_examples: list[tuple[list[float], list[float]]], batch_size: int, num_epochs: int, learning_rate: float):
+    """
+    The loop implementation Network.learn replaced, kept as the reference for equivalence and speed.
+    """
+    activate, derivative = lambda x: 1 / (1 + exp(-x)), lambda o: o * (1 - o)
+    hidden_len, output_len = len(weights[0]), len(weights[1])
+    input_len = len(weights[0][0]) - 1
+    inter_values = ([0.0] * hidden_len + [1], [0.0] * output_len)
+    deltas = ([0.0] * hidden_len, [0.0] * output_len)
+    for _ in range(num_epochs):
+        start, stop = 0, batch_size
+        step_examples = training_examples[start:stop]
+        while step_examples != []:
+            gradients = ([[0.0] * (input_len + 1) for _ in range(hidden_len)], [[0.0] * (hidden_len + 1) for _ in range(output_len)])
+            for input_values, target_outputs in step_examples:
+                for i in range(hidden_len):
+                    inter_values[0][i] = activate(sum(weight * value for weight, value in zip(weights[0][i], input_values + [1])))
+                for i in range(output_len):
+                    inter_values[1][i] = activate(sum(weight * value for weight, value in zip(weights[1][i], inter_values[0])))
+                for i, (o, t) in enumerate(zip(inter_values[1], target_outputs)):
+                    deltas[1][i] = derivative(o) * (t - o)
+                for i, o in enumerate(inter_values[0][:-1]):
+                    deltas[0][i] = derivative(o) * sum(weights[1][k][i] * deltas[1][k] for k in range(output_len))
+                for i in range(output_len):
+                    for j in range(hidden_len + 1):
+                        gradients[1][i][j] += deltas[1][i] * inter_values[0][j]
+                for i in range(hidden_len):
+                    for j, x in enumerate(input_values + [1]):
+                        gradients[0][i][j] += deltas[0][i] * x
+            num_examples = len(step_examples)
+            for layer in (1, 0):
+                for i, row in enumerate(weights[layer]):
+                    for j in range(len(row)):
+                        row[j] += learning_rate * (gradients[layer][i][j] / num_examples)
+            start, stop = stop, stop + batch_size
+            step_examples = training_examples[start:stop]
+
+def benchmark(name: str, structure: tuple[int, int, int], training_examples: list[tuple[list[float], list[float]]], batch_size: int, num_epochs: int, learning_rate: float):
+    network = Network(*structure, "sigmoid", seed=0)
+    reference_weights = tuple(weight.tolist() for weight in network.weights)
+    start = perf_counter()
+    loop_learn(reference_weights, training_examples, batch_size, num_epochs, learning_rate)
+    loop_time = perf_counter() - start
+    start = perf_counter()
+    network.learn(training_examples, batch_size, num_epochs, learning_rate)
+    vectorized_time = perf_counter() - start
+    difference = max(np.abs(weight - np.array(reference)).max() for weight, reference in zip(network.weights, reference_weights))
+    print(f"{name}: loop {loop_time:.3f}s, vectorized {vectorized_time:.3f}s, speedup {loop_time / vectorized_time:.1f}x, max weight difference {difference:.2e}")
+
+def benchmark_processes(structure: tuple[int, int, int], training_examples: list[tuple[list[float], list[float]]], batch_size: int, num_epochs: int, learning_rate: float):
+    serial_network = Network(*structure, "sigmoid", seed=0)
+    start = perf_counter()
+    serial_network.learn(training_examples, batch_size, num_epochs, learning_rate)
+    serial_time = perf_counter() - start
+    print(f"{structure} serial: {len(training_examples) * num_epochs / serial_time:.0f} examples/s")
+    for processes in sorted({2, 4, cpu_count() or 1} - {1}):
+        network = Network(*structure, "sigmoid", seed=0)
+        start = perf_counter()
+        network.learn(training_examples, batch_size, num_epochs, learning_rate, processes=processes)
+        elapsed = perf_counter() - start
+        difference = max(np.abs(weight - serial_weight).max() for weight, serial_weight in zip(network.weights, serial_network.weights))
+        print(f"{structure} {processes} processes: {len(training_examples) * num_epochs / elapsed:.0f} examples/s, max weight difference {difference:.2e}")
+    network = Network(*structure, "sigmoid", "float32", seed=0)
+    start = perf_counter()
+    network.learn(training_examples, batch_size, num_epochs, learning_rate)
+    elapsed = perf_counter() - start
+    difference = max(np.abs(weight - serial_weight).max() for weight, serial_weight in zip(network.weights, serial_network.weights))
+    print(f"{structure} float32: {len(training_examples) * num_epochs / elapsed:.0f} examples/s, {network.parameters.nbytes} parameter bytes (float64 {serial_network.parameters.nbytes}), max weight difference {difference:.2e}")
+
+def benchmark_streaming(structure: tuple[int, int, int], training_examples: list[tuple[list[float], list[float]]], batch_size: int, num_epochs: int, learning_rate: float):
+    input_len, hidden_len, output_len = structure
+    with TemporaryDirectory() as directory:
+        inputs_path, targets_path = os.path.join(directory, "inputs.npy"), os.path.join(directory, "targets.npy")
+        ArrayDataset.write(training_examples, len(training_examples), input_len, output_len, inputs_path, targets_path)
+        dataset = ArrayDataset.open(inputs_path, targets_path)
+        for name, training_data, options in (
+            ("in-memory list", training_examples, {}),
+            ("memory-mapped, inline", dataset, {"prefetch": 0}),
+            ("memory-mapped, prefetched", dataset, {}),
+            ("memory-mapped, shuffled and prefetched", dataset, {"shuffle_buffer": 4 * batch_size})
+        ):
+            network = Network(*structure, "sigmoid", seed=0)
+            start = perf_counter()
+            network.learn(training_data, batch_size, num_epochs, learning_rate, **options)
+            elapsed = perf_counter() - start
+            print(f"{structure} {name}: {len(training_examples) * num_epochs / elapsed:.0f} examples/s")
+        del dataset
+
+def benchmark_convergence(name: str, structure: tuple[int, int, int], training_examples: list[tuple[list[float], list[float]]], target_loss: float, max_epochs: int, seeds: range = range(10)):
+    optimizers = {
+        "SGD 10": lambda: 10,
+        "momentum 2": lambda: SGD(2, momentum=0.9),
+        "Nesterov 2": lambda: SGD(2, momentum=0.9, nesterov=True),
+        "RMSProp 0.05": lambda: RMSProp(0.05),
+        "Adam 0.05": lambda: Adam(0.05),
+        "Adam 0.1": lambda: Adam(0.1)
+    }
+    for optimizer_name, make_optimizer in optimizers.items():
+        epochs = []
+        start = perf_counter()
+        for seed in seeds:
+            network = Network(*structure, "sigmoid", seed=seed)
+            network.learn(training_examples, len(training_examples), max_epochs, make_optimizer(), target_loss=target_loss)
+            if network.history[-1][1] <= target_loss:
+                epochs.append(network.epoch)
+        elapsed = perf_counter() - start
+        print(f"{name} {optimizer_name}: reached loss {target_loss} in {len(epochs)}/{len(seeds)} runs, median {median(epochs) if epochs else '-'} epochs, {elapsed / len(seeds):.3f}s per run")
+
+def benchmark_quantization(structure: tuple[int, int, int], training_examples: list[tuple[list[float], list[float]]], held_out: list[tuple[list[float], list[float]]], batch_size: int, num_epochs: int, learning_rate: float):
+    network = Network(*structure, "sigmoid", seed=0)
+    network.learn(training_examples, batch_size, num_epochs, learning_rate)
+    inputs = np.array([input_values for input_values, _ in held_out])
+    models = {"float64": network, "float32": Network(*structure, "sigmoid", "float32", parameters=network.parameters.astype(np.float32))}
+    models.update({f"int{bits}": QuantizedNetwork(network, bits) for bits in (8, 16)})
+    for name, model in models.items():
+        start = perf_counter()
+        for _ in range(10):
+            model.predict_many(inputs)
+        elapsed = (perf_counter() - start) / 10
+        rows = inputs[:200].tolist()
+        start = perf_counter()
+        for row in rows:
+            model.predict(row)
+        latency = (perf_counter() - start) / len(rows)
+        nbytes = model.parameters.nbytes if isinstance(model, Network) else model.nbytes
+        drift = model.drift(network, held_out) if isinstance(model, QuantizedNetwork) else {}
+        print(f"{structure} {name}: {len(inputs) / elapsed:.0f} predictions/s, {latency * 1e6:.0f}us per single prediction, {nbytes} bytes{', ' if drift else ''}{', '.join(f'{key} {value:.4g}' for key, value in drift.items())}")
+
+if __name__ == "__main__":
+    seed(0)
+    XOR = [([1.0, 1.0], [0.0]), ([1.0, 0.0], [1.0]), ([0.0, 1.0], [1.0]), ([0.0, 0.0], [0.0])]
+    benchmark("XOR 2-2-1", (2, 2, 1), XOR, 4, 2000, 10)
+    IDENTITY = [([1.0 if i == j else 0.0 for j in range(8)], [1.0 if i == j else 0.0 for j in range(8)]) for i in range(8)]
+    benchmark("8-bit identity 8-2-8", (8, 2, 8), IDENTITY, 8, 1000, 10)
+    RANDOM = [([uniform(0, 1) for _ in range(64)], [float(i % 10 == j) for j in range(10)]) for i in range(1000)]
+    benchmark("random 64-32-10", (64, 32, 10), RANDOM, 100, 5, 0.5)
+    WIDE = [([uniform(0, 1) for _ in range(256)], [float(i % 10 == j) for j in range(10)]) for i in range(20000)]
+    benchmark_processes((256, 512, 10), WIDE, 5000, 2, 0.5)
+    benchmark_streaming((256, 512, 10), WIDE, 500, 2, 0.5)
+    benchmark_quantization((256, 512, 10), WIDE[:15000], WIDE[15000:], 100, 2, 0.5)
+    benchmark_convergence("XOR 2-2-1", (2, 2, 1), XOR, 0.01, 10000)
+    benchmark_convergence("8-bit identity 8-2-8", (8, 2, 8), IDENTITY, 0.01, 10000)
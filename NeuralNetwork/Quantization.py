@@ -0,0 +1,129 @@
+"""
+Run from the repository root: python -m NeuralNetwork.Quantization
+"""
+from typing import Optional, Union
+import numpy as np
+from NeuralNetwork.BackPropagation import ArrayDataset, Example, Network
+
+class QuantizedNetwork:
+    """
+    Post-training quantization of a Network for inference.
+    Every row of weights (the weights into one unit) is stored as int8 or int16 codes with its own float32 scale,
+    max |w| / the largest code, so a unit with small weights keeps its precision. Biases stay float32.
+    The activation is read from a lookup table over [-table_range, table_range] instead of being computed.
+
+    NumPy has no BLAS kernel for integer matrix products (they run tens of times slower), so every call widens the codes of a layer
+    to a temporary float32 matrix, which represents them exactly, and multiplies in float32. Nothing else is kept:
+    the model held in memory (nbytes) is about 8 (int8) or 4 (int16) times smaller than float64. The price is speed, the widening
+    makes a single prediction slower than with the float Network, and batches about as fast.
+    """
+
+    # lookup tables by (activation, table_size, table_range), shared by every QuantizedNetwork
+    tables: dict[tuple[str, int, float], np.ndarray] = {}
+
+    def __init__(self, network: Network, bits: int = 8, table_size: int = 4096, table_range: float = 16.0):
+        assert bits in (8, 16), "Quantization supports 8 or 16 bits."
+        self.structure = network.structure
+        self.bits = bits
+        code_type = np.int8 if bits == 8 else np.int16
+        max_code = np.iinfo(code_type).max
+        self.codes: list[np.ndarray] = []
+        self.scales: list[np.ndarray] = []
+        self.biases: list[np.ndarray] = []
+        for weight in network.weights:
+            weight = np.asarray(weight, dtype=np.float64)
+            scale = np.abs(weight[:, :-1]).max(axis=1) / max_code
+            scale[scale == 0] = 1
+            self.codes.append(np.round(weight[:, :-1] / scale[:, None]).astype(code_type))
+            self.scales.append(scale.astype(np.float32))
+            self.biases.append(weight[:, -1].astype(np.float32))
+        # activation lookup table, sampled at table_size evenly spaced points
+        self.table_range = table_range
+        self.table_step = 2 * table_range / (table_size - 1)
+        key = (network.activation_func_name, table_size, table_range)
+        if key not in QuantizedNetwork.tables:
+            activate = Network.activation[network.activation_func_name][0]
+            QuantizedNetwork.tables[key] = activate(np.linspace(-table_range, table_range, table_size)).astype(np.float32)
+        self.table = QuantizedNetwork.tables[key]
+
+    @property
+    def nbytes(self):
+        """
+        return
+            bytes of every array this object holds: codes, scales, biases and the lookup table (shared by the QuantizedNetworks of one activation)
+        """
+        return sum(array.nbytes for arrays in (self.codes, self.scales, self.biases, [self.table]) for array in arrays)
+
+    def activate(self, x: np.ndarray):
+        """
+        Nearest table entry, inputs beyond table_range take the value at the end of the table.
+        """
+        index = x * np.float32(1 / self.table_step)
+        index += np.float32(self.table_range / self.table_step + 0.5)
+        np.clip(index, 0, len(self.table) - 1, out=index)
+        return self.table[index.astype(np.intp)]
+
+    def layer(self, inputs: np.ndarray, layer: int):
+        pre_activation = inputs @ self.codes[layer].astype(np.float32).T
+        pre_activation *= self.scales[layer]
+        pre_activation += self.biases[layer]
+        return self.activate(pre_activation)
+
+    def predict(self, input_values: list[float]):
+        return self.predict_many([input_values])[0]
+
+    def predict_many(self, inputs: Union[np.ndarray, list[list[float]]], out: Optional[np.ndarray] = None):
+        """
+        Outputs for a batch of inputs, one per row, like Network.predict_many. Safe to call from many threads at once.
+        """
+        input_len, hidden_len, output_len = self.structure
+        inputs = np.asarray(inputs, dtype=np.float32)
+        assert inputs.ndim == 2 and inputs.shape[1] == input_len,\
+            f"Incompatible inputs. This Network expects a batch of rows with {input_len} input values but gets shape {inputs.shape}."
+        outputs = self.layer(self.layer(inputs, 0), 1)
+        if out is None:
+            return outputs
+        out[...] = outputs
+        return out
+
+    def drift(self, network: Network, held_out: Union[list[Example], ArrayDataset], threshold: float = 0.5) -> dict[str, float]:
+        """
+        Compare the outputs of this model with the float network on held-out examples, read through held_out.rows,
+        so any ArrayDataset works, including ColumnarExamples.
+        return
+            max_error, mean_error: largest and mean absolute difference between the outputs
+            agreement: share of examples classified the same (argmax of the outputs, or output > threshold for a single output)
+            float_accuracy, quantized_accuracy: share of examples each model classifies like the targets
+        """
+        if isinstance(held_out, list):
+            held_out = ArrayDataset.from_examples(held_out)
+        inputs, targets = held_out.rows(0, len(held_out))
+        inputs, targets = np.asarray(inputs), np.asarray(targets)
+        float_outputs = network.predict_many(inputs)
+        quantized_outputs = self.predict_many(inputs)
+        error = np.abs(float_outputs - quantized_outputs)
+        if self.structure[2] == 1:
+            classify = lambda outputs: outputs[:, 0] > threshold
+        else:
+            classify = lambda outputs: outputs.argmax(axis=1)
+        float_classes, quantized_classes, target_classes = classify(float_outputs), classify(quantized_outputs), classify(targets)
+        return {
+            "max_error": float(error.max()),
+            "mean_error": float(error.mean()),
+            "agreement": float(np.mean(float_classes == quantized_classes)),
+            "float_accuracy": float(np.mean(float_classes == target_classes)),
+            "quantized_accuracy": float(np.mean(quantized_classes == target_classes))
+        }
+
+if __name__ == "__main__":
+
+    from NeuralNetwork.BackPropagation import RMSProp
+
+    print("8-BIT IDENTITY")
+    IDENTITY = [([1.0 if i == j else 0.0 for j in range(8)], [1.0 if i == j else 0.0 for j in range(8)]) for i in range(8)]
+    network = Network(8, 3, 8, "sigmoid", seed=0)
+    network.learn(IDENTITY, batch_size=8, num_epochs=5000, learning_rate=RMSProp(0.05), target_loss=0.001)
+    for bits in (8, 16):
+        quantized_network = QuantizedNetwork(network, bits)
+        print(f"int{bits}: {quantized_network.nbytes} bytes (float64 {network.parameters.nbytes}), drift {quantized_network.drift(network, IDENTITY)}")
+    print(f"1 -> {[1 if x > 0.5 else 0 for x in quantized_network.predict(IDENTITY[0][0])]}")
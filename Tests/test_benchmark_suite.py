@@ -0,0 +1,16 @@
+"""
+Run from the repository root: python -m pytest Tests
+"""
+import Benchmark.Suite as Suite
+
+def test_measure_reports_runs_too_fast_to_time(monkeypatch, capsys):
+    # a timer that never advances
+    monkeypatch.setattr(Suite, "perf_counter", lambda: 1.0)
+    result = Suite.measure("instant", lambda: None, 10, "rows", repeat=2, memory=False)
+    assert result["seconds"] == 0 and result["throughput"] is None
+    assert capsys.readouterr().out == "instant: 0.0000s, too fast to measure\n"
+
+def test_measure_reports_throughput_and_peak(capsys):
+    result = Suite.measure("sum", lambda: sum(range(1000)), 1000, "numbers")
+    assert result["throughput"] > 0 and result["peak_bytes"] is not None
+    assert " numbers/s, peak " in capsys.readouterr().out
@@ -0,0 +1,71 @@
+"""
+Run from the repository root: python -m pytest Tests
+"""
+import csv
+import numpy as np
+import pytest
+from Dataset.Columnar import ColumnarDataset
+from LinearRegression.GradientDescent import VectorizedLinearRegression
+from LinearRegression.NormalEquation import NormalEquation
+from NeuralNetwork.BackPropagation import ArrayDataset, ColumnarExamples, Network
+from NeuralNetwork.Quantization import QuantizedNetwork
+
+ROWS = [
+    ["Outlook", "Temperature", "Humidity", "Play"],
+    ["Sunny", "30.5", "85", "No"],
+    ["Rain", "18.0", "", "Yes"],
+    ["", "21.5", "70", "Yes"],
+    ["Sunny", "", "90", "No"],
+    ["Overcast", "25.0", "65", "Yes"]
+]
+
+def convert(tmp_path, rows: list[list[str]]):
+    csv_path = tmp_path / "weather.csv"
+    with open(csv_path, "w", newline="") as file:
+        csv.writer(file).writerows(rows)
+    return ColumnarDataset.from_csv(str(csv_path), str(tmp_path / "weather.cols"), chunk_size=2)
+
+@pytest.fixture
+def dataset(tmp_path):
+    return convert(tmp_path, ROWS)
+
+def test_empty_cells_are_stored_as_missing(dataset):
+    assert dataset.values["Outlook"] == ["Sunny", "Rain", "Overcast"]
+    assert dataset.column("Outlook").tolist() == [0, 1, ColumnarDataset.MISSING, 0, 2]
+    assert np.isnan(dataset.column("Temperature")).tolist() == [False, False, False, True, False]
+    assert list(dataset.records(["Outlook", "Humidity"]))[1:3] == [{"Outlook": "Rain"}, {"Humidity": 70.0}]
+
+def test_matrix_rejects_empty_numeric_cells(dataset):
+    with pytest.raises(ValueError, match=r"Row 3 of .* has no value of Temperature"):
+        dataset.matrix(["Outlook", "Temperature"])
+    with pytest.raises(ValueError, match=r"Row 1 of .* has no value of Humidity"):
+        dataset.matrix(["Humidity"], 1, 3)
+    # rows without empty numeric cells, and a missing categorical value is all zeros
+    assert dataset.matrix(["Outlook", "Temperature"], 0, 3).tolist() == [[1, 0, 0, 30.5], [0, 1, 0, 18.0], [0, 0, 0, 21.5]]
+
+def test_samples_reject_empty_cells(dataset):
+    assert list(dataset.samples(["Temperature"], "Humidity", 2, 3)) == [(21.5, 70.0)]
+    with pytest.raises(ValueError, match=r"Row 1 of .* has no value of Humidity"):
+        list(dataset.samples(["Temperature"], "Humidity", 0, 3))
+    with pytest.raises(ValueError, match="Temperature"):
+        NormalEquation(dataset.samples(["Temperature"], "Humidity", 2), num_features=1)
+
+def test_vectorized_linear_regression_rejects_nan(dataset):
+    with pytest.raises(ValueError, match="Example 3"):
+        VectorizedLinearRegression(dataset.column("Temperature"), dataset.column("Outlook"), 2, 1, 0.01, shuffle=False)
+    with pytest.raises(ValueError, match="Example 1"):
+        VectorizedLinearRegression(dataset.column("Temperature"), dataset.column("Humidity"), 5, 1, 0.01, seed=0)
+
+def test_network_rejects_empty_cells(dataset):
+    examples = ColumnarExamples(dataset, ["Outlook", "Temperature"], ["Play"])
+    with pytest.raises(ValueError, match="Temperature"):
+        Network(examples.input_len, 2, examples.output_len, "sigmoid", seed=0).learn(examples, 2, 1, 0.1, prefetch=0)
+
+def test_drift_reads_columnar_examples(tmp_path):
+    # no empty numeric cells
+    examples = ColumnarExamples(convert(tmp_path, ROWS[:4] + ROWS[5:]), ["Outlook", "Temperature"], ["Play"])
+    network = Network(examples.input_len, 3, examples.output_len, "sigmoid", seed=0)
+    network.learn(examples, 3, 5, 0.1, prefetch=0)
+    quantized = QuantizedNetwork(network)
+    expected = quantized.drift(network, ArrayDataset(*examples.rows(0, len(examples))))
+    assert quantized.drift(network, examples) == expected
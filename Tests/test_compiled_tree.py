@@ -0,0 +1,114 @@
+"""
+Run from the repository root: python -m pytest Tests
+"""
+from random import Random
+import pytest
+from Benchmark.Generators import attribute_examples
+from DecisionTree.ID3 import CompiledTree, DecisionTree, Node
+
+def queries(num_attributes: int, seed: int):
+    """
+    Instances with values the trees were not trained on, missing attributes and an empty instance.
+    """
+    rng = Random(seed)
+    instances = [{key: value for key, value in example.items() if key != "Label"} for example in attribute_examples(200, num_attributes, 9, seed=seed)]
+    for instance in instances:
+        if rng.random() < 0.3:
+            instance.pop(f"A{rng.randrange(num_attributes)}", None)
+    return instances + [{}]
+
+@pytest.mark.parametrize("max_branches", [None, 2, 3])
+@pytest.mark.parametrize("seed", range(5))
+def test_saved_tree_classifies_like_nodes(tmp_path, seed, max_branches):
+    examples = attribute_examples(300, 5, 6, seed=seed)
+    for example in examples[::11]:
+        del example["A1"]
+    tree = DecisionTree(examples, "Label", max_branches=max_branches)
+    tree.save(tmp_path / "tree.id3")
+    loaded = CompiledTree.load(tmp_path / "tree.id3")
+    instances = queries(5, seed + 100)
+    expected = [tree.root.classify(instance) for instance in instances]
+    assert tree.classify_many(instances) == expected
+    assert loaded.classify_many(instances) == expected
+    assert (loaded.target, loaded.attributes, loaded.values, loaded.labels) == (tree.compiled.target, tree.compiled.attributes, tree.compiled.values, tree.compiled.labels)
+
+def test_binary_splits_survive_round_trip(tmp_path):
+    examples = attribute_examples(500, 3, 8, seed=1)
+    tree = DecisionTree(examples, "Label", max_branches=2)
+    tree.save(tmp_path / "tree.id3")
+    loaded = CompiledTree.load(tmp_path / "tree.id3")
+    # a binary split stores one child reached through several values
+    shared = [
+        node for node in range(len(loaded.node_attribute))
+        if len(set(loaded.edge_child[loaded.edge_start[node]:loaded.edge_start[node + 1]])) < loaded.edge_start[node + 1] - loaded.edge_start[node]
+    ]
+    assert shared != []
+    instances = queries(3, 2)
+    assert loaded.classify_many(instances) == [tree.root.classify(instance) for instance in instances]
+
+def test_unseen_and_missing_values_follow_the_tree(tmp_path):
+    examples = [{"Color": color, "Size": size, "Label": label} for color, size, label in [
+        ("red", "big", "p"), ("red", "small", "p"), ("blue", "big", "q"), ("blue", "small", "q"), ("green", "big", "p")
+    ]]
+    tree = DecisionTree(examples, "Label")
+    tree.save(tmp_path / "tree.id3")
+    loaded = CompiledTree.load(tmp_path / "tree.id3")
+    instances = [{"Color": "purple"}, {"Size": "big"}, {}, {"Color": "blue", "Shape": "round"}]
+    expected = [tree.root.classify(instance) for instance in instances]
+    assert expected[3] == "q"
+    assert loaded.classify_many(instances) == expected
+
+def test_strings_with_special_characters(tmp_path):
+    examples = [
+        {"a\0b": "x\0", "Wind": "", "Label": "p"},
+        {"a\0b": "y", "Wind": "strong", "Label": "q\0"},
+        {"a\0b": "z\0z", "Wind": "", "Label": "p"},
+        {"a\0b": "ü", "Wind": "strong", "Label": "w"},
+    ]
+    examples = [{**{key: value for key, value in example.items() if key != "Label"}, "Label\0": example["Label"]} for example in examples]
+    tree = DecisionTree(examples, "Label\0")
+    tree.save(tmp_path / "tree.id3")
+    loaded = CompiledTree.load(tmp_path / "tree.id3")
+    assert loaded.target == "Label\0"
+    assert (loaded.attributes, loaded.values, loaded.labels) == (tree.compiled.attributes, tree.compiled.values, tree.compiled.labels)
+    instances = [{"a\0b": "x\0"}, {"a\0b": "y"}, {"a\0b": "z\0z"}, {"a\0b": "ü"}]
+    assert loaded.classify_many(instances) == ["p", "q\0", "p", "w"]
+
+def test_load_rejects_other_files(tmp_path):
+    (tmp_path / "tree.id3").write_bytes(b"not a tree" * 10)
+    with pytest.raises(ValueError, match="not a compiled decision tree"):
+        CompiledTree.load(tmp_path / "tree.id3")
+    DecisionTree(attribute_examples(100, 3, 4, seed=3), "Label").save(tmp_path / "tree.id3")
+    data = bytearray((tmp_path / "tree.id3").read_bytes())
+    header = list(CompiledTree.HEADER.unpack_from(data))
+    header[1] = CompiledTree.VERSION + 1
+    CompiledTree.HEADER.pack_into(data, 0, *header)
+    (tmp_path / "tree.id3").write_bytes(bytes(data))
+    with pytest.raises(ValueError, match="format version"):
+        CompiledTree.load(tmp_path / "tree.id3")
+
+def test_wide_attributes_use_edge_keys(tmp_path):
+    # 200 nodes testing H, each with 25 of its 5000 values: a dense table would have a million entries
+    rng = Random(5)
+    values = [f"h{i}" for i in range(5000)]
+    rng.shuffle(values)
+    children = {}
+    for group in range(200):
+        branches = {value: Node(rng.choice("pqr")) for value in values[group * 25:(group + 1) * 25]}
+        children[f"g{group}"] = Node(("H", {**branches, "__other__": Node("other")}, values[group * 25]))
+    root = Node(("G", {**children, "__other__": Node("none")}, "g0"))
+    CompiledTree.from_node(root, "Label").save(tmp_path / "tree.id3")
+    loaded = CompiledTree.load(tmp_path / "tree.id3")
+    node_attribute, node_label, dense, sparse = loaded.build_lookup()
+    assert dense is None
+    assert sum(array.nbytes for array in sparse[:3] + sparse[4:]) < 16 * (len(loaded.node_attribute) + len(loaded.edge_value))
+    instances = []
+    for _ in range(3000):
+        group = rng.randrange(205)
+        # mostly a value of the group, otherwise any value or one the tree never saw
+        value = values[group * 25 + rng.randrange(25)] if group < 200 and rng.random() < 0.7 else rng.choice(values + ["unseen"])
+        instances.append({"G": f"g{group}", "H": value})
+    instances += [{"G": f"g{rng.randrange(200)}"} for _ in range(100)] + [{"H": values[0]}, {}]
+    expected = [root.classify(instance) for instance in instances]
+    assert {"p", "q", "r", "other", "none"} <= set(expected)
+    assert loaded.classify_many(instances) == expected
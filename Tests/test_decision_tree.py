@@ -0,0 +1,103 @@
+"""
+Run from the repository root: python -m pytest Tests
+"""
+from itertools import combinations
+from random import Random
+import pytest
+from DecisionTree.ID3 import DecisionTree, Node
+
+def high_cardinality_examples(num_rows: int, cardinality: int, seed: int = 0):
+    """
+    Examples whose label depends, noisily, on an attribute H with cardinality values, and an irrelevant attribute B.
+    """
+    rng = Random(seed)
+    examples = []
+    for _ in range(num_rows):
+        value = rng.randrange(cardinality)
+        share = value * 7919 % cardinality / cardinality
+        examples.append({"H": f"h{value}", "B": f"b{rng.randrange(3)}", "Label": "Yes" if rng.random() < share else "No"})
+    return examples
+
+def size(root: Node):
+    """
+    return
+        number of distinct nodes, depth
+    """
+    seen, depth, stack = set(), 0, [(root, 0)]
+    while stack != []:
+        node, node_depth = stack.pop()
+        if id(node) in seen:
+            continue
+        seen.add(id(node))
+        depth = max(depth, node_depth)
+        if not isinstance(node.classifier, str):
+            stack.extend((child, node_depth + 1) for child in node.classifier[1].values())
+    return len(seen), depth
+
+@pytest.mark.parametrize("max_branches", [2, 8])
+def test_grouped_splits_bound_high_cardinality_trees(max_branches):
+    examples = high_cardinality_examples(20000, 2000)
+    tree = DecisionTree(examples, "Label", max_branches=max_branches)
+    num_nodes, depth = size(tree.root)
+    # one grouped split on H and one split on B below each group, each with its __other__ leaf
+    assert depth <= 2
+    assert num_nodes <= 1 + (max_branches + 1) + max_branches * 4
+    test_attribute, children, _ = tree.root.classifier
+    assert test_attribute == "H" and len({id(child) for value, child in children.items() if value != "__other__"}) <= max_branches
+    assert tree.classify_many(examples) == [tree.root.classify(example) for example in examples]
+
+def test_two_groups_are_the_best_binary_split():
+    rng = Random(1)
+    tree = DecisionTree([{"A": "a", "Label": "p"}], "Label", max_branches=2)
+    for _ in range(20):
+        contingency = {code: {label: rng.randrange(1, 30) for label in (0, 1) if rng.random() < 0.8} or {0: 1} for code in range(7)}
+        num_example = sum(sum(label_count.values()) for label_count in contingency.values())
+        total = [sum(label_count.get(label, 0) for label_count in contingency.values()) for label in (0, 1)]
+        parent_entropy = DecisionTree.entropy_from_counts([count for count in total if count > 0], num_example)
+
+        def gain(group):
+            inside = [sum(contingency[code].get(label, 0) for code in group) for label in (0, 1)]
+            outside = [all_count - count for all_count, count in zip(total, inside)]
+            return parent_entropy - sum(
+                sum(counts) / num_example * DecisionTree.entropy_from_counts([count for count in counts if count > 0], sum(counts))
+                for counts in (inside, outside)
+            )
+
+        best = max(gain(group) for size in range(1, 7) for group in combinations(range(7), size))
+        split_gain, groups = tree.compute_grouped_split(contingency, num_example, parent_entropy)
+        assert len(groups) == 2 and set().union(*groups) == set(range(7))
+        assert split_gain == pytest.approx(best) and split_gain == pytest.approx(gain(groups[0]))
+
+def test_deep_trees_classify_and_print_without_recursion():
+    # a chain far deeper than the recursion limit
+    node = Node("end")
+    for i in range(5000):
+        node = Node(("A", {f"v{i}": node, "__other__": Node("other")}, f"v{i}"))
+    assert node.classify({}) == "end"
+    assert node.classify({"A": "x"}) == "other"
+    text = node.stringify(0)
+    assert text.count("IF A = v") == 5000 and text.count("THEN end") == 1
+
+def split_attributes(root: Node):
+    attributes, stack = set(), [root]
+    while stack != []:
+        node = stack.pop()
+        if not isinstance(node.classifier, str):
+            attributes.add(node.classifier[0])
+            stack.extend(node.classifier[1].values())
+    return attributes
+
+@pytest.mark.parametrize("parallel_depth", [0, 1, 2])
+def test_parallel_build_equals_serial_build(parallel_depth):
+    rng = Random(0)
+    examples = []
+    for _ in range(3000):
+        example = {f"A{i}": f"v{rng.randrange(3)}" for i in range(30)}
+        # exact copies tie in gain with the attribute they copy, which comes first in the examples
+        example.update({f"Copy{i}": example[f"A{i}"] for i in range(5)})
+        example["Label"] = rng.choice(("Yes", "No"))
+        examples.append(example)
+    serial = DecisionTree(examples, "Label")
+    parallel = DecisionTree(examples, "Label", processes=2, parallel_depth=parallel_depth)
+    assert parallel.root.stringify(0) == serial.root.stringify(0)
+    assert not any(attribute.startswith("Copy") for attribute in split_attributes(serial.root))
@@ -0,0 +1,65 @@
+"""
+Run from the repository root: python -m pytest Tests
+"""
+import numpy as np
+import pytest
+from Benchmark.Generators import network_data
+from NeuralNetwork.BackPropagation import Adam, ArrayDataset, Network, RMSProp, SGD
+
+OPTIMIZERS = {
+    "sgd": lambda: SGD(0.5),
+    "momentum": lambda: SGD(0.5, momentum=0.9),
+    "nesterov": lambda: SGD(0.5, momentum=0.9, nesterov=True),
+    "rmsprop": lambda: RMSProp(0.01),
+    "adam": lambda: Adam(0.01)
+}
+
+@pytest.fixture
+def dataset():
+    return ArrayDataset(*network_data(500, 4, 2))
+
+@pytest.mark.parametrize("name", OPTIMIZERS)
+def test_interrupted_run_resumes_exactly(tmp_path, dataset, name):
+    uninterrupted = Network(4, 6, 2, "sigmoid", seed=0)
+    uninterrupted.learn(dataset, 32, 6, OPTIMIZERS[name](), shuffle_buffer=100, prefetch=0)
+
+    interrupted = Network(4, 6, 2, "sigmoid", seed=0)
+    interrupted.learn(dataset, 32, 2, OPTIMIZERS[name](), shuffle_buffer=100, prefetch=0, checkpoint_path=tmp_path / "network.ckpt")
+    del interrupted
+    resumed = Network.load(tmp_path / "network.ckpt")
+    assert resumed.epoch == 2
+    resumed.learn(dataset, 32, 6 - resumed.epoch, OPTIMIZERS[name](), shuffle_buffer=100, prefetch=0)
+
+    assert resumed.epoch == uninterrupted.epoch
+    np.testing.assert_array_equal(resumed.parameters, uninterrupted.parameters)
+
+def test_checkpoint_keeps_adam_moments(tmp_path, dataset):
+    network = Network(4, 6, 2, "sigmoid", seed=0)
+    optimizer = Adam(0.01)
+    network.learn(dataset, 32, 1, optimizer, prefetch=0)
+    network.save(tmp_path / "network.ckpt")
+    class_name, state = Network.load(tmp_path / "network.ckpt").optimizer_state
+    assert class_name == "Adam"
+    assert state["num_steps"] == optimizer.num_steps > 0
+    np.testing.assert_array_equal(state["mean"], optimizer.mean)
+    np.testing.assert_array_equal(state["mean_square"], optimizer.mean_square)
+
+def test_other_optimizer_class_starts_fresh(tmp_path, dataset):
+    network = Network(4, 6, 2, "sigmoid", seed=0)
+    network.learn(dataset, 32, 1, Adam(0.01), prefetch=0, checkpoint_path=tmp_path / "network.ckpt")
+    resumed = Network.load(tmp_path / "network.ckpt")
+    optimizer = RMSProp(0.01)
+    resumed.learn(dataset, 32, 1, optimizer, prefetch=0)
+    fresh = Network.load(tmp_path / "network.ckpt")
+    fresh.optimizer_state = None
+    fresh.learn(dataset, 32, 1, RMSProp(0.01), prefetch=0)
+    np.testing.assert_array_equal(resumed.parameters, fresh.parameters)
+
+def test_load_rejects_other_checkpoint_versions(tmp_path):
+    Network(4, 6, 2, "sigmoid", seed=0).save(tmp_path / "network.ckpt")
+    data = bytearray((tmp_path / "network.ckpt").read_bytes())
+    magic, _, header_len = Network.PREFIX.unpack_from(data)
+    Network.PREFIX.pack_into(data, 0, magic, Network.VERSION + 1, header_len)
+    (tmp_path / "network.ckpt").write_bytes(bytes(data))
+    with pytest.raises(ValueError, match="checkpoint version"):
+        Network.load(tmp_path / "network.ckpt")
@@ -0,0 +1,20 @@
+"""
+Run from the repository root: python -m pytest Tests
+"""
+import numpy as np
+import pytest
+from LinearRegression.NormalEquation import NormalEquation
+
+@pytest.mark.parametrize("dtype", ["float32", "float64", "int32", "int64"])
+def test_numpy_scalars_are_single_features(dtype):
+    inputs = np.arange(1, 21).astype(dtype)
+    targets = 2 * inputs.astype("float64") + 3
+    h = NormalEquation(zip(inputs, targets))
+    assert h(10) == pytest.approx(23)
+    assert h.statistics.n == 20 and h.statistics.num_features == 1
+
+def test_numpy_rows_are_feature_vectors():
+    inputs = np.random.default_rng(0).uniform(-5, 5, (200, 3))
+    targets = inputs @ np.array([1.5, -2.0, 0.5]) + 4
+    h = NormalEquation(zip(inputs, targets), num_features=3)
+    assert h([1.0, 1.0, 1.0]) == pytest.approx(4.0)
@@ -0,0 +1,50 @@
+"""
+Run from the repository root: python -m pytest Tests
+"""
+from random import Random
+import pytest
+from ConceptLearning.CandidateElimination import Taxonomy
+
+def build(seed: int):
+    """
+    The same taxonomy, with a value under two groups, built with its sub groups listed and created in a shuffled order.
+    """
+    rng = Random(seed)
+    bottom = Taxonomy("_", [])
+    values = {name: Taxonomy(name, [bottom]) for name in rng.sample(["a", "b", "c", "d", "e"], 5)}
+    groups = {}
+    for name, members in rng.sample([("g1", ["a", "b", "c"]), ("g2", ["c", "d"]), ("g3", ["e"])], 3):
+        groups[name] = Taxonomy(name, [values[member] for member in rng.sample(members, len(members))])
+    root = Taxonomy("?", [groups[name] for name in rng.sample(sorted(groups), 3)])
+    return root, root.freeze()
+
+@pytest.mark.parametrize("seed", range(1, 10))
+def test_ids_do_not_depend_on_construction_order(seed):
+    _, expected = build(0)
+    _, index = build(seed)
+    assert [(node.name, node.id) for node in index.nodes] == [(node.name, node.id) for node in expected.nodes]
+    assert index.fingerprint() == expected.fingerprint()
+
+def test_parents_come_before_sub_groups():
+    root, index = build(0)
+    assert index[0] is root
+    for node in index.nodes:
+        assert all(parent.id < node.id for parent in node.parent_groups)
+        # the bitmasks agree with walking parent_groups
+        assert index.ancestors(node) == [other for other in index.nodes if other is not node and node in walk(other)]
+
+def walk(node: Taxonomy):
+    """
+    node and everything below it.
+    """
+    below = {node}
+    for sub_group in node.sub_groups:
+        below |= walk(sub_group)
+    return below
+
+def test_duplicate_names_are_rejected():
+    bottom = Taxonomy("_", [])
+    root = Taxonomy("?", [Taxonomy("a", [bottom]), Taxonomy("a", [bottom])])
+    with pytest.raises(ValueError, match="more than one node named a"):
+        root.freeze()
+    assert root.index is None